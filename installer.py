@@ -10,7 +10,7 @@ import venv
 # ------------------------------------------------------------------
 VENV_DIR   = ".venv"
 SETTINGS   = r"data\settings.json"
-SETTINGS_TEMPLATE = {"volume": 0.8, "debug": False}   # example content
+SETTINGS_TEMPLATE = {"volume": 0.8, "debug": False, "world_seed": None}   # example content
 
 # ------------------------------------------------------------------
 #  Helper – cross-platform “press any key”
@@ -81,13 +81,13 @@ def install_requirements():
 
     # --- 7.  Install packages ---------------------------------------------
     print("\nInstalling requirements...")
-    run_stream([venv_pip, "install", "blessed", "perlin-noise"])
+    run_stream([venv_pip, "install", "blessed", "perlin-noise", "numpy"])
 
     # --- 8.  Final report --------------------------------------------------
     print("\n--- Installation Report ---")
     print("All steps completed successfully!")
     print(f"Virtual environment created at: {os.path.abspath(VENV_DIR)}")
-    print("Required packages installed: blessed, perlin-noise")
+    print("Required packages installed: blessed, perlin-noise, numpy")
     print("You can now run the game using option 1 from the main menu.")
     print("-" * 59)
     print("\n" + "-" * 79)
@@ -1,57 +1,108 @@
 import os
 import sys
+import time
+
+# Startup is profiled from here, whichever process the game ends up in
+# (see scripts/startup.py).
+os.environ.setdefault("JULES_LAUNCH_TIME", repr(time.time()))
+
+import argparse
+import site
 import subprocess
 
+import validater
+
 # --- Configuration ---
-VENV_DIR = ".venv"
-GAME_SCRIPT = os.path.join("scripts", "game.py")
+VENV_DIR = validater.VENV_DIR
+SCRIPTS_DIR = "scripts"
+GAME_SCRIPT = os.path.join(SCRIPTS_DIR, "game.py")
+VENV_PYTHON = validater.VENV_PYTHON
+
+def pause():
+    if 'win32' in sys.platform:
+        os.system("pause")
+
+def can_run_in_process():
+    """
+    Whether this interpreter can load the venv's packages itself, which
+    saves starting a second interpreter. The venv must be built on the same
+    Python version.
+    """
+    return validater.venv_version() == sys.version_info[:2] and validater.venv_site_packages() is not None
+
+def run_in_process(game_args):
+    """Runs the game in this interpreter, with the venv's packages first on the path."""
+    before = list(sys.path)
+    site.addsitedir(os.path.abspath(validater.venv_site_packages()))
+    added = [path for path in sys.path if path not in before]
+    sys.path[:] = [os.path.abspath(SCRIPTS_DIR)] + added + before
 
-# Determine the correct path for the venv Python executable
-if sys.platform == "win32":
-    VENV_PYTHON = os.path.join(VENV_DIR, "Scripts", "python.exe")
-else:
-    VENV_PYTHON = os.path.join(VENV_DIR, "bin", "python")
+    from startup import PROFILE
+    PROFILE.mark("launch")
+    import game
+    game.start(game_args.record, game_args.profile_startup)
 
 def main():
     """
-    Launches the game using the Python interpreter from the virtual environment.
+    Launches the game using the virtual environment's packages: in this
+    process when possible, otherwise with the venv's own interpreter.
     """
-    # 1. Check if the venv python executable exists.
+    parser = argparse.ArgumentParser(description="Launches Jules' Text Adventure Game.")
+    parser.add_argument("--subprocess", action="store_true",
+                        help="always run the game in the venv's own interpreter")
+    parser.add_argument("--record", metavar="PATH", help="record the session")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="report how long startup took on exit")
+    args = parser.parse_args()
+
+    # 1. Check the virtual environment. The result of a full check is cached
+    # until the venv's contents change, so this is usually just a hash.
+    problems, _ = validater.validate(use_cache=True)
     if not os.path.exists(VENV_PYTHON):
         print("\n[CRITICAL ERROR] Virtual environment not found.")
         print(f"Looked for: {os.path.abspath(VENV_PYTHON)}")
         print("Please run option 3, 'Install Requirements', from the main menu.")
-        if 'win32' in sys.platform:
-            os.system("pause")
+        pause()
+        sys.exit(1)
+    if problems:
+        print("\n[CRITICAL ERROR] The virtual environment is incomplete:")
+        for problem in problems:
+            print(f"  - {problem}")
+        print("Please run option 3, 'Install Requirements', from the main menu.")
+        pause()
         sys.exit(1)
 
     # 2. Check if the main game script exists.
     if not os.path.exists(GAME_SCRIPT):
         print(f"\n[CRITICAL ERROR] Game script not found at '{GAME_SCRIPT}'.")
         print("The game files appear to be corrupted or missing.")
-        if 'win32' in sys.platform:
-            os.system("pause")
+        pause()
         sys.exit(1)
 
-    # 3. Launch the game using the venv's python.
-    # We run this in a subprocess. This launcher script's job is just to
-    # kick off the game with the right interpreter.
+    # 3. Launch the game, in this process if the venv allows it.
+    if not args.subprocess and can_run_in_process():
+        run_in_process(args)
+        return
+
+    command = [VENV_PYTHON, GAME_SCRIPT]
+    if args.record:
+        command += ["--record", args.record]
+    if args.profile_startup:
+        command.append("--profile-startup")
     try:
         # The `subprocess.run` call will wait here until the game exits.
-        subprocess.run([VENV_PYTHON, GAME_SCRIPT], check=True)
+        subprocess.run(command, check=True)
     except subprocess.CalledProcessError as e:
         # This will catch errors if the game script itself crashes.
         # The game script has its own error handling, but this is a fallback.
         print(f"\nAn error occurred while running the game: {e}")
-        if 'win32' in sys.platform:
-            os.system("pause")
+        pause()
     except FileNotFoundError:
         # This is a fallback in case VENV_PYTHON is not found at the last second.
         print(f"\n[CRITICAL ERROR] Could not execute Python from the virtual environment.")
         print(f"Path may be incorrect: {os.path.abspath(VENV_PYTHON)}")
-        if 'win32' in sys.platform:
-            os.system("pause")
+        pause()
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
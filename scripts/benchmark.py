@@ -0,0 +1,487 @@
+"""
+Headless benchmark suite for the game engine.
+
+Drives Map, Player.move and Renderer against a recording stand-in for
+blessed.Terminal, so it runs without a TTY, and writes the results to a
+JSON file that can be compared between commits:
+
+    python scripts/benchmark.py --output before.json
+    python scripts/benchmark.py --output after.json --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from map import Map, CHUNK_WIDTH, CHUNK_HEIGHT
+from pathfinding import PathFinder
+from fov import FieldOfView, SIGHT_RADIUS
+from simulation import WorldSimulation, step_chunks, default_rules
+from player import Player
+from renderer import Renderer
+from terrain import TerrainGenerator, quality_report
+
+BENCH_SEED = 123
+
+
+class _Style(str):
+    """A terminal attribute that can be used as a prefix or called on text."""
+
+    def __call__(self, text):
+        return self + text + "\x1b[m"
+
+
+class RecordingStream:
+    """A write-only stream that counts the bytes of every flushed frame."""
+
+    def __init__(self):
+        self.pending = 0
+        self.frames = []
+
+    def write(self, text):
+        self.pending += len(text.encode("utf-8"))
+        return len(text)
+
+    def flush(self):
+        if self.pending:
+            self.frames.append(self.pending)
+            self.pending = 0
+
+    def take_frames(self):
+        """Returns and clears the byte counts of the frames written so far."""
+        self.flush()
+        frames, self.frames = self.frames, []
+        return frames
+
+
+class FakeTerminal:
+    """
+    The subset of blessed.Terminal the renderer uses, emitting standard
+    xterm sequences into a RecordingStream.
+    """
+
+    def __init__(self, width=80, height=25):
+        self.width = width
+        self.height = height
+        self.stream = RecordingStream()
+        self.home = "\x1b[H"
+        self.clear = "\x1b[2J"
+        self.normal = "\x1b[m"
+        self.bold = _Style("\x1b[1m")
+        self.on_black = _Style("\x1b[40m")
+        self.bright_black = _Style("\x1b[90m")
+
+    def move_xy(self, x, y):
+        return f"\x1b[{y + 1};{x + 1}H"
+
+    def move_right(self, count):
+        return f"\x1b[{count}C"
+
+    def move_left(self, count):
+        return f"\x1b[{count}D"
+
+    def move_down(self, count):
+        return f"\x1b[{count}B"
+
+    def move_up(self, count):
+        return f"\x1b[{count}A"
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def _summary(samples):
+    """Mean, median, p99 and max of a list of durations, in milliseconds."""
+    values = np.array(samples) * 1000.0
+    return {
+        "count": len(samples),
+        "mean_ms": float(values.mean()),
+        "median_ms": float(np.median(values)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max()),
+    }
+
+
+def bench_generation(chunks=200):
+    """Chunk generation throughput, per chunk and in 4x4 blocks, and the time of each terrain stage."""
+    generator = TerrainGenerator(BENCH_SEED)
+    generator.generate(-1000, -1000)  # Warm up NumPy.
+    start = time.perf_counter()
+    for i in range(chunks):
+        generator.generate(i, 0)
+    per_chunk = chunks / (time.perf_counter() - start)
+
+    stages = generator.stage_stats()
+
+    generator = TerrainGenerator(BENCH_SEED)
+    blocks = max(1, chunks // 16)
+    start = time.perf_counter()
+    for i in range(blocks):
+        generator.generate_block(i * 4, 100, 4, 4)
+    per_block = blocks * 16 / (time.perf_counter() - start)
+
+    world_map = Map(seed=BENCH_SEED)
+    start = time.perf_counter()
+    for i in range(chunks):
+        world_map.get_chunk(i, 200)
+    via_map = chunks / (time.perf_counter() - start)
+    world_map.close()
+
+    # Low-resolution overviews of a 16x16 area at a time, as the terrain
+    # map requests them.
+    world_map = Map(seed=BENCH_SEED)
+    areas = max(1, chunks // 16)
+    start = time.perf_counter()
+    for i in range(areas):
+        world_map.get_overview(i * 16, 300, 16, 16)
+    overviews = areas * 256 / (time.perf_counter() - start)
+    world_map.close()
+
+    return {
+        "chunks_per_second": per_chunk,
+        "block_chunks_per_second": per_block,
+        "map_get_chunk_per_second": via_map,
+        "overview_chunks_per_second": overviews,
+        "stage_mean_ms": {name: stats["mean_ms"] for name, stats in stages.items()},
+    }
+
+
+def bench_terrain_quality():
+    """Speed and error of lattice-sampled terrain against the exact sampling the game uses."""
+    return quality_report(BENCH_SEED, 100, 0)
+
+
+def bench_movement(steps=2000, transitions=100, prefetch_radius=1):
+    """Per-move latency for ordinary steps and for chunk transitions."""
+    results = {}
+    for label, radius in (("sync", 0), ("prefetch", prefetch_radius)):
+        world_map = Map(seed=BENCH_SEED, prefetch_radius=radius)
+        player = Player(start_x=CHUNK_WIDTH // 2, start_y=CHUNK_HEIGHT // 2)
+        world_map.get_chunk(0, 0)
+        world_map.set_focus(0, 0, owner=player)
+
+        # Walk back and forth inside the chunk.
+        step_times = []
+        direction = 1
+        for _ in range(steps):
+            if not 2 <= player.x + direction < CHUNK_WIDTH - 2:
+                direction = -direction
+            step_times.append(_timed(player.move, direction, 0, world_map))
+
+        # Cross into a new chunk and take a step there, which is when the
+        # new chunk is first needed. Give the prefetcher a frame's worth of
+        # time between crossings, as a real player would.
+        transition_times = []
+        for _ in range(transitions):
+            player.x = CHUNK_WIDTH - 1
+            start = time.perf_counter()
+            player.move(1, 0, world_map)
+            player.move(0, 1, world_map)
+            transition_times.append(time.perf_counter() - start)
+            time.sleep(0.02)
+
+        results[label] = {
+            "step": _summary(step_times),
+            "transition": _summary(transition_times),
+        }
+        if world_map.prefetcher is not None:
+            results[label]["prefetch"] = world_map.prefetcher.stats()
+        world_map.close()
+    return results
+
+
+def bench_rendering(frames=200):
+    """Frame build time and bytes written per frame for each view."""
+    term = FakeTerminal()
+    renderer = Renderer(term)
+    world_map = Map(seed=BENCH_SEED)
+    player = Player(start_x=CHUNK_WIDTH // 2, start_y=CHUNK_HEIGHT // 2)
+    for chunk_x in range(-3, 4):
+        for chunk_y in range(-3, 4):
+            world_map.get_chunk(chunk_x, chunk_y)
+
+    # The scrolling camera on a large terminal, in a borderless world.
+    camera_term = FakeTerminal(width=200, height=60)
+    camera_renderer = Renderer(camera_term, camera=True)
+    camera_map = Map(seed=BENCH_SEED, borders=False)
+    camera_player = Player(start_x=CHUNK_WIDTH // 2, start_y=CHUNK_HEIGHT // 2)
+    fog_renderer = Renderer(camera_term, camera=True, sight_radius=SIGHT_RADIUS)
+
+    views = {
+        "game": (term, lambda: renderer.draw(player, world_map)),
+        "map": (term, lambda: renderer.draw_map_screen(player, world_map)),
+        "terrain_map": (camera_term, lambda: camera_renderer.draw_map_screen(
+            camera_player, camera_map, terrain=True)),
+        "keys": (term, lambda: renderer.draw_keys_screen()),
+        "camera": (camera_term, lambda: camera_renderer.draw(camera_player, camera_map)),
+        "camera_fog": (camera_term, lambda: fog_renderer.draw(camera_player, camera_map)),
+    }
+    results = {}
+    for name, (term, draw) in views.items():
+        # The first frame of a view is a full repaint.
+        renderer.invalidate()
+        camera_renderer.invalidate()
+        fog_renderer.invalidate()
+        first_time = _timed(draw)
+        first_bytes = sum(term.stream.take_frames())
+
+        # Steady state: the player steps back and forth between frames.
+        times = []
+        direction = 1
+        for i in range(frames):
+            if i % 20 == 0:
+                direction = -direction
+            player.move(direction, 0, world_map)
+            camera_player.move(direction, 0, camera_map)
+            times.append(_timed(draw))
+        sizes = term.stream.take_frames()
+        results[name] = {
+            "full_frame_ms": first_time * 1000.0,
+            "full_frame_bytes": first_bytes,
+            "frame": _summary(times),
+            "bytes_per_frame": sum(sizes) / frames,
+        }
+    world_map.close()
+    camera_map.close()
+    return results
+
+
+def bench_memory(chunks=1000):
+    """Peak traced memory after exploring a square of N chunks."""
+    side = int(chunks ** 0.5)
+    tracemalloc.start()
+    world_map = Map(seed=BENCH_SEED)
+    for chunk_y in range(side):
+        for chunk_x in range(side):
+            world_map.get_chunk(chunk_x, chunk_y)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    world_map.close()
+    return {
+        "chunks": side * side,
+        "current_bytes": current,
+        "peak_bytes": peak,
+        "bytes_per_chunk": current / (side * side),
+    }
+
+
+def bench_pathfinding(chunks=(10, 100, 300)):
+    """Time to plan routes of increasing length, before and after caching."""
+    world_map = Map(seed=BENCH_SEED, borders=False)
+    finder = PathFinder(world_map)
+    results = {}
+    for count in chunks:
+        goal = (count * CHUNK_WIDTH + CHUNK_WIDTH // 2, CHUNK_HEIGHT // 2)
+        start = (CHUNK_WIDTH // 2, CHUNK_HEIGHT // 2)
+        cold = _timed(finder.find_path, start, goal)
+        warm = _timed(finder.find_path, start, goal)
+        results[f"{count}_chunks"] = {
+            "cold_ms": cold * 1000.0,
+            "cached_ms": warm * 1000.0,
+            "expansions": finder.expansions,
+        }
+    world_map.close()
+    return results
+
+
+def bench_fov(radii=(SIGHT_RADIUS, 40, 60), steps=300):
+    """
+    Field of view time per step at several sight radii, cast afresh and
+    from the cache.
+    """
+    world_map = Map(seed=BENCH_SEED, borders=False)
+    results = {}
+    for radius in radii:
+        fov = FieldOfView(world_map, radius, cache_size=0)
+        x, y = CHUNK_WIDTH // 2, CHUNK_HEIGHT // 2
+        fov.compute(x, y)  # Builds the opacity of the chunks in reach.
+        fresh = [_timed(fov.compute, x + step % 40, y + step // 40) for step in range(steps)]
+        fov.cache_size = steps
+        for step in range(steps):
+            fov.compute(x + step % 40, y + step // 40)
+        cached = [_timed(fov.compute, x + step % 40, y + step // 40) for step in range(steps)]
+        results[f"radius_{radius}"] = {"cast": _summary(fresh), "cached": _summary(cached)}
+    world_map.close()
+    return results
+
+
+def bench_simulation(sides=(10, 20), frames=100):
+    """
+    World simulation throughput over N x N loaded chunks, and camera frame
+    times with the simulation idle and with it stepping non-stop.
+    """
+    results = {}
+    for side in sides:
+        world_map = Map(seed=BENCH_SEED, borders=False, cache_chunks=side * side + 16)
+        for chunk_y in range(side):
+            for chunk_x in range(side):
+                world_map.get_chunk(chunk_x, chunk_y)
+        keys = list(world_map.chunks.keys())
+        stack = np.stack([chunk for _, chunk in world_map.chunks.items()])
+        rules = default_rules()
+        steps = [_timed(step_chunks, keys, stack, rules, BENCH_SEED, step) for step in range(5)]
+
+        term = FakeTerminal(width=200, height=60)
+        renderer = Renderer(term, camera=True)
+        player = Player(start_x=CHUNK_WIDTH // 2, start_y=CHUNK_HEIGHT // 2,
+                        start_chunk_x=side // 2, start_chunk_y=side // 2)
+
+        def frame_times(simulation=None):
+            times, updates = [], []
+            for i in range(frames):
+                if simulation is not None:
+                    updates.append(_timed(simulation.update, world_map))
+                player.move(1 if i % 20 < 10 else -1, 0, world_map)
+                times.append(_timed(renderer.draw, player, world_map))
+            return times, updates
+
+        idle, _ = frame_times()
+        simulation = WorldSimulation(seed=BENCH_SEED, interval=0.0)
+        busy, updates = frame_times(simulation)
+        simulation.close()
+        results[f"{side * side}_chunks"] = {
+            "step_ms": _summary(steps),
+            "cells_per_second": stack.size / float(np.mean(steps)),
+            "frame_idle": _summary(idle),
+            "frame_simulating": _summary(busy),
+            "update": _summary(updates),
+            "steps_applied": simulation.steps,
+        }
+        world_map.close()
+    return results
+
+
+def bench_entities(sides=(10, 40), ticks=500):
+    """
+    Time of one simulation tick around the player as the number of
+    populated chunks (and so of entities) in the world grows.
+    """
+    results = {}
+    for side in sides:
+        world_map = Map(seed=BENCH_SEED, borders=False)
+        for chunk_y in range(-side // 2, side // 2):
+            for chunk_x in range(-side // 2, side // 2):
+                world_map.get_chunk(chunk_x, chunk_y)
+        entities = world_map.entities
+        times = [_timed(entities.tick, 0, 0) for _ in range(ticks)]
+        results[f"{side * side}_chunks"] = {
+            "entities": entities.count,
+            "tick": _summary(times),
+        }
+        world_map.close()
+    return results
+
+
+def bench_replay():
+    """
+    Replays the recorded sessions in data/recordings (see replay.py), a
+    workload of real play. Reports nothing if there are none.
+    """
+    from game import RECORDINGS_DIR
+    from replay import replay, summarize, recordings_in
+
+    if not os.path.isdir(RECORDINGS_DIR):
+        return {"recordings": 0}
+    paths = recordings_in([RECORDINGS_DIR])
+    timings = []
+    diverged = 0
+    for path in paths:
+        result = replay(path)
+        timings.extend(result["timings"])
+        diverged += result["diverged"] is not None
+    return {"recordings": len(paths), "diverged": diverged, "steps": summarize(timings)}
+
+
+BENCHMARKS = {
+    "generation": bench_generation,
+    "terrain_quality": bench_terrain_quality,
+    "movement": bench_movement,
+    "rendering": bench_rendering,
+    "pathfinding": bench_pathfinding,
+    "fov": bench_fov,
+    "simulation": bench_simulation,
+    "entities": bench_entities,
+    "replay": bench_replay,
+    "memory": bench_memory,
+}
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _flatten(results, prefix=""):
+    """Flattens nested results into {"a.b.c": number}."""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + "."))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+
+def compare(current, baseline):
+    """Prints every metric next to its baseline value and the change."""
+    now = _flatten(current["results"])
+    before = _flatten(baseline["results"])
+    print(f"\n--- Compared with {baseline.get('revision') or 'baseline'} ---")
+    for name in sorted(now):
+        if name not in before:
+            continue
+        old, new = before[name], now[name]
+        change = f"{(new - old) / old * 100:+7.1f}%" if old else "    n/a"
+        print(f"  {name:55s} {old:14.3f} -> {new:14.3f}  {change}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", default="benchmark_results.json",
+                        help="where to write the JSON results")
+    parser.add_argument("--only", nargs="*", choices=sorted(BENCHMARKS),
+                        help="run only these benchmarks")
+    parser.add_argument("--compare", help="a previous results file to compare against")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, bench in BENCHMARKS.items():
+        if args.only and name not in args.only:
+            continue
+        print(f"Running {name}...", flush=True)
+        results[name] = bench()
+
+    report = {
+        "revision": _git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+    print(json.dumps(results, indent=2))
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as fh:
+            compare(report, json.load(fh))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
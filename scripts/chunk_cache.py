@@ -0,0 +1,121 @@
+import sys
+from collections import OrderedDict
+
+
+def estimate_chunk_size(chunk):
+    """
+    Estimates the memory held by a chunk's tile array, including its data
+    buffer.
+    """
+    return sys.getsizeof(chunk)
+
+
+class ChunkCache:
+    """
+    A least-recently-used store for resident chunks with a count and/or
+    memory budget. Pinned chunks (those around the player) are never evicted.
+
+    It behaves like the plain dict it replaces for `in`, indexing, `keys()`
+    and `len()`, so existing callers keep working.
+    """
+
+    def __init__(self, max_chunks=None, max_bytes=None, on_evict=None, size_of=estimate_chunk_size):
+        """
+        Args:
+            max_chunks (int, optional): Maximum number of resident chunks.
+            max_bytes (int, optional): Maximum estimated memory of resident chunks.
+            on_evict (callable, optional): Called with (key, chunk) for each
+                                           evicted chunk, e.g. to spill it to disk.
+            size_of (callable, optional): Estimates the memory of one chunk.
+        """
+        self.max_chunks = max_chunks
+        self.max_bytes = max_bytes
+        self._on_evict = on_evict
+        self._size_of = size_of
+        self._chunks = OrderedDict()
+        self._sizes = {}
+        self._pinned = set()
+        self.total_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key):
+        return key in self._chunks
+
+    def __getitem__(self, key):
+        self._chunks.move_to_end(key)
+        return self._chunks[key]
+
+    def __setitem__(self, key, chunk):
+        if key in self._chunks:
+            self.total_bytes -= self._sizes[key]
+        self._chunks[key] = chunk
+        self._chunks.move_to_end(key)
+        self._sizes[key] = self._size_of(chunk)
+        self.total_bytes += self._sizes[key]
+        self._evict()
+
+    def __len__(self):
+        return len(self._chunks)
+
+    def __iter__(self):
+        return iter(self._chunks)
+
+    def keys(self):
+        return self._chunks.keys()
+
+    def items(self):
+        return self._chunks.items()
+
+    def get(self, key):
+        """Returns a resident chunk and marks it as recently used, or None."""
+        chunk = self._chunks.get(key)
+        if chunk is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._chunks.move_to_end(key)
+        return chunk
+
+    def peek(self, key):
+        """Returns a resident chunk without marking it as recently used, or None."""
+        return self._chunks.get(key)
+
+    def pin(self, keys):
+        """Replaces the set of chunks that must stay resident."""
+        self._pinned = set(keys)
+        self._evict()
+
+    def _over_budget(self):
+        if self.max_chunks is not None and len(self._chunks) > self.max_chunks:
+            return True
+        return self.max_bytes is not None and self.total_bytes > self.max_bytes
+
+    def _evict(self):
+        """Drops least-recently-used, unpinned chunks until within budget."""
+        if not self._over_budget():
+            return
+        for key in list(self._chunks):
+            if not self._over_budget():
+                break
+            if key in self._pinned:
+                continue
+            chunk = self._chunks.pop(key)
+            self.total_bytes -= self._sizes.pop(key)
+            self.evictions += 1
+            if self._on_evict is not None:
+                self._on_evict(key, chunk)
+
+    def stats(self):
+        """Returns the counters as a dictionary."""
+        lookups = self.hits + self.misses
+        return {
+            "resident": len(self._chunks),
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,252 @@
+import json
+import mmap
+import os
+import queue
+import shutil
+import threading
+
+import numpy as np
+
+from terrain import CHUNK_WIDTH, CHUNK_HEIGHT
+from tiles import TILE_DTYPE
+
+# Chunks are grouped into square regions, one file per region.
+REGION_SIZE = 16
+SLOTS_PER_REGION = REGION_SIZE * REGION_SIZE
+
+# Each region file starts with one presence byte per slot (the index),
+# followed by a fixed-size record per slot.
+RECORD_SIZE = CHUNK_WIDTH * CHUNK_HEIGHT
+HEADER_SIZE = SLOTS_PER_REGION
+REGION_FILE_SIZE = HEADER_SIZE + SLOTS_PER_REGION * RECORD_SIZE
+
+# Version 2 stores one Tile code per byte instead of the ascii_art glyph.
+FORMAT_VERSION = 2
+
+
+def encode_chunk(chunk):
+    """Packs a chunk's tile array into a fixed-size record."""
+    return chunk.tobytes()
+
+
+def decode_chunk(record):
+    """
+    Unpacks a record produced by encode_chunk. The array is copied so it
+    can be modified without touching the mapped file.
+    """
+    return np.frombuffer(record, dtype=TILE_DTYPE).reshape(CHUNK_HEIGHT, CHUNK_WIDTH).copy()
+
+
+def region_of(chunk_x, chunk_y):
+    """Returns ((region_x, region_y), slot) for a chunk coordinate."""
+    region = (chunk_x // REGION_SIZE, chunk_y // REGION_SIZE)
+    slot = (chunk_y % REGION_SIZE) * REGION_SIZE + (chunk_x % REGION_SIZE)
+    return region, slot
+
+
+class ChunkStore:
+    """
+    A persistent on-disk chunk store for one world seed.
+
+    Chunks live in fixed-size records inside region files, which are
+    memory-mapped so loading a chunk is a page-in rather than a file read.
+    Writes are queued and applied by a background thread.
+    """
+
+    def __init__(self, root_dir, seed, borders=True, pipeline=None):
+        """
+        Args:
+            root_dir (str): Directory holding one sub-directory per seed.
+            seed (int): The world seed this store belongs to.
+            borders (bool): Whether the world's chunks have border walls.
+                            Borderless worlds are stored separately.
+            pipeline (list, optional): Stage names of a custom terrain
+                                       pipeline. A store written by another
+                                       pipeline is discarded.
+        """
+        self.seed = seed
+        self.borders = borders
+        self.pipeline = pipeline
+        self.path = os.path.join(root_dir, str(seed) if borders else f"{seed}-open")
+        os.makedirs(self.path, exist_ok=True)
+        self._check_metadata()
+
+        self._regions = {}
+        self._regions_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop,
+                                        name="chunk-store-writer", daemon=True)
+        self._writer.start()
+
+        self.loads = 0
+        self.saves = 0
+
+    def _check_metadata(self):
+        """
+        Writes or validates the per-seed metadata file. The store only holds
+        terrain that can be regenerated from the seed, so a store written in
+        an incompatible format, or whose metadata can't be read, is discarded
+        rather than treated as an error.
+        """
+        meta_path = os.path.join(self.path, "world.json")
+        metadata = {
+            "seed": self.seed,
+            "borders": self.borders,
+            "version": FORMAT_VERSION,
+            "chunk_width": CHUNK_WIDTH,
+            "chunk_height": CHUNK_HEIGHT,
+            "region_size": REGION_SIZE,
+        }
+        if self.pipeline is not None:
+            metadata["pipeline"] = list(self.pipeline)
+        if os.path.exists(meta_path):
+            try:
+                with open(meta_path, "r", encoding="utf-8") as fh:
+                    existing = json.load(fh)
+            except (OSError, ValueError):
+                existing = None
+            if existing == metadata:
+                return
+            shutil.rmtree(self.path)
+            os.makedirs(self.path)
+
+        with open(meta_path, "w", encoding="utf-8") as fh:
+            json.dump(metadata, fh, indent=2)
+
+    def _region_path(self, region):
+        return os.path.join(self.path, f"r.{region[0]}.{region[1]}.bin")
+
+    def _open_region(self, region, create):
+        """Returns the mmap for a region, creating the file if asked to."""
+        with self._regions_lock:
+            mapped = self._regions.get(region)
+            if mapped is not None:
+                return mapped
+
+            path = self._region_path(region)
+            if not os.path.exists(path):
+                if not create:
+                    return None
+                with open(path, "wb") as fh:
+                    fh.truncate(REGION_FILE_SIZE)
+
+            with open(path, "r+b") as fh:
+                mapped = mmap.mmap(fh.fileno(), REGION_FILE_SIZE, access=mmap.ACCESS_WRITE)
+            self._regions[region] = mapped
+            return mapped
+
+    def contains(self, chunk_x, chunk_y):
+        """Returns True if the chunk has been written to disk."""
+        region, slot = region_of(chunk_x, chunk_y)
+        mapped = self._open_region(region, create=False)
+        return mapped is not None and mapped[slot] == 1
+
+    def load(self, chunk_x, chunk_y):
+        """
+        Pages a chunk in from disk.
+
+        Returns:
+            The chunk's tile array, or None if it is not stored.
+        """
+        region, slot = region_of(chunk_x, chunk_y)
+        mapped = self._open_region(region, create=False)
+        if mapped is None or mapped[slot] != 1:
+            return None
+
+        offset = HEADER_SIZE + slot * RECORD_SIZE
+        self.loads += 1
+        return decode_chunk(mapped[offset:offset + RECORD_SIZE])
+
+    def save(self, chunk_x, chunk_y, chunk):
+        """
+        Queues a chunk to be written. The chunk is encoded immediately, so
+        later changes to it are not picked up by this save.
+        """
+        self.save_record(chunk_x, chunk_y, encode_chunk(chunk))
+
+    def save_record(self, chunk_x, chunk_y, record):
+        """Queues an already encoded chunk (see encode_chunk) to be written."""
+        self._queue.put(((chunk_x, chunk_y), record))
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                (chunk_x, chunk_y), record = item
+                region, slot = region_of(chunk_x, chunk_y)
+                mapped = self._open_region(region, create=True)
+                offset = HEADER_SIZE + slot * RECORD_SIZE
+                mapped[offset:offset + RECORD_SIZE] = record
+                # The presence byte goes last so readers never see a
+                # half-written record.
+                mapped[slot] = 1
+                self.saves += 1
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """Waits for queued writes and syncs the region files to disk."""
+        self._queue.join()
+        with self._regions_lock:
+            for mapped in self._regions.values():
+                mapped.flush()
+
+    def stored_chunks(self):
+        """Yields the coordinates of every chunk on disk."""
+        for name in os.listdir(self.path):
+            if not (name.startswith("r.") and name.endswith(".bin")):
+                continue
+            _, region_x, region_y, _ = name.split(".")
+            region = (int(region_x), int(region_y))
+            mapped = self._open_region(region, create=False)
+            for slot in range(SLOTS_PER_REGION):
+                if mapped[slot] == 1:
+                    yield (region[0] * REGION_SIZE + slot % REGION_SIZE,
+                           region[1] * REGION_SIZE + slot // REGION_SIZE)
+
+    def close(self):
+        """Finishes pending writes and unmaps the region files."""
+        self.flush()
+        self._queue.put(None)
+        self._writer.join()
+        with self._regions_lock:
+            for mapped in self._regions.values():
+                mapped.close()
+            self._regions.clear()
+
+
+# This block allows for testing the chunk store independently.
+if __name__ == '__main__':
+    import tempfile
+    from terrain import TerrainGenerator
+
+    print("--- Testing Chunk Store ---")
+    generator = TerrainGenerator(123)
+    with tempfile.TemporaryDirectory() as root:
+        store = ChunkStore(root, seed=123)
+        coords = [(0, 0), (-1, 0), (15, 15), (16, -17)]
+        for chunk_x, chunk_y in coords:
+            assert store.load(chunk_x, chunk_y) is None
+            store.save(chunk_x, chunk_y, generator.generate(chunk_x, chunk_y))
+        store.close()
+
+        # A fresh store for the same seed sees the chunks written before.
+        store = ChunkStore(root, seed=123)
+        for chunk_x, chunk_y in coords:
+            assert np.array_equal(store.load(chunk_x, chunk_y), generator.generate(chunk_x, chunk_y))
+        assert sorted(store.stored_chunks()) == sorted(coords)
+        print(f"Round-tripped {len(coords)} chunks across {len(os.listdir(store.path)) - 1} region files.")
+        store.close()
+
+        # A corrupt metadata file discards the store instead of failing.
+        with open(os.path.join(store.path, "world.json"), "w", encoding="utf-8") as fh:
+            fh.write('{"seed": 1')
+        store = ChunkStore(root, seed=123)
+        assert store.load(0, 0) is None and not list(store.stored_chunks())
+        store.save(0, 0, generator.generate(0, 0))
+        store.close()
+        print("A store with corrupt metadata is discarded and written afresh.")
+
+    print("Chunk store tests passed!")
@@ -0,0 +1,371 @@
+import random
+
+from terrain import CHUNK_WIDTH, CHUNK_HEIGHT
+from tiles import Tile, WALKABLE
+from ascii_art import BUILDINGS, NATURE, PEOPLE
+
+# Chance that a chunk gets each kind of structure, tried in this order.
+STRUCTURE_CHANCES = [
+    ("small_house", BUILDINGS["small_house"], 0.35),
+    ("small_house", BUILDINGS["small_house"], 0.15),
+    ("shop", BUILDINGS["shop"], 0.15),
+    ("pine_tree", NATURE["pine_tree"], 0.5),
+    ("pine_tree", NATURE["pine_tree"], 0.3),
+    ("rocks_cluster", NATURE["rocks_cluster"], 0.3),
+]
+
+# Villagers spawned around each building.
+VILLAGERS_PER_BUILDING = (1, 3)
+
+# Random spots tried for each structure before giving up on it.
+PLACEMENT_ATTEMPTS = 8
+
+# Chunks around the player whose entities are simulated.
+ACTIVE_RADIUS = 2
+
+# Most missed ticks a chunk replays when it becomes active again. Beyond
+# this a wandering villager is as good as anywhere in its chunk.
+MAX_CATCH_UP = 20
+
+# Steps a villager can take: stay, or one of the four directions.
+_WANDER = [(0, 0), (1, 0), (-1, 0), (0, 1), (0, -1)]
+
+
+class Entity:
+    """
+    Something placed in the world on top of the terrain: a structure made
+    of several cells, or a single-cell villager.
+    """
+
+    def __init__(self, kind, x, y, art, solid=True, mobile=False):
+        """
+        Args:
+            kind (str): The ascii_art name, e.g. "small_house".
+            x (int): Global x of the top-left corner.
+            y (int): Global y of the top-left corner.
+            art (list): Lines of the entity's ascii_art. Spaces are not part
+                        of the entity and show the terrain beneath.
+            solid (bool): Whether the player is blocked by it.
+            mobile (bool): Whether it moves when simulated.
+        """
+        self.kind = kind
+        self.x = x
+        self.y = y
+        self.art = art
+        self.solid = solid
+        self.mobile = mobile
+        self.home = None  # The chunk a mobile entity stays in.
+
+    def cells(self):
+        """Yields ((x, y), glyph) for every cell the entity covers."""
+        for dy, line in enumerate(self.art):
+            for dx, glyph in enumerate(line):
+                if glyph != " ":
+                    yield (self.x + dx, self.y + dy), glyph
+
+
+class SpatialHash:
+    """
+    Entity cells bucketed by chunk, then by global cell, so checking a tile
+    and listing what to draw in a chunk are both dictionary lookups.
+    """
+
+    def __init__(self):
+        self._buckets = {}
+
+    @staticmethod
+    def _chunk_of(x, y):
+        return x // CHUNK_WIDTH, y // CHUNK_HEIGHT
+
+    def add(self, entity):
+        for cell, glyph in entity.cells():
+            self._buckets.setdefault(self._chunk_of(*cell), {})[cell] = (entity, glyph)
+
+    def remove(self, entity):
+        for cell, _ in entity.cells():
+            bucket = self._buckets.get(self._chunk_of(*cell))
+            if bucket is not None and bucket.get(cell, (None,))[0] is entity:
+                del bucket[cell]
+
+    def move(self, entity, x, y):
+        """Moves an entity so its top-left corner is at (x, y)."""
+        self.remove(entity)
+        entity.x, entity.y = x, y
+        self.add(entity)
+
+    def at(self, x, y):
+        """Returns the entity covering a global cell, or None."""
+        bucket = self._buckets.get(self._chunk_of(x, y))
+        if bucket is None:
+            return None
+        entry = bucket.get((x, y))
+        return None if entry is None else entry[0]
+
+    def in_chunk(self, chunk_x, chunk_y):
+        """Returns {(x, y): (entity, glyph)} for the cells in a chunk."""
+        return self._buckets.get((chunk_x, chunk_y), {})
+
+
+class EntityLayer:
+    """
+    The entities of one world. Chunks are populated the first time their
+    tiles are seen, deterministically from the seed and chunk coordinates,
+    and only the chunks around the player are simulated. Chunks left behind
+    are frozen and replay the ticks they missed when the player returns.
+    """
+
+    def __init__(self, seed, tiles_of):
+        """
+        Args:
+            seed (int): The world seed.
+            tiles_of (callable): Returns the tile array of a chunk, given
+                                 (chunk_x, chunk_y), or None if it is not
+                                 in memory. Used by villagers to find
+                                 walkable ground.
+        """
+        self.seed = seed
+        self._tiles_of = tiles_of
+        self.spatial = SpatialHash()
+        self._populated = set()
+        self._placed = {}      # chunk -> every entity populate() put there
+        self._movers = {}      # chunk -> mobile entities living there
+        self._last_tick = {}   # chunk -> tick its movers were last updated
+        self._rng = random.Random(seed)
+        self.time = 0
+        self.count = 0
+        self.moved_chunks = set()  # Chunks where something moved last tick.
+
+    def chunk_rng(self, chunk_x, chunk_y):
+        """
+        A random generator that depends only on the seed and the chunk, so a
+        chunk is populated the same way in every session and process.
+        """
+        return random.Random(f"{self.seed}:{chunk_x}:{chunk_y}")
+
+    def populate(self, chunk_x, chunk_y, chunk):
+        """
+        Places a chunk's structures and villagers, the first time it is
+        called for that chunk. Structures only go on open grassland and
+        never cover the chunk's centre, which the player starts on and
+        travels to.
+
+        Args:
+            chunk_x (int): The chunk's x-coordinate.
+            chunk_y (int): The chunk's y-coordinate.
+            chunk (np.ndarray): The chunk's tile array.
+
+        Returns:
+            bool: True if the chunk was populated by this call.
+        """
+        key = (chunk_x, chunk_y)
+        if key in self._populated:
+            return False
+        self._populated.add(key)
+        self._last_tick[key] = self.time
+
+        rng = self.chunk_rng(chunk_x, chunk_y)
+        left, top = chunk_x * CHUNK_WIDTH, chunk_y * CHUNK_HEIGHT
+        centre = (CHUNK_WIDTH // 2, CHUNK_HEIGHT // 2)
+        buildings = []
+        for kind, art, chance in STRUCTURE_CHANCES:
+            if rng.random() >= chance:
+                continue
+            width, height = max(len(line) for line in art), len(art)
+            for _ in range(PLACEMENT_ATTEMPTS):
+                x = rng.randrange(1, CHUNK_WIDTH - width - 1)
+                y = rng.randrange(1, CHUNK_HEIGHT - height - 1)
+                if x <= centre[0] < x + width and y <= centre[1] < y + height:
+                    continue
+                if not (chunk[y:y + height, x:x + width] == Tile.EMPTY).all():
+                    continue
+                entity = Entity(kind, left + x, top + y, art)
+                if any(self.spatial.at(*cell) for cell, _ in entity.cells()):
+                    continue
+                self.spatial.add(entity)
+                self._placed.setdefault(key, []).append(entity)
+                self.count += 1
+                if kind in BUILDINGS:
+                    buildings.append(entity)
+                break
+
+        for building in buildings:
+            for _ in range(rng.randint(*VILLAGERS_PER_BUILDING)):
+                x = building.x + rng.randrange(-3, 4)
+                y = building.y + len(building.art) + rng.randrange(0, 2)
+                if self._free(key, x, y, chunk):
+                    villager = Entity("villager", x, y, [PEOPLE["villager"]], solid=False, mobile=True)
+                    villager.home = key
+                    self.spatial.add(villager)
+                    self._placed.setdefault(key, []).append(villager)
+                    self._movers.setdefault(key, []).append(villager)
+                    self.count += 1
+        return True
+
+    def is_populated(self, chunk_x, chunk_y):
+        """Whether a chunk's entities are placed (see populate and forget)."""
+        return (chunk_x, chunk_y) in self._populated
+
+    def forget(self, chunk_x, chunk_y):
+        """
+        Removes a chunk's entities, e.g. of a chunk only looked at from afar.
+        Entities never leave the chunk they were placed in, so populating it
+        again later puts back the same ones.
+
+        Returns:
+            bool: True if the chunk had been populated.
+        """
+        key = (chunk_x, chunk_y)
+        if key not in self._populated:
+            return False
+        self._populated.discard(key)
+        for entity in self._placed.pop(key, ()):
+            self.spatial.remove(entity)
+            self.count -= 1
+        self._movers.pop(key, None)
+        self._last_tick.pop(key, None)
+        return True
+
+    def _free(self, key, x, y, chunk):
+        """Whether a villager living in chunk `key` may stand on a global cell."""
+        local_x, local_y = x - key[0] * CHUNK_WIDTH, y - key[1] * CHUNK_HEIGHT
+        if not (0 <= local_x < CHUNK_WIDTH and 0 <= local_y < CHUNK_HEIGHT):
+            return False
+        return bool(WALKABLE[chunk[local_y, local_x]]) and self.spatial.at(x, y) is None
+
+    def blocks(self, x, y):
+        """Whether a solid entity covers a global cell."""
+        entity = self.spatial.at(x, y)
+        return entity is not None and entity.solid
+
+    def solid_cells(self, chunk_x, chunk_y):
+        """Global cells of a chunk covered by solid entities."""
+        return [cell for cell, (entity, _) in self.spatial.in_chunk(chunk_x, chunk_y).items()
+                if entity.solid]
+
+    def tick(self, chunk_x, chunk_y, player=None, radius=ACTIVE_RADIUS):
+        """
+        Advances the simulation by one tick around a chunk. Chunks further
+        away, or not in memory, are not touched at all; when they come back
+        into range they replay up to MAX_CATCH_UP of the ticks they missed.
+
+        Args:
+            chunk_x (int): The x-coordinate of the player's chunk.
+            chunk_y (int): The y-coordinate of the player's chunk.
+            player (tuple, optional): The player's global cell, which
+                                      villagers step around.
+            radius (int): Chunks around the player that are simulated.
+
+        Returns:
+            int: Number of entities that moved.
+        """
+        return self.tick_around([(chunk_x, chunk_y)], [] if player is None else [player], radius)
+
+    def tick_around(self, centres, players=(), radius=ACTIVE_RADIUS):
+        """
+        Advances the simulation by one tick around several players at once,
+        as tick() does for one. Chunks near more than one of them are still
+        only simulated once.
+
+        Args:
+            centres (iterable): The chunks the players are in.
+            players (iterable): The players' global cells.
+            radius (int): Chunks around each player that are simulated.
+
+        Returns:
+            int: Number of entities that moved.
+        """
+        self.time += 1
+        active = {
+            (chunk_x + dx, chunk_y + dy)
+            for chunk_x, chunk_y in centres
+            for dy in range(-radius, radius + 1)
+            for dx in range(-radius, radius + 1)
+        }
+        occupied = set(players)
+        self.moved_chunks = set()
+        moved = 0
+        for key in active:
+            movers = self._movers.get(key)
+            if not movers:
+                continue
+            chunk = self._tiles_of(*key)
+            if chunk is None:
+                continue
+            steps = min(self.time - self._last_tick[key], MAX_CATCH_UP)
+            self._last_tick[key] = self.time
+            before = moved
+            for _ in range(steps):
+                for entity in movers:
+                    moved += self._wander(entity, chunk, occupied)
+            if moved != before:
+                self.moved_chunks.add(key)
+        return moved
+
+    def _wander(self, entity, chunk, occupied):
+        step_x, step_y = self._rng.choice(_WANDER)
+        if (step_x, step_y) == (0, 0):
+            return 0
+        x, y = entity.x + step_x, entity.y + step_y
+        if (x, y) in occupied or not self._free(entity.home, x, y, chunk):
+            return 0
+        self.spatial.move(entity, x, y)
+        return 1
+
+
+# This block tests placement and the active-region simulation.
+if __name__ == '__main__':
+    import time
+    from terrain import TerrainGenerator
+
+    print("--- Testing Entities ---")
+    generator = TerrainGenerator(123, borders=False)
+    chunks = {}
+
+    def tiles_of(chunk_x, chunk_y):
+        if (chunk_x, chunk_y) not in chunks:
+            chunks[(chunk_x, chunk_y)] = generator.generate(chunk_x, chunk_y)
+        return chunks[(chunk_x, chunk_y)]
+
+    layer = EntityLayer(123, tiles_of)
+    for chunk_y in range(-20, 20):
+        for chunk_x in range(-20, 20):
+            layer.populate(chunk_x, chunk_y, tiles_of(chunk_x, chunk_y))
+    print(f"Populated 1600 chunks with {layer.count} entities.")
+
+    # Placement depends only on the seed and chunk.
+    again = EntityLayer(123, tiles_of)
+    again.populate(3, -4, tiles_of(3, -4))
+    first = sorted((cell, glyph) for cell, (_, glyph) in again.spatial.in_chunk(3, -4).items())
+    second = sorted((cell, glyph) for cell, (_, glyph) in layer.spatial.in_chunk(3, -4).items())
+    assert first == second
+
+    # Structures never stand on anything but grassland, nor on a centre.
+    for key in chunks:
+        for (x, y), (entity, _) in layer.spatial.in_chunk(*key).items():
+            local = (x - key[0] * CHUNK_WIDTH, y - key[1] * CHUNK_HEIGHT)
+            assert local != (CHUNK_WIDTH // 2, CHUNK_HEIGHT // 2) or entity.mobile
+            assert chunks[key][local[1], local[0]] == Tile.EMPTY or entity.mobile
+
+    # Only the active region is simulated; frozen chunks catch up later.
+    far = next(key for key, movers in layer._movers.items() if abs(key[0]) > 5 and movers)
+    before = [(e.x, e.y) for e in layer._movers[far]]
+    for _ in range(50):
+        layer.tick(0, 0)
+    assert [(e.x, e.y) for e in layer._movers[far]] == before
+    layer.tick(*far)
+    assert layer._last_tick[far] == layer.time
+
+    # A forgotten chunk is populated the same way again.
+    count = layer.count
+    assert layer.forget(3, -4) and not layer.spatial.in_chunk(3, -4)
+    layer.populate(3, -4, tiles_of(3, -4))
+    assert sorted((cell, glyph) for cell, (_, glyph) in layer.spatial.in_chunk(3, -4).items()) == second
+    assert layer.count == count
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        layer.tick(0, 0)
+    per_tick = (time.perf_counter() - start) / 1000
+    print(f"One tick of the active region: {per_tick * 1000:.3f} ms "
+          f"with {layer.count} entities in the world.")
+    print("\nEntity tests passed!")
@@ -0,0 +1,56 @@
+# Block sizes (in chunks) of the coarse explored sets kept for zoomed-out
+# map views: a block counts as explored if any chunk inside it is.
+COARSE_LEVELS = (4, 16)
+
+
+class ExploredIndex:
+    """
+    The set of chunks the player has loaded, kept up to date incrementally
+    by Map so the world map never has to rescan it.
+
+    Alongside the set it tracks the running bounds, coarse block sets for
+    zoomed-out views and a version number that changes whenever a new chunk
+    is added, which lets the renderer cache its map between frames.
+    """
+
+    def __init__(self):
+        self._chunks = set()
+        self.coarse = {level: set() for level in COARSE_LEVELS}
+        self.min_x = self.max_x = self.min_y = self.max_y = None
+        self.version = 0
+
+    def add(self, key):
+        """Records a chunk as explored."""
+        if key in self._chunks:
+            return
+        self._chunks.add(key)
+        chunk_x, chunk_y = key
+        if self.min_x is None:
+            self.min_x = self.max_x = chunk_x
+            self.min_y = self.max_y = chunk_y
+        else:
+            self.min_x = min(self.min_x, chunk_x)
+            self.max_x = max(self.max_x, chunk_x)
+            self.min_y = min(self.min_y, chunk_y)
+            self.max_y = max(self.max_y, chunk_y)
+        for level, blocks in self.coarse.items():
+            blocks.add((chunk_x // level, chunk_y // level))
+        self.version += 1
+
+    def contains_block(self, block_x, block_y, level):
+        """
+        Returns True if any chunk in a block is explored. Level 1 is a
+        single chunk; other levels must be one of COARSE_LEVELS.
+        """
+        if level == 1:
+            return (block_x, block_y) in self._chunks
+        return (block_x, block_y) in self.coarse[level]
+
+    def __contains__(self, key):
+        return key in self._chunks
+
+    def __len__(self):
+        return len(self._chunks)
+
+    def __iter__(self):
+        return iter(self._chunks)
@@ -0,0 +1,322 @@
+"""
+Exports a rectangle of the world as an image or a text file.
+
+The region is either the chunks explored in a save (--save), or any
+rectangle of chunks of a seed (--seed), generated on the fly. Chunks are
+generated on a process pool a few blocks ahead of the writer and written
+band by band (BLOCK_SIZE rows of chunks at a time), so memory stays the same
+however tall the region is. The format follows the file extension: .png
+and .ppm give one pixel per tile in the colours of tiles.COLORS, .txt the
+tiles' ascii_art glyphs:
+
+    python scripts/export.py --seed 123 --width 64 --height 64 world.png
+    python scripts/export.py --seed 123 --x 0 --y 0 --width 4 --height 4 world.txt
+    python scripts/export.py --save data/saves/autosave explored.png --scale 2
+"""
+import argparse
+import multiprocessing
+import os
+import struct
+import sys
+import time
+import zlib
+from collections import deque
+
+import numpy as np
+
+from savegame import SaveGame
+from terrain import CHUNK_WIDTH, CHUNK_HEIGHT, generate_chunks
+from tiles import COLORS, GLYPH_TABLE
+
+# Chunks per side of one unit of work, as in prebake.py. A band of the
+# output is one row of blocks.
+BLOCK_SIZE = 4
+
+# Blocks generated ahead of the writer, per worker.
+BLOCKS_AHEAD = 2
+
+# Tile code of chunks outside the exported area, e.g. unexplored ones.
+# They are black in images and blank in text.
+UNKNOWN = 255
+UNKNOWN_COLOR = (0, 0, 0)
+
+# Codes with no colour of their own stand out.
+MISSING_COLOR = (255, 0, 255)
+
+
+def palette():
+    """The RGB colour of every tile code, as a (256, 3) uint8 array."""
+    colors = np.array([MISSING_COLOR] * 256, dtype=np.uint8)
+    for tile, color in COLORS.items():
+        colors[tile] = color
+    colors[UNKNOWN] = UNKNOWN_COLOR
+    return colors
+
+
+class PNGWriter:
+    """
+    Writes an 8-bit palette PNG a band of rows at a time. Every band is
+    compressed into the one zlib stream and written as IDAT chunks as soon
+    as the compressor gives output.
+    """
+
+    def __init__(self, fh, width, height, scale=1):
+        self.fh = fh
+        self.scale = scale
+        self._compressor = zlib.compressobj(6)
+        fh.write(b"\x89PNG\r\n\x1a\n")
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width * scale, height * scale, 8, 3, 0, 0, 0))
+        self._chunk(b"PLTE", palette().tobytes())
+
+    def _chunk(self, kind, data):
+        self.fh.write(struct.pack(">I", len(data)) + kind + data)
+        self.fh.write(struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF))
+
+    def write_band(self, tiles):
+        """Writes rows of tile codes, one pixel per tile (times the scale)."""
+        pixels = _scaled(tiles, self.scale)
+        # Each row starts with its filter type: 0, none.
+        rows = np.zeros((pixels.shape[0], pixels.shape[1] + 1), dtype=np.uint8)
+        rows[:, 1:] = pixels
+        data = self._compressor.compress(rows.tobytes())
+        if data:
+            self._chunk(b"IDAT", data)
+
+    def close(self):
+        self._chunk(b"IDAT", self._compressor.flush())
+        self._chunk(b"IEND", b"")
+
+
+class PPMWriter:
+    """Writes a binary (P6) PPM, a band of rows at a time."""
+
+    def __init__(self, fh, width, height, scale=1):
+        self.fh = fh
+        self.scale = scale
+        self._colors = palette()
+        fh.write(b"P6\n%d %d\n255\n" % (width * scale, height * scale))
+
+    def write_band(self, tiles):
+        """Writes rows of tile codes, one pixel per tile (times the scale)."""
+        self.fh.write(self._colors[_scaled(tiles, self.scale)].tobytes())
+
+    def close(self):
+        pass
+
+
+class TextWriter:
+    """Writes the tiles' glyphs, one line of text per row of tiles."""
+
+    def __init__(self, fh, width, height, scale=1):
+        self.fh = fh
+        table = bytearray(GLYPH_TABLE)
+        table[UNKNOWN] = ord(" ")
+        self._table = bytes(table)
+
+    def write_band(self, tiles):
+        """Writes rows of tile codes as lines of glyphs."""
+        self.fh.write(b"".join(row.tobytes().translate(self._table) + b"\n" for row in tiles))
+
+    def close(self):
+        pass
+
+
+WRITERS = {
+    ".png": PNGWriter,
+    ".ppm": PPMWriter,
+    ".txt": TextWriter,
+}
+
+
+def _scaled(tiles, scale):
+    if scale == 1:
+        return tiles
+    return np.repeat(np.repeat(tiles, scale, axis=0), scale, axis=1)
+
+
+def export_block(task):
+    """
+    Generates one work item. Runs in the worker processes.
+
+    Returns:
+        dict: Tile arrays of the block's chunks, keyed by chunk coordinates.
+    """
+    seed, block_x, block_y, columns, rows, borders = task
+    return generate_chunks(seed, block_x, block_y, columns, rows, borders=borders)
+
+
+def export(path, seed, chunk_x, chunk_y, width, height, workers=None, borders=False,
+           scale=1, chunks=None, deltas=None, progress=None):
+    """
+    Exports a rectangle of chunks to a file. An unknown format, or a width,
+    height or scale below 1, is a ValueError and writes nothing.
+
+    Args:
+        path (str): The output file. Its extension picks the format (see
+                    WRITERS).
+        seed (int): The world seed.
+        chunk_x (int): The x-coordinate of the top-left chunk.
+        chunk_y (int): The y-coordinate of the top-left chunk.
+        width (int): Number of chunks across.
+        height (int): Number of chunks down.
+        workers (int, optional): Worker processes. 0 generates in this
+                                 process; None uses one per CPU.
+        borders (bool): Generate chunks with border walls.
+        scale (int): Pixels per tile side in images.
+        chunks (set, optional): Only draw these chunks, e.g. the explored
+                                ones. Blocks without any are not generated.
+        deltas (dict, optional): Changed tiles to draw over the terrain, as
+                                 Map.deltas ({chunk: {index: tile}}).
+        progress (callable, optional): Called with the number of bands
+                                       written after each one.
+
+    Returns:
+        int: Number of chunks generated.
+    """
+    writer_class = WRITERS.get(os.path.splitext(path)[1].lower())
+    if writer_class is None:
+        raise ValueError(f"unknown output format {path!r}: use one of {', '.join(WRITERS)}")
+    if min(width, height, scale) < 1:
+        raise ValueError(f"width, height and scale must be at least 1, not {width}, {height} and {scale}")
+
+    def tasks():
+        for block_y in range(chunk_y, chunk_y + height, BLOCK_SIZE):
+            for block_x in range(chunk_x, chunk_x + width, BLOCK_SIZE):
+                columns = min(BLOCK_SIZE, chunk_x + width - block_x)
+                rows = min(BLOCK_SIZE, chunk_y + height - block_y)
+                wanted = chunks is None or any((x, y) in chunks
+                                               for y in range(block_y, block_y + rows)
+                                               for x in range(block_x, block_x + columns))
+                yield block_y, (seed, block_x, block_y, columns, rows, borders) if wanted else None
+
+    generated = 0
+    with open(path, "wb") as fh:
+        writer = writer_class(fh, width * CHUNK_WIDTH, height * CHUNK_HEIGHT, scale)
+        band = band_y = None
+        bands = 0
+        for block_y, block in _generate_ahead(tasks(), workers):
+            if block_y != band_y:
+                if band is not None:
+                    writer.write_band(band)
+                    bands += 1
+                    if progress is not None:
+                        progress(bands)
+                band_y = block_y
+                rows = min(BLOCK_SIZE, chunk_y + height - block_y)
+                band = np.full((rows * CHUNK_HEIGHT, width * CHUNK_WIDTH), UNKNOWN, dtype=np.uint8)
+            for (x, y), tiles in block.items():
+                if chunks is not None and (x, y) not in chunks:
+                    continue
+                left, top = (x - chunk_x) * CHUNK_WIDTH, (y - band_y) * CHUNK_HEIGHT
+                area = band[top:top + CHUNK_HEIGHT, left:left + CHUNK_WIDTH]
+                area[...] = tiles
+                delta = deltas.get((x, y)) if deltas else None
+                if delta:
+                    indices = np.fromiter(delta, dtype=np.int64, count=len(delta))
+                    area[indices // CHUNK_WIDTH, indices % CHUNK_WIDTH] = list(delta.values())
+            generated += len(block)
+        if band is not None:
+            writer.write_band(band)
+            if progress is not None:
+                progress(bands + 1)
+        writer.close()
+    return generated
+
+
+def _generate_ahead(tasks, workers):
+    """
+    Yields (block_y, chunks) for each (block_y, task) in order, with up to
+    BLOCKS_AHEAD blocks per worker generated ahead of the caller. Tasks of
+    None yield no chunks.
+    """
+    if workers == 0:
+        for block_y, task in tasks:
+            yield block_y, {} if task is None else export_block(task)
+        return
+    with multiprocessing.Pool(processes=workers) as pool:
+        ahead = BLOCKS_AHEAD * (workers or os.cpu_count() or 1)
+        pending = deque()
+        for block_y, task in tasks:
+            pending.append((block_y, None if task is None else pool.apply_async(export_block, (task,))))
+            if len(pending) >= ahead:
+                yield _take(pending)
+        while pending:
+            yield _take(pending)
+
+
+def _take(pending):
+    block_y, result = pending.popleft()
+    return block_y, {} if result is None else result.get()
+
+
+def _at_least(minimum):
+    """An argparse type for whole numbers of at least `minimum`."""
+    def parse(text):
+        value = int(text)
+        if value < minimum:
+            raise argparse.ArgumentTypeError(f"must be at least {minimum}, not {value}")
+        return value
+    return parse
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("output", help="file to write: .png, .ppm or .txt")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--seed", type=int, help="export a rectangle of this world")
+    source.add_argument("--save", metavar="DIR", help="export the chunks explored in this save")
+    parser.add_argument("--x", type=int, default=None,
+                        help="left chunk (default: centred on the start chunk, or the explored area)")
+    parser.add_argument("--y", type=int, default=None,
+                        help="top chunk (default: centred on the start chunk, or the explored area)")
+    parser.add_argument("--width", type=_at_least(1), default=None, help="chunks across (default 32)")
+    parser.add_argument("--height", type=_at_least(1), default=None, help="chunks down (default 32)")
+    parser.add_argument("--workers", type=_at_least(0), default=None,
+                        help="worker processes (default: one per CPU, 0 for none)")
+    parser.add_argument("--borders", action="store_true",
+                        help="a bordered world instead of the game's borderless one")
+    parser.add_argument("--scale", type=_at_least(1), default=1, help="pixels per tile side in images")
+    args = parser.parse_args(argv)
+
+    chunks = deltas = None
+    seed, borders = args.seed, args.borders
+    if args.save is not None:
+        save = SaveGame(args.save)
+        saved = save.load()
+        save.close()
+        if saved is None or not saved["explored"]:
+            print(f"Nothing explored in {args.save}.")
+            return 1
+        seed, borders = saved["seed"], saved["borders"]
+        chunks, deltas = set(saved["explored"]), saved["deltas"]
+        xs, ys = [key[0] for key in chunks], [key[1] for key in chunks]
+        chunk_x = min(xs) if args.x is None else args.x
+        chunk_y = min(ys) if args.y is None else args.y
+        width = max(xs) - chunk_x + 1 if args.width is None else args.width
+        height = max(ys) - chunk_y + 1 if args.height is None else args.height
+    else:
+        width = 32 if args.width is None else args.width
+        height = 32 if args.height is None else args.height
+        chunk_x = -(width // 2) if args.x is None else args.x
+        chunk_y = -(height // 2) if args.y is None else args.y
+
+    workers = args.workers if args.workers is not None else os.cpu_count()
+    bands = -(-height // BLOCK_SIZE)
+    print(f"Exporting {width}x{height} chunks from ({chunk_x}, {chunk_y}) of seed {seed} "
+          f"with {workers} worker(s)...", flush=True)
+    start = time.perf_counter()
+    try:
+        count = export(args.output, seed, chunk_x, chunk_y, width, height, workers=workers,
+                       borders=borders, scale=args.scale, chunks=chunks, deltas=deltas,
+                       progress=lambda done: print(f"\r  band {done}/{bands}", end="", flush=True))
+    except ValueError as error:
+        print(error)
+        return 1
+    elapsed = time.perf_counter() - start
+    print(f"\n  {count} chunks in {elapsed:.2f}s ({count / elapsed:.0f} chunks/s)")
+    print(f"  Written to {os.path.abspath(args.output)} ({os.path.getsize(args.output)} bytes)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,411 @@
+import math
+from collections import OrderedDict
+
+import numpy as np
+
+from terrain import CHUNK_WIDTH, CHUNK_HEIGHT
+from tiles import OPAQUE
+
+# Default sight radius, in tiles.
+SIGHT_RADIUS = 20
+
+# Fields of view kept per viewer, by the tile they were cast from. Walking
+# back and forth, or redrawing without moving, reuses them.
+FOV_CACHE_SIZE = 64
+
+# Chunk opacity masks kept, least recently used first out. Never fewer than
+# twice what one field of view covers, so a walk doesn't rebuild them.
+OPACITY_CACHE_CHUNKS = 64
+
+
+class FieldOfView:
+    """
+    Computes what can be seen from a tile, and records it in the map's
+    fog of war (Map.mark_seen). WALL and ROCK tiles block sight (see
+    tiles.OPAQUE), and so do structures.
+
+    The opacity of each chunk is cached, keyed by chunk version like the
+    Pathfinder's caches, and so is every field of view, keyed by the
+    versions of the chunks it covers. A step therefore only re-casts from
+    the new tile, and a changed tile only invalidates the fields of view
+    that cover its chunk. The re-cast reuses the last one's work: its
+    opacity window is moved over and only the tiles that came into reach
+    are read, and only the tiles it didn't see are marked on the map.
+    """
+
+    def __init__(self, world_map, radius=SIGHT_RADIUS, cache_size=FOV_CACHE_SIZE,
+                 opacity_chunks=OPACITY_CACHE_CHUNKS):
+        """
+        Args:
+            world_map (Map): The world to look at. Chunks beyond the resident
+                             ones are read with peek_chunk, so looking far
+                             neither explores them nor evicts others.
+            radius (int): How far the player can see, in tiles.
+            cache_size (int): Fields of view kept, by the tile cast from.
+            opacity_chunks (int): Chunk opacity masks kept.
+        """
+        self.world_map = world_map
+        self.radius = radius
+        self.size = 2 * radius + 1
+        self.cache_size = cache_size
+        covered = ((self.size - 2) // CHUNK_WIDTH + 2) * ((self.size - 2) // CHUNK_HEIGHT + 2)
+        self.opacity_chunks = max(opacity_chunks, 2 * covered)
+        # How far from the centre line each row of a quadrant reaches, so
+        # the square window is rounded off to a disc.
+        self._reach = [math.isqrt(radius * (radius + 1) - depth * depth) for depth in range(radius + 1)]
+        # Where the centre column of the row at each depth is in a window's
+        # bytes, going up (-1) or down (1) from the centre.
+        self._centres = {direction: [(radius + direction * depth) * self.size + radius
+                                     for depth in range(radius + 1)]
+                         for direction in (-1, 1)}
+        self._ones = b"\x01" * self.size
+        self._opacity = OrderedDict()  # chunk -> (version, opacity mask)
+        self._views = OrderedDict()  # (x, y) -> (chunk versions, visible)
+        # (left, top, {chunk: version}, opacity window, visible) of the last cast.
+        self._last = None
+        self.hits = 0
+        self.misses = 0
+
+    def _window_chunks(self, x, y):
+        radius = self.radius
+        return [(chunk_x, chunk_y)
+                for chunk_y in range((y - radius) // CHUNK_HEIGHT, (y + radius) // CHUNK_HEIGHT + 1)
+                for chunk_x in range((x - radius) // CHUNK_WIDTH, (x + radius) // CHUNK_WIDTH + 1)]
+
+    def _chunk_opacity(self, key):
+        """Returns a chunk's opacity mask, True where sight is blocked."""
+        version = self.world_map.chunk_version(*key)
+        entry = self._opacity.get(key)
+        if entry is None or entry[0] != version:
+            chunk = self.world_map.resident_chunk(*key)
+            if chunk is None:
+                chunk = self.world_map.peek_chunk(*key)
+            mask = OPAQUE[chunk]
+            for x, y in self.world_map.entities.solid_cells(*key):
+                mask[y % CHUNK_HEIGHT, x % CHUNK_WIDTH] = True
+            entry = (version, mask)
+            self._opacity[key] = entry
+            if len(self._opacity) > self.opacity_chunks:
+                self._opacity.popitem(last=False)
+        else:
+            self._opacity.move_to_end(key)
+        return entry[1]
+
+    def _fill(self, window, left, top, x0, y0, x1, y1):
+        """
+        Reads the opacity of the global tiles x0 <= x < x1, y0 <= y < y1 into
+        a window whose top-left tile is (left, top).
+        """
+        for chunk_y in range(y0 // CHUNK_HEIGHT, (y1 - 1) // CHUNK_HEIGHT + 1):
+            for chunk_x in range(x0 // CHUNK_WIDTH, (x1 - 1) // CHUNK_WIDTH + 1):
+                mask = self._chunk_opacity((chunk_x, chunk_y))
+                chunk_left, chunk_top = chunk_x * CHUNK_WIDTH, chunk_y * CHUNK_HEIGHT
+                cx0, cx1 = max(x0, chunk_left), min(x1, chunk_left + CHUNK_WIDTH)
+                cy0, cy1 = max(y0, chunk_top), min(y1, chunk_top + CHUNK_HEIGHT)
+                window[cy0 - top:cy1 - top, cx0 - left:cx1 - left] = \
+                    mask[cy0 - chunk_top:cy1 - chunk_top, cx0 - chunk_left:cx1 - chunk_left]
+
+    def _overlap(self, left, top):
+        """
+        The global tiles (x0, y0, x1, y1) shared by the window at (left, top)
+        and the last cast's, or None if they share none.
+        """
+        last_left, last_top = self._last[:2]
+        x0, x1 = max(left, last_left), min(left, last_left) + self.size
+        y0, y1 = max(top, last_top), min(top, last_top) + self.size
+        return (x0, y0, x1, y1) if x0 < x1 and y0 < y1 else None
+
+    def _window(self, left, top, versions):
+        """
+        The opacity of the square of tiles from (left, top). Where it
+        overlaps the last cast's window and the chunks there haven't
+        changed since, it is copied from that window.
+        """
+        size = self.size
+        window = np.empty((size, size), dtype=bool)
+        overlap = None
+        if self._last is not None:
+            last_versions = self._last[2]
+            if all(last_versions.get(key, version) == version for key, version in versions.items()):
+                overlap = self._overlap(left, top)
+        if overlap is None:
+            self._fill(window, left, top, left, top, left + size, top + size)
+            return window
+
+        x0, y0, x1, y1 = overlap
+        last_left, last_top, _, last_window, _ = self._last
+        window[y0 - top:y1 - top, x0 - left:x1 - left] = \
+            last_window[y0 - last_top:y1 - last_top, x0 - last_left:x1 - last_left]
+        # The rows above and below the overlap, then the columns beside it.
+        if top < y0:
+            self._fill(window, left, top, left, top, left + size, y0)
+        if y1 < top + size:
+            self._fill(window, left, top, left, y1, left + size, top + size)
+        if left < x0:
+            self._fill(window, left, top, left, y0, x0, y1)
+        if x1 < left + size:
+            self._fill(window, left, top, x1, y0, left + size, y1)
+        return window
+
+    def compute(self, x, y):
+        """
+        Returns what can be seen from a tile, and marks it as seen on the map.
+
+        Args:
+            x (int): Global x-coordinate of the viewer.
+            y (int): Global y-coordinate of the viewer.
+
+        Returns:
+            np.ndarray: Read-only bool array of (2 * radius + 1) squared
+                        tiles centred on (x, y), True where visible.
+        """
+        chunks = self._window_chunks(x, y)
+        versions = tuple(self.world_map.chunk_version(*key) for key in chunks)
+        entry = self._views.get((x, y))
+        if entry is not None and entry[0] == versions:
+            self._views.move_to_end((x, y))
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        left, top = x - self.radius, y - self.radius
+        chunk_versions = dict(zip(chunks, versions))
+        window = self._window(left, top, chunk_versions)
+        visible = self.cast(window)
+        visible.flags.writeable = False
+        self._views[(x, y)] = (versions, visible)
+        if len(self._views) > self.cache_size:
+            self._views.popitem(last=False)
+
+        # A cached view has been marked already, and so have the tiles the
+        # last cast saw.
+        fresh = visible
+        overlap = self._overlap(left, top) if self._last is not None else None
+        if overlap is not None:
+            x0, y0, x1, y1 = overlap
+            last_left, last_top, _, _, last_visible = self._last
+            fresh = visible.copy()
+            fresh[y0 - top:y1 - top, x0 - left:x1 - left] &= \
+                ~last_visible[y0 - last_top:y1 - last_top, x0 - last_left:x1 - last_left]
+        rows, columns = np.flatnonzero(fresh.any(axis=1)), np.flatnonzero(fresh.any(axis=0))
+        if len(rows):
+            # Only the chunks under the new tiles' bounding box are touched.
+            self.world_map.mark_seen(left + columns[0], top + rows[0],
+                                     fresh[rows[0]:rows[-1] + 1, columns[0]:columns[-1] + 1])
+        self._last = (left, top, chunk_versions, window, visible)
+        return visible
+
+    def cast(self, window):
+        """
+        Casts from the centre of an opacity window: a symmetric shadowcast,
+        so a tile is visible from the centre exactly when the centre is
+        visible from it, and the walls bounding a lit area are lit without
+        gaps. Each quadrant is walked outwards a row at a time, stepping over
+        whole runs of clear or opaque tiles with bytes.find, so the cost
+        grows with the obstacles in view rather than with the area.
+
+        Args:
+            window (np.ndarray): (2 * radius + 1) squared bools, True where
+                                 sight is blocked.
+
+        Returns:
+            np.ndarray: Bools of the same shape, True where visible.
+        """
+        size = self.size
+        # North and south are cast along the rows, west and east along the
+        # rows of the transposed window, so every run is contiguous bytes.
+        rows, columns = window.tobytes(), window.T.tobytes()
+        lit_rows, lit_columns = bytearray(size * size), bytearray(size * size)
+        for lines, lit in ((rows, lit_rows), (columns, lit_columns)):
+            self._cast_quadrant(lines, lit, -1)
+            self._cast_quadrant(lines, lit, 1)
+        visible = np.frombuffer(lit_rows, dtype=bool).reshape(size, size) \
+            | np.frombuffer(lit_columns, dtype=bool).reshape(size, size).T
+        visible[self.radius, self.radius] = True
+        return visible
+
+    def _cast_quadrant(self, lines, lit, direction):
+        """
+        Casts one quadrant: rows of increasing depth away from the centre, in
+        `direction` (-1 or 1) along the first axis of `lines`.
+
+        Slopes are kept as (numerator, denominator) pairs, so tiles on a
+        boundary are decided exactly.
+        """
+        radius, reach, ones = self.radius, self._reach, self._ones
+        # Runs are handled by their absolute positions in `lines`, from the
+        # centre column of their row on.
+        centres = self._centres[direction]
+        # (depth, start slope, end slope) of the rows still to scan.
+        pending = [(1, -1, 1, 1, 1)]
+        pop, push, find = pending.pop, pending.append, lines.find
+        while pending:
+            depth, start_num, start_den, end_num, end_den = pop()
+            # The columns the row's slopes cover, ties rounded outwards...
+            first = (2 * depth * start_num + start_den) // (2 * start_den)
+            last = -((end_den - 2 * depth * end_num) // (2 * end_den))
+            # ...and within the disc.
+            edge = reach[depth]
+            if first < -edge:
+                first = -edge
+            if last > edge:
+                last = edge
+            if first > last:
+                continue
+            centre = centres[depth]
+            start, stop = centre + first, centre + last + 1
+            # Clear tiles are only lit if their centre lies between the
+            # slopes, which is what makes the cast symmetric.
+            lit_start = centre - ((-depth * start_num) // start_den)
+            lit_stop = centre + (depth * end_num) // end_den + 1
+            deeper = depth < radius
+
+            position = start
+            while position < stop:
+                if lines[position]:
+                    end = find(0, position, stop)
+                    if end < 0:
+                        end = stop
+                    lit[position:end] = ones[:end - position]
+                else:
+                    end = find(1, position, stop)
+                    if end < 0:
+                        end = stop
+                    low = position if position > lit_start else lit_start
+                    high = end if end < lit_stop else lit_stop
+                    if low < high:
+                        lit[low:high] = ones[:high - low]
+                    if deeper:
+                        # The run is seen past the opaque tiles either side of it.
+                        if position == start:
+                            next_start_num, next_start_den = start_num, start_den
+                        else:
+                            next_start_num, next_start_den = 2 * (position - centre) - 1, 2 * depth
+                        if end == stop:
+                            next_end_num, next_end_den = end_num, end_den
+                        else:
+                            next_end_num, next_end_den = 2 * (end - centre) - 1, 2 * depth
+                        push((depth + 1, next_start_num, next_start_den, next_end_num, next_end_den))
+                position = end
+
+
+# This block tests the shadowcast against a plain reference and times it.
+if __name__ == '__main__':
+    import time
+    from fractions import Fraction
+    from map import Map
+
+    def reference(window, radius):
+        """Ford's symmetric shadowcasting, tile by tile, clipped to a disc afterwards."""
+        size = 2 * radius + 1
+        visible = np.zeros((size, size), dtype=bool)
+        visible[radius, radius] = True
+
+        def scan(transform, depth, start, end):
+            if depth > radius:
+                return
+            first = math.floor(depth * start + Fraction(1, 2))
+            last = math.ceil(depth * end - Fraction(1, 2))
+            previous = None
+            for column in range(first, last + 1):
+                x, y = transform(depth, column)
+                if not (0 <= x < size and 0 <= y < size):
+                    previous = None
+                    continue
+                opaque = window[y, x]
+                if opaque or (depth * start <= column <= depth * end):
+                    visible[y, x] = True
+                if previous is True and not opaque:
+                    start = Fraction(2 * column - 1, 2 * depth)
+                if previous is False and opaque:
+                    scan(transform, depth + 1, start, Fraction(2 * column - 1, 2 * depth))
+                previous = bool(opaque)
+            if previous is False:
+                scan(transform, depth + 1, start, end)
+
+        for transform in (lambda d, c: (radius + c, radius - d), lambda d, c: (radius + c, radius + d),
+                          lambda d, c: (radius - d, radius + c), lambda d, c: (radius + d, radius + c)):
+            scan(transform, 1, Fraction(-1), Fraction(1))
+        ys, xs = np.mgrid[-radius:radius + 1, -radius:radius + 1]
+        return visible & (xs * xs + ys * ys <= radius * (radius + 1))
+
+    print("--- Testing Field of View ---")
+    rng = np.random.default_rng(5)
+    world_map = Map(seed=123)
+    for radius in (3, 8, 20):
+        fov = FieldOfView(world_map, radius)
+        for density in (0.0, 0.05, 0.2, 0.4):
+            for _ in range(20):
+                window = rng.random((2 * radius + 1, 2 * radius + 1)) < density
+                assert np.array_equal(fov.cast(window), reference(window, radius)), (radius, density)
+    print("The run-based cast matches tile-by-tile shadowcasting on 240 random windows.")
+
+    # Symmetry: if b is visible from a, a is visible from b.
+    radius = 8
+    fov = FieldOfView(world_map, radius)
+    for _ in range(10):
+        field = rng.random((48, 48)) < 0.25
+        a = tuple(rng.integers(radius, 48 - radius, 2))
+        seen_from_a = fov.cast(field[a[0] - radius:a[0] + radius + 1, a[1] - radius:a[1] + radius + 1])
+        if field[a]:
+            continue
+        for dy, dx in zip(*np.nonzero(seen_from_a)):
+            b = (a[0] + dy - radius, a[1] + dx - radius)
+            if field[b] or not (radius <= b[0] < 48 - radius and radius <= b[1] < 48 - radius):
+                continue
+            back = fov.cast(field[b[0] - radius:b[0] + radius + 1, b[1] - radius:b[1] + radius + 1])
+            assert back[a[0] - b[0] + radius, a[1] - b[1] + radius], (a, b)
+    print("Visibility between clear tiles is symmetric.")
+
+    # Reusing the last cast's window and marks changes nothing: a walk, a
+    # wall put up beside it and a jump give the same views and fog as
+    # casting every step afresh.
+    walked, fresh = Map(seed=123, borders=False), Map(seed=123, borders=False)
+    fov = FieldOfView(walked, 30)
+    x, y = 40, 12
+    for step in range(60):
+        if step == 30:
+            for world_map in (walked, fresh):
+                world_map.set_tile(0, 0, x + 2, y % CHUNK_HEIGHT, 4)
+        x += 50 if step == 45 else (1, 0, -1, 0)[step // 10 % 4]
+        y += (0, 1, 0, -1)[step // 10 % 4]
+        assert np.array_equal(fov.compute(x, y), FieldOfView(fresh, 30).compute(x, y)), step
+    assert walked.seen == fresh.seen
+    print("Steps reusing the last cast see and mark what fresh casts do.")
+
+    # The opacity cache stays within its bound on a long walk, and rebuilds
+    # what it dropped.
+    fov = FieldOfView(walked, 30, opacity_chunks=1)
+    for x in range(0, 2000, 7):
+        assert np.array_equal(fov.compute(x, 12), FieldOfView(fresh, 30).compute(x, 12)), x
+    assert len(fov._opacity) <= fov.opacity_chunks == 16
+    print("The opacity cache keeps at most twice the chunks a view covers.")
+
+    # A walk over open terrain, timed per step. The loop is longer than the
+    # cache, so every step is cast afresh, and the first lap builds the
+    # opacity of every chunk in reach.
+    for radius in (20, 40, 60):
+        world_map = Map(seed=123, borders=False)
+        fov = FieldOfView(world_map, radius)
+        times, lit = [], []
+        x, y = 40, 12
+        for step in range(400):
+            previous = (x, y)
+            x += (1, 0, -1, 0)[step // 25 % 4]
+            y += (0, 1, 0, -1)[step // 25 % 4]
+            began = time.perf_counter()
+            visible = fov.compute(x, y)
+            times.append(time.perf_counter() - began)
+            lit.append(visible.sum())
+        times = np.array(times[100:]) * 1000.0
+        print(f"Radius {radius}: {np.mean(times):.3f} ms mean, {np.percentile(times, 99):.3f} ms p99 "
+              f"per step, {np.mean(lit[100:]):.0f} tiles visible on average.")
+        assert fov.hits == 0 and len(fov._opacity) <= fov.opacity_chunks
+    began = time.perf_counter()
+    fov.compute(*previous)
+    print(f"A step back to a tile in the cache: {(time.perf_counter() - began) * 1000:.3f} ms.")
+    assert fov.hits == 1
+    assert world_map.seen_area(x - 2, y - 2, 5, 5)[2, 2]
+    world_map.set_tile(0, 0, 41, 12, 4)
+    assert fov.compute(40, 12) is not None and fov.misses > 0
+    print("\nField of view tests passed!")
@@ -0,0 +1,90 @@
+# Style ids for the cells of a frame. The renderer maps them to terminal
+# attributes when a frame is emitted.
+STYLE_NORMAL = 0
+STYLE_BOLD = 1
+STYLE_STATUS = 2
+STYLE_DIM = 3  # Remembered terrain out of sight.
+
+# Unchanged gaps up to this many cells between two changed spans are
+# re-sent rather than skipped, as a cursor move costs about as much. The
+# renderer's OutputEncoder weighs each gap against the cursor moves itself.
+MERGE_GAP = 6
+
+
+class FrameBuffer:
+    """
+    A screen-sized grid of cells, each a character plus a style id.
+
+    The renderer composes every frame into a fresh buffer and compares it
+    against the previous one, so only the cells that changed are written.
+    """
+
+    def __init__(self, width, height):
+        """
+        Args:
+            width (int): Number of columns.
+            height (int): Number of rows.
+        """
+        self.width = width
+        self.height = height
+        self.rows = [" " * width for _ in range(height)]
+        self.styles = [bytearray(width) for _ in range(height)]
+
+    def copy(self):
+        """Returns a buffer with the same cells, to draw over."""
+        frame = FrameBuffer.__new__(FrameBuffer)
+        frame.width, frame.height = self.width, self.height
+        frame.rows = list(self.rows)
+        frame.styles = [bytearray(styles) for styles in self.styles]
+        return frame
+
+    def put(self, x, y, text, style=STYLE_NORMAL):
+        """Writes text starting at (x, y), clipped to the buffer."""
+        if y < 0 or y >= self.height or x >= self.width:
+            return
+        if x < 0:
+            text = text[-x:]
+            x = 0
+        text = text[:self.width - x]
+        if not text:
+            return
+        row = self.rows[y]
+        self.rows[y] = row[:x] + text + row[x + len(text):]
+        self.styles[y][x:x + len(text)] = bytes([style]) * len(text)
+
+    def changed_spans(self, previous, merge_gap=MERGE_GAP):
+        """
+        Lists the spans that differ from a previous frame of the same size.
+
+        Args:
+            previous (FrameBuffer): The frame currently on screen.
+            merge_gap (int): Spans fewer than this many unchanged cells
+                             apart are merged into one.
+
+        Returns:
+            list: (y, start_x, end_x) tuples, end exclusive.
+        """
+        spans = []
+        for y in range(self.height):
+            row, style = self.rows[y], self.styles[y]
+            old_row, old_style = previous.rows[y], previous.styles[y]
+            if row == old_row and style == old_style:
+                continue
+
+            start = None
+            last_changed = None
+            for x in range(self.width):
+                if row[x] == old_row[x] and style[x] == old_style[x]:
+                    continue
+                if start is None:
+                    start = x
+                elif x - last_changed > merge_gap:
+                    spans.append((y, start, last_changed + 1))
+                    start = x
+                last_changed = x
+            spans.append((y, start, last_changed + 1))
+        return spans
+
+    def all_spans(self, merge_gap=MERGE_GAP):
+        """Lists the spans needed to paint this frame onto a cleared screen."""
+        return self.changed_spans(FrameBuffer(self.width, self.height), merge_gap)
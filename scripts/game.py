@@ -1,31 +1,500 @@
-import blessed
+import json
+import os
+import sys
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
-# Import the core components of the game
+# Startup is profiled from launch to the first frame.
+from startup import PROFILE
+
+# Import the core components of the game. The terminal library (blessed)
+# is imported by main(), while the world is being built. The optional parts
+# (simulation, pathfinding, telemetry and recording) are imported where they
+# are first used, so a plain game doesn't wait for them.
 from map import Map, CHUNK_WIDTH, CHUNK_HEIGHT
 from player import Player
-from renderer import Renderer
+from renderer import Renderer, MAP_ZOOM_LEVELS
+from fov import SIGHT_RADIUS
+from savegame import SaveGame, snapshot
+
+# How many rings of chunks around the player to generate in the background.
+# The camera can show parts of the second ring on large terminals.
+PREFETCH_RADIUS = 2
+
+# Most chunks kept in memory; older chunks are spilled to the chunk store.
+CACHE_CHUNKS = 256
+
+# Upper limit on frames drawn per second. Keys arriving faster than this
+# are applied together and drawn as one frame.
+MAX_FPS = 60
+
+# How often (in seconds) an idle game wakes up to check for a resize.
+RESIZE_POLL_INTERVAL = 0.5
+
+# Player movement for each arrow key, by blessed key name.
+MOVES = {
+    "KEY_UP": (0, -1),
+    "KEY_DOWN": (0, 1),
+    "KEY_LEFT": (-1, 0),
+    "KEY_RIGHT": (1, 0),
+}
+
+# Game data lives next to the scripts folder, as created by the installer.
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+SETTINGS_FILE = os.path.join(DATA_DIR, "settings.json")
+WORLD_STORE_DIR = os.path.join(DATA_DIR, "worlds")
+TELEMETRY_LOG = os.path.join(DATA_DIR, "telemetry.jsonl")
+RECORDINGS_DIR = os.path.join(DATA_DIR, "recordings")
+AUTOSAVE_DIR = os.path.join(DATA_DIR, "saves", "autosave")
+
+# Seconds between autosaves. Only the chunks changed since the last one
+# are written, in the background.
+AUTOSAVE_INTERVAL = 30.0
+
+# Seconds between the steps of travel and auto-explore.
+TRAVEL_STEP_INTERVAL = 1.0 / 30
+
+# Seconds between simulation ticks of the entities around the player.
+SIM_TICK_INTERVAL = 0.25
+
+# While the performance HUD is on, refresh it at least this often (seconds).
+HUD_REFRESH_INTERVAL = 1.0
 
-def initialize_game_state():
-    """Creates and returns a new set of game state objects for a new game."""
-    world_map = Map()
-    player = Player(start_x=CHUNK_WIDTH // 2, start_y=CHUNK_HEIGHT // 2)
+def load_settings():
+    """Reads data/settings.json, returning an empty dict if it is unusable."""
+    try:
+        with open(SETTINGS_FILE, "r", encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+def initialize_game_state(seed=None, saved=None):
+    """
+    Creates and returns a new set of game state objects for a new game.
+
+    Args:
+        seed (int, optional): The world seed. Defaults to the settings'
+                              "world_seed", or a random one.
+        saved (dict, optional): A save game snapshot (see savegame.py) to
+                                continue instead of starting anew.
+    """
+    # A fixed "world_seed" in the settings brings back the same world, which
+    # is then paged in from the on-disk chunk store instead of regenerated.
+    settings = load_settings()
+    fixed_seed = settings.get("world_seed")
+    if saved is not None:
+        seed = saved["seed"]
+    elif seed is None:
+        seed = fixed_seed
+    # Only the fixed world is stored. Every other game has a seed of its own
+    # that is never played again, and its store would be left on disk.
+    store_dir = WORLD_STORE_DIR if seed is not None and seed == fixed_seed else None
+    # The world is borderless, so the player (and the camera following
+    # them) moves straight across chunk edges.
+    world_map = Map(seed=seed, prefetch_radius=PREFETCH_RADIUS, store_dir=store_dir,
+                    cache_chunks=CACHE_CHUNKS, pin_radius=PREFETCH_RADIUS, borders=False)
+    if saved is None:
+        return world_map, spawn_player(world_map)
+
+    # Only the changes are restored here; the terrain is generated as the
+    # player gets to it.
+    world_map.load_deltas(saved["deltas"])
+    for key in saved["explored"]:
+        world_map.explored.add(key)
+    world_map.seen.update(saved["seen"])
+    return world_map, spawn_player(world_map, saved["player"])
+
+def spawn_player(world_map, position=None):
+    """
+    Creates a player at the start of a world.
+
+    Args:
+        world_map (Map): The world.
+        position (tuple, optional): (chunk_x, chunk_y, x, y) to put the
+                                    player at instead, e.g. from a save.
+    """
+    if position is None:
+        player = Player(start_x=CHUNK_WIDTH // 2, start_y=CHUNK_HEIGHT // 2)
+    else:
+        chunk_x, chunk_y, x, y = position
+        player = Player(start_x=x, start_y=y, start_chunk_x=chunk_x, start_chunk_y=chunk_y)
     # The first chunk must be generated for the game to start
     world_map.get_chunk(player.chunk_x, player.chunk_y)
-    return world_map, player
+    world_map.set_focus(player.chunk_x, player.chunk_y, owner=player)
+    return player
+
+class GameState:
+    """
+    Everything that changes while a game is running: the world, the player
+    and which screen is shown.
+    """
+
+    def __init__(self, world_map=None, pathfinder=None, seed=None, saved=None, save_game=None):
+        """
+        Args:
+            world_map (Map, optional): A world shared with other players, as
+                                       in server mode. By default the game
+                                       creates a world of its own.
+            pathfinder (PathFinder, optional): The shared world's pathfinder,
+                                       so its caches are shared too.
+            seed (int, optional): Seed of the game's own world.
+            saved (dict, optional): A save game snapshot to continue.
+            save_game (SaveGame, optional): Where the game is autosaved. The
+                                       game continues from it if it exists.
+                                       An unreadable save is moved aside and
+                                       a new game starts; `load_error` then
+                                       says why.
+        """
+        self.shared_world = world_map is not None
+        self.save_game = save_game
+        self.load_error = None
+        if saved is None and save_game is not None:
+            try:
+                saved = save_game.load()
+            except ValueError as error:
+                self.load_error = f"{error} (moved to {save_game.set_aside()})"
+        if self.shared_world:
+            self.world_map, self.player = world_map, spawn_player(world_map)
+        else:
+            self.world_map, self.player = initialize_game_state(seed, saved)
+        self.next_seeds = deque()  # Seeds for the next restarts, e.g. in a replay.
+        self._pathfinder = pathfinder  # Created by the first travel or explore.
+        self.route = None       # The route being walked, if travelling.
+        self.exploring = False  # Keep picking new routes when one ends.
+        self.planning = None    # A route search still in progress (see continue_planning).
+        self.plan_budget = None # Seconds a route search may run at a time; None plans at once.
+        self.map_view_active = False
+        self.keys_view_active = False
+        self.map_pan = (0, 0)
+        self.map_zoom = 0
+        self.map_terrain = False
+        self.perf_hud_active = False
+        self.running = True
+
+    @property
+    def pathfinder(self):
+        """The pathfinder for travel and explore, created on first use."""
+        if self._pathfinder is None:
+            from pathfinding import PathFinder
+            self._pathfinder = PathFinder(self.world_map)
+        return self._pathfinder
+
+    def restart(self):
+        """
+        Throws the current world away and starts a new game. In a shared
+        world only the player starts over.
+        """
+        if self.shared_world:
+            self.world_map.clear_focus(self.player)
+            self.player = spawn_player(self.world_map)
+        else:
+            self.world_map.close()
+            if self.save_game is not None:
+                self.save_game.reset()
+            seed = self.next_seeds.popleft() if self.next_seeds else None
+            self.world_map, self.player = initialize_game_state(seed)
+            self._pathfinder = None
+        self.stop_travel()
+        self.map_view_active = False
+        self.keys_view_active = False
+
+    def autosave(self):
+        """Queues the changes since the last save to be written in the background."""
+        if self.save_game is not None and not self.shared_world:
+            self.save_game.save(snapshot(self))
+
+    def player_tile(self):
+        """The player's position in global tile coordinates."""
+        player = self.player
+        return player.chunk_x * CHUNK_WIDTH + player.x, player.chunk_y * CHUNK_HEIGHT + player.y
+
+    def tick_entities(self):
+        """Runs one simulation tick around the player. Returns the number of entities that moved."""
+        player = self.player
+        return self.world_map.entities.tick(player.chunk_x, player.chunk_y, self.player_tile())
+
+    def travel_to_chunk(self, chunk_x, chunk_y):
+        """
+        Starts walking to the middle of a chunk. Returns False if there is no
+        way there, or if the route is still being planned (see plan_budget).
+        """
+        return self._plan(self._travel_plan(chunk_x, chunk_y))
+
+    def explore(self):
+        """
+        Starts walking to the nearest unexplored chunk. Returns False if there
+        is none, or if the route is still being planned (see plan_budget).
+        """
+        self.exploring = True
+        return self._plan(self._explore_plan())
+
+    def _travel_plan(self, chunk_x, chunk_y):
+        goal = self.pathfinder.nearest_walkable((chunk_x, chunk_y))
+        yield
+        route = None if goal is None else (yield from self.pathfinder.search(self.player_tile(), goal))
+        return route
+
+    def _explore_plan(self):
+        _, route = yield from self.pathfinder.explore_search(self.player_tile(), self.world_map.explored)
+        if route is None:
+            self.exploring = False
+        return route
+
+    def _route_plan(self, goal):
+        route = yield from self.pathfinder.search(self.player_tile(), goal)
+        if route is None and self.exploring:
+            # No way through: auto-explore heads somewhere else instead.
+            route = yield from self._explore_plan()
+        return route
+
+    def _plan(self, plan):
+        """
+        Starts a route search and works on it for up to plan_budget seconds.
+        With no budget the route is planned before this returns.
+
+        Returns:
+            bool: True if a route is ready to walk.
+        """
+        self.route = None
+        self.planning = plan
+        self.continue_planning(self.plan_budget)
+        return self.route is not None
+
+    def continue_planning(self, budget=None):
+        """
+        Works on the route being planned. When the search is done its route
+        is the one to walk (None if there is no way).
+
+        Args:
+            budget (float, optional): Seconds to work for before returning.
+                                      None works until the search is done.
+
+        Returns:
+            bool: True once the search is done.
+        """
+        deadline = None if budget is None else time.perf_counter() + budget
+        try:
+            while True:
+                next(self.planning)
+                if deadline is not None and time.perf_counter() >= deadline:
+                    return False
+        except StopIteration as stop:
+            self.planning = None
+            self.route = stop.value
+            return True
+
+    def stop_travel(self):
+        """Stops travelling and auto-exploring, and any route search."""
+        self.route = None
+        self.exploring = False
+        self.planning = None
+
+    def advance_route(self):
+        """
+        Takes the next step of the current route. If the way turns out to be
+        blocked (the world changed since the route was planned) the route is
+        planned again once; auto-explore moves on to a new target as soon as
+        the one it was heading for has been seen.
 
-def main():
+        Returns:
+            bool: True if the player moved.
+        """
+        if self.exploring and self.pathfinder.chunk_of(self.route.goal) in self.world_map.explored:
+            if not self.explore():
+                return False
+
+        # The second attempt follows a route planned again from where the
+        # player got stuck.
+        for _ in range(2):
+            route = self.route
+            step = route.next_step()
+            if step is not None:
+                self.player.move(step[0], step[1], self.world_map)
+                if self.player_tile() == route.position:
+                    return True
+            if self.player_tile() == route.goal:
+                break
+            if not self._plan(self._route_plan(route.goal)):
+                if self.planning is not None:
+                    return False
+                self.stop_travel()
+                return False
+
+        # Arrived, or no way through. Auto-explore carries on next step.
+        if self.exploring:
+            self.explore()
+            if self.route is not None or self.planning is not None:
+                return False
+        self.stop_travel()
+        return False
+
+def handle_key(state, key):
+    """
+    Applies a single keypress to the game state.
+
+    Args:
+        state (GameState): The running game.
+        key (blessed.keyboard.Keystroke): The key that was pressed.
+
+    Returns:
+        bool: True if anything visible changed and a redraw is needed.
+    """
+    # A view is active if either the map or keys screen is shown.
+    a_view_is_active = state.map_view_active or state.keys_view_active
+
+    # Handle global keys first
+    if key == 'k':
+        state.keys_view_active = not state.keys_view_active
+        if state.keys_view_active:
+            state.map_view_active = False
+    elif key == 'q':
+        state.running = False
+    elif key == 'p':
+        state.perf_hud_active = not state.perf_hud_active
+    elif key == 'x' and not a_view_is_active:
+        return state.explore() and state.advance_route()
+    elif key == 'r':
+        state.restart()
+    elif key == 'm':
+        state.map_view_active = not state.map_view_active
+        if state.map_view_active:
+            state.keys_view_active = False
+            state.map_pan = (0, 0)
+
+    # The world map can be panned and zoomed while it is open.
+    elif state.map_view_active and not state.keys_view_active:
+        return handle_map_key(state, key)
+
+    # Handle player movement only if no other view is active
+    elif key.is_sequence and not a_view_is_active:
+        direction = MOVES.get(key.name)
+        if direction is None:
+            return False
+        player = state.player
+        before = (player.x, player.y, player.chunk_x, player.chunk_y)
+        player.move(direction[0], direction[1], state.world_map)
+        return (player.x, player.y, player.chunk_x, player.chunk_y) != before
+
+    else:
+        return False
+    return True
+
+def apply_key(state, key):
+    """
+    Applies a keypress the way the game loop does: while travelling or
+    auto-exploring (or planning a route) any key just stops, otherwise see
+    handle_key.
+
+    Returns:
+        bool: True if a redraw is needed.
+    """
+    if state.route is not None or state.planning is not None:
+        state.stop_travel()
+        return False
+    return handle_key(state, key)
+
+def handle_map_key(state, key):
+    """
+    Pans (arrow keys), zooms (+/-), recentres (c) and switches between the
+    explored chunks and the terrain overview (t) of the world map. Enter
+    travels to the chunk the map has been panned to.
+    """
+    _, _, block = MAP_ZOOM_LEVELS[state.map_zoom]
+    if key.name in MOVES:
+        # Zoomed-out maps move several cells per keypress. The terrain
+        # overview moves a chunk at a time.
+        step = 1 if state.map_terrain else block * (1 if state.map_zoom == 0 else 4)
+        dx, dy = MOVES[key.name]
+        state.map_pan = (state.map_pan[0] + dx * step, state.map_pan[1] + dy * step)
+    elif key in ('+', '='):
+        state.map_zoom = max(0, state.map_zoom - 1)
+    elif key == '-':
+        state.map_zoom = min(len(MAP_ZOOM_LEVELS) - 1, state.map_zoom + 1)
+    elif key == 'c':
+        state.map_pan = (0, 0)
+    elif key == 't':
+        state.map_terrain = not state.map_terrain
+    elif key.name == 'KEY_ENTER':
+        # Travel to the chunk marked at the centre of the panned map.
+        target = (state.player.chunk_x + state.map_pan[0], state.player.chunk_y + state.map_pan[1])
+        if state.map_pan == (0, 0):
+            return False
+        if not state.travel_to_chunk(*target) and state.planning is None:
+            return False
+        state.map_view_active = False
+    else:
+        return False
+    return True
+
+def render(state, renderer):
+    """Draws the screen for the current state."""
+    # Decide which view to draw based on the current state.
+    # The keys screen takes precedence over the map screen.
+    if state.keys_view_active:
+        renderer.draw_keys_screen()
+    elif state.map_view_active:
+        renderer.draw_map_screen(state.player, state.world_map,
+                                 pan=state.map_pan, zoom=state.map_zoom,
+                                 terrain=state.map_terrain)
+    else:
+        renderer.draw(state.player, state.world_map)
+
+def sync_telemetry(state, telemetry, renderer):
+    """
+    Turns the performance HUD on or off to match the game state, and moves
+    the hooks onto the new objects after a restart.
+
+    Args:
+        telemetry (Telemetry or None): The game's telemetry, or None if the
+                                       HUD was never turned on.
+
+    Returns:
+        Telemetry or None: The telemetry, created the first time the HUD
+                           is turned on.
+    """
+    if telemetry is None:
+        if not state.perf_hud_active:
+            return None
+        from telemetry import Telemetry
+        telemetry = Telemetry(log_path=TELEMETRY_LOG)
+    if state.perf_hud_active and not telemetry.enabled:
+        telemetry.enable(state.world_map, state.player, renderer)
+        renderer.hud = telemetry.hud_text
+    elif not state.perf_hud_active and telemetry.enabled:
+        telemetry.disable()
+        renderer.hud = None
+    elif telemetry.enabled and telemetry.targets[:2] != (state.world_map, state.player):
+        telemetry.attach(state.world_map, state.player, renderer)
+    return telemetry
+
+def main(max_fps=MAX_FPS, record_path=None, profile_startup=False):
     """
     Main game function where the primary loop runs.
+
+    The loop sleeps until a key arrives, drains every key that is already
+    waiting, applies them as one batch and then draws at most one frame.
+    Frames are only drawn when the game state or terminal size changed,
+    and never faster than `max_fps`.
+
+    Args:
+        max_fps (int): The frame-rate cap.
+        record_path (str, optional): Record the session to this file, so it
+                                     can be replayed with replay.py.
+        profile_startup (bool): Print how long each phase of startup took,
+                                once the game exits.
     """
-    term = blessed.Terminal()
-    running = True
-    map_view_active = False
-    keys_view_active = False
+    PROFILE.mark("imports")
+
+    # Build the world (continuing the autosaved game if there is one) in the
+    # background, while the terminal library loads and the header is shown.
+    loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="world-loader")
+    loading = loader.submit(GameState, save_game=SaveGame(AUTOSAVE_DIR))
+    loader.shutdown(wait=False)
 
-    # Initialize game components
-    world_map, player = initialize_game_state()
-    renderer = Renderer(term)
+    import blessed
+    term = blessed.Terminal()
+    frame_interval = 1.0 / max_fps
 
     # Use blessed's context managers for a clean, fullscreen terminal interface
     with term.fullscreen(), term.cbreak(), term.hidden_cursor():
@@ -38,59 +507,172 @@ def main():
         print(title.center(term.width))
         print(header_line)
         print("\n") # One blank line after header
-        print("Loading...".center(term.width))
-        time.sleep(2) # Pause to let the user see the header
-
-        while running:
-            # Decide which view to draw based on the current state.
-            # The keys screen takes precedence over the map screen.
-            if keys_view_active:
-                renderer.draw_keys_screen()
-            elif map_view_active:
-                renderer.draw_map_screen(player, world_map)
-            else:
-                renderer.draw(player, world_map)
-
-            # Wait for and process user input
-            key = term.inkey(timeout=0.1)
-
-            # A view is active if either the map or keys screen is shown.
-            a_view_is_active = map_view_active or keys_view_active
-
-            # Handle global keys first
-            if key == 'k':
-                keys_view_active = not keys_view_active
-                if keys_view_active:
-                    map_view_active = False
-            elif key == 'q':
-                running = False
-            elif key == 'r':
-                world_map, player = initialize_game_state()
-                map_view_active = False
-                keys_view_active = False
-            elif key == 'm':
-                map_view_active = not map_view_active
-                if map_view_active:
-                    keys_view_active = False
-
-            # Handle player movement only if no other view is active
-            elif key.is_sequence and not a_view_is_active:
-                if key.code == term.KEY_UP:
-                    player.move(0, -1, world_map)
-                elif key.code == term.KEY_DOWN:
-                    player.move(0, 1, world_map)
-                elif key.code == term.KEY_LEFT:
-                    player.move(-1, 0, world_map)
-                elif key.code == term.KEY_RIGHT:
-                    player.move(1, 0, world_map)
-
-def start():
+        print("Loading...".center(term.width), flush=True)
+        PROFILE.mark("header")
+
+        state = loading.result()
+        PROFILE.mark("world")
+        if state.load_error is not None:
+            # The player should know why their game didn't continue.
+            print("The autosave could not be loaded, so a new world was started.".center(term.width))
+            print("\n".join(term.wrap(state.load_error)))
+            print("Press any key to continue.".center(term.width), flush=True)
+            term.inkey()
+        # Over a slow SSH or serial link, "output_byte_budget" (bytes per
+        # second) makes the renderer skip frames the link can't keep up with.
+        # "sight_radius" sets how far the player sees; 0 lifts the fog of war.
+        settings = load_settings()
+        renderer = Renderer(term, camera=True, byte_budget=settings.get("output_byte_budget"),
+                            sight_radius=settings.get("sight_radius", SIGHT_RADIUS))
+        # "world_simulation" lets the loaded terrain change over time: water,
+        # bushes and rock, stepped on a background thread (see simulation.py).
+        simulation = None
+        if settings.get("world_simulation"):
+            from simulation import WorldSimulation
+            simulation = WorldSimulation(seed=state.world_map.seed)
+        telemetry = None  # Created when the HUD is first turned on.
+        recorder = None
+        if record_path is not None:
+            from recording import SessionRecorder
+            recorder = SessionRecorder(record_path)
+
+        dirty = True
+        first_frame = True
+        terminal_size = (term.width, term.height)
+        if recorder is not None:
+            recorder.start(state, *terminal_size)
+        last_frame = 0.0
+        next_tick = time.perf_counter() + SIM_TICK_INTERVAL
+        next_save = time.perf_counter() + AUTOSAVE_INTERVAL
+        input_time = None  # When the first key of the current batch arrived.
+
+        while state.running:
+            if dirty:
+                # Respect the frame-rate cap, collecting any keys that arrive
+                # in the meantime into this frame.
+                wait = last_frame + frame_interval - time.perf_counter()
+                if wait > 0:
+                    key = term.inkey(timeout=wait)
+                    if key:
+                        apply_key(state, key)
+                        if recorder is not None:
+                            recorder.key(state, key)
+                        continue
+                telemetry = sync_telemetry(state, telemetry, renderer)
+                hud = telemetry is not None and telemetry.enabled
+                render(state, renderer)
+                if recorder is not None:
+                    recorder.frame(state)
+                last_frame = time.perf_counter()
+                dirty = False
+                if first_frame:
+                    first_frame = False
+                    PROFILE.mark("first_frame")
+                if hud:
+                    if input_time is not None:
+                        telemetry.record("input_to_frame", last_frame - input_time)
+                    telemetry.end_frame(state.world_map)
+                input_time = None
+
+            # Sleep until a key arrives. The timeout only exists so a resized
+            # terminal gets redrawn without waiting for a keypress, to take
+            # the next step while travelling and for simulation ticks.
+            timeout = HUD_REFRESH_INTERVAL if hud else RESIZE_POLL_INTERVAL
+            if state.route is not None:
+                timeout = TRAVEL_STEP_INTERVAL
+            if renderer.pending is not None:
+                timeout = min(timeout, renderer.encoder.delay())
+            if simulation is not None:
+                timeout = min(timeout, simulation.delay())
+            timeout = max(0, min(timeout, next_tick - time.perf_counter()))
+            key = term.inkey(timeout=timeout)
+            if key and input_time is None:
+                input_time = time.perf_counter()
+
+            if state.route is not None:
+                # Any key stops travelling; otherwise walk on.
+                if key:
+                    apply_key(state, key)
+                    if recorder is not None:
+                        recorder.key(state, key)
+                    while key:
+                        key = term.inkey(timeout=0)
+                else:
+                    dirty |= state.advance_route()
+                    if recorder is not None:
+                        recorder.step()
+
+            # Drain everything already waiting (e.g. key auto-repeat), so
+            # input never falls behind the screen.
+            while key and state.running:
+                dirty |= apply_key(state, key)
+                if recorder is not None:
+                    recorder.key(state, key)
+                key = term.inkey(timeout=0)
+
+            # Simulate the entities near the player. Only the game view shows
+            # them, so the other views don't redraw for it.
+            now = time.perf_counter()
+            if now >= next_tick:
+                next_tick = now + SIM_TICK_INTERVAL
+                moved = state.tick_entities()
+                if recorder is not None:
+                    recorder.tick()
+                if moved and not (state.map_view_active or state.keys_view_active):
+                    dirty = True
+            # A finished step of the world simulation is applied in one go,
+            # between frames.
+            if simulation is not None and simulation.update(state.world_map):
+                if recorder is not None:
+                    recorder.sim(simulation.steps, simulation.applied)
+                if not (state.map_view_active or state.keys_view_active):
+                    dirty = True
+            if now >= next_save:
+                next_save = now + AUTOSAVE_INTERVAL
+                state.autosave()
+
+            # Send the latest frame the byte budget held back, unless a new
+            # one is about to be drawn anyway.
+            if not dirty:
+                renderer.flush_pending()
+
+            if (term.width, term.height) != terminal_size:
+                terminal_size = (term.width, term.height)
+                if recorder is not None:
+                    recorder.size(*terminal_size)
+                dirty = True
+            elif hud and time.perf_counter() - last_frame >= HUD_REFRESH_INTERVAL:
+                dirty = True
+
+    if recorder is not None:
+        recorder.close()
+    if telemetry is not None:
+        telemetry.disable()
+    if simulation is not None:
+        simulation.close()
+    state.autosave()
+    state.save_game.close()
+    state.world_map.close()
+    if profile_startup:
+        print("Startup:")
+        print(PROFILE.report())
+        PROFILE.log(TELEMETRY_LOG)
+
+def start(record_path=None, profile_startup=False):
     """
     The entry point for the game, called by launcher.py.
+
+    Args:
+        record_path (str, optional): Record the session to this file. Setting
+                                     "record_sessions" in the settings records
+                                     every session into data/recordings.
+        profile_startup (bool): Report the time to the first frame on exit.
     """
+    if record_path is None and load_settings().get("record_sessions"):
+        record_path = os.path.join(RECORDINGS_DIR, time.strftime("session-%Y%m%d-%H%M%S.jsonl"))
     # The launcher is now called from the batch menu, so we don't need a print here.
     try:
-        main()
+        main(record_path=record_path, profile_startup=profile_startup)
         # "Game exited" message is handled by the batch menu.
     except Exception as e:
         print(f"\nAn unexpected error occurred during game execution: {e}")
@@ -98,4 +680,11 @@ def start():
             os.system("pause")
 
 if __name__ == "__main__":
-    start()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Jules' Text Adventure Game")
+    parser.add_argument("--record", metavar="PATH",
+                        help="record the session for replay.py to play back")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="report how long startup took on exit")
+    args = parser.parse_args()
+    start(args.record, args.profile_startup)
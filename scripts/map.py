@@ -1,12 +1,26 @@
 import random
-from perlin_noise import PerlinNoise
+from collections import OrderedDict
 
-# Import the visual assets from the central art repository.
-from ascii_art import ROCK, BUSH, WALL, EMPTY, WATER
+import numpy as np
 
-# Define constants for chunk dimensions
-CHUNK_WIDTH = 80
-CHUNK_HEIGHT = 24
+# Terrain is generated as arrays by the vectorised generator; the chunk
+# dimensions live there so both modules agree on them.
+from terrain import TerrainGenerator, CHUNK_WIDTH, CHUNK_HEIGHT, OVERVIEW_WIDTH, OVERVIEW_HEIGHT
+from prefetch import ChunkPrefetcher
+from chunk_store import ChunkStore
+from chunk_cache import ChunkCache
+from explored import ExploredIndex
+from entities import EntityLayer
+from tiles import glyph_row, TILE_DTYPE
+
+# Most chunk overviews kept in memory. One is 60 bytes of tiles, so this
+# covers a large area for little memory.
+OVERVIEW_CACHE_CHUNKS = 16384
+
+# Most chunks only looked at from afar (peek_chunk) whose entities are kept.
+# Beyond this the least recently peeked ones are forgotten, unless the
+# player has been there since.
+PEEKED_ENTITY_CHUNKS = 2048
 
 
 class Map:
@@ -14,82 +28,397 @@ class Map:
     Manages the world map, including the procedural generation and storage of map chunks.
     """
 
-    def __init__(self, seed=None):
+    def __init__(self, seed=None, prefetch_radius=0, prefetch_workers=2, store_dir=None,
+                 cache_chunks=None, cache_bytes=None, pin_radius=1, borders=True, stages=None,
+                 peeked_entity_chunks=PEEKED_ENTITY_CHUNKS):
         """
-        Initializes the map. A dictionary `self.chunks` will store the data
-        for generated chunks, with (x, y) coordinates as keys.
+        Initializes the map. A ChunkCache `self.chunks` will store the data
+        for resident chunks, with (x, y) coordinates as keys, and the
+        ExploredIndex `self.explored` remembers every chunk the player has loaded.
 
         Args:
             seed (int, optional): A seed for the Perlin Noise generator to ensure
                                   reproducible maps. Defaults to None (random).
+            prefetch_radius (int, optional): Ring of chunks around the player to
+                                  generate in the background. 0 disables it.
+            prefetch_workers (int, optional): Background generator threads.
+            store_dir (str, optional): Directory of the on-disk chunk store.
+                                  Chunks are paged in from there before being
+                                  generated, and new chunks are written back.
+            cache_chunks (int, optional): Most chunks kept in memory. Defaults
+                                  to None (unbounded).
+            cache_bytes (int, optional): Memory budget for resident chunks.
+                                  Defaults to None (unbounded).
+            pin_radius (int, optional): Ring of chunks around the player that
+                                  is never evicted.
+            borders (bool, optional): Surround each chunk with walls. Without
+                                  them the player walks straight from one
+                                  chunk into the next.
+            stages (list, optional): The terrain pipeline (see
+                                  terrain.TerrainStage). Defaults to the
+                                  game's terrain.
+            peeked_entity_chunks (int, optional): Most chunks only peeked at
+                                  whose entities are kept.
         """
         if seed is None:
             seed = random.randint(0, 100000)
 
-        # Initialize Perlin noise generators for different features.
-        # Using different seeds and octaves creates more varied terrain.
-        self.noise = PerlinNoise(octaves=4, seed=seed)
-        self.feature_noise = PerlinNoise(octaves=8, seed=seed + 1)
-        self.chunks = {}
+        # The terrain generator runs a pipeline of stages (elevation, biomes,
+        # features, borders) over a whole chunk at once, and times each one.
+        # It reproduces the per-tile PerlinNoise(octaves=4, seed) base and
+        # PerlinNoise(octaves=8, seed + 1) feature noise exactly.
+        self.seed = seed
+        self.borders = borders
+        self.terrain = TerrainGenerator(seed, borders=borders, stages=stages)
+
+        # Least-recently-used chunks beyond the budget are evicted and paged
+        # in or regenerated later. Changes made to them survive as deltas.
+        self.chunks = ChunkCache(max_chunks=cache_chunks, max_bytes=cache_bytes)
+        self.pin_radius = pin_radius
+        self._focus = {}  # owner -> chunk they are in
+        self.explored = ExploredIndex()
+
+        # Low-resolution overviews are cached separately, so looking at a
+        # large area never pushes full chunks out of memory.
+        self.overviews = ChunkCache(max_chunks=OVERVIEW_CACHE_CHUNKS)
+
+        # Structures and villagers, placed as chunks are first seen.
+        self.entities = EntityLayer(seed, self.resident_chunk)
+        self._peeked = OrderedDict()  # Unexplored chunks populated by peek_chunk.
+        self.peeked_entity_chunks = peeked_entity_chunks
+
+        # Bumped whenever a chunk is (re)loaded or one of its tiles changes,
+        # so anything derived from a chunk's tiles knows when to rebuild.
+        self.versions = {}
+
+        # Tiles changed with set_tile, as {chunk: {y * CHUNK_WIDTH + x: tile}}.
+        # They are applied whenever the chunk is loaded, so the chunk store
+        # only ever holds generated terrain, and they are all a save game
+        # needs to store of the terrain. Tiles changed back to what was
+        # generated leave them again, so they only grow with the changed
+        # area, not with the number of changes.
+        self.deltas = {}
+        self._generated = {}  # The generated tiles the deltas replace, laid out alike.
+        self._dirty_deltas = set()  # Chunks whose deltas changed since the last save.
+
+        # Fog of war: the tiles the player has ever seen, as a bitset per
+        # chunk (np.packbits of its cells, row by row; 240 bytes a chunk).
+        self.seen = {}
+        self._dirty_explored = set()  # Chunks explored or seen more of since the last save.
+
+        self.store = None
+        if store_dir is not None:
+            # A store of a custom pipeline's terrain is told apart by the stages.
+            self.store = ChunkStore(store_dir, seed, borders=borders, pipeline=self.terrain.pipeline())
+
+        self.prefetcher = None
+        if prefetch_radius > 0:
+            self.prefetcher = ChunkPrefetcher(self._load_or_generate_chunk,
+                                              radius=prefetch_radius,
+                                              workers=prefetch_workers)
+
+    def set_focus(self, chunk_x, chunk_y, owner=None):
+        """
+        Pins the chunks around the given chunk in the cache and starts
+        generating them in the background. Called whenever the player
+        enters a new chunk.
+
+        Args:
+            chunk_x (int): The x-coordinate of the player's chunk.
+            chunk_y (int): The y-coordinate of the player's chunk.
+            owner (object, optional): Who the focus belongs to. When several
+                                      players share the map, the chunks
+                                      around every one of them stay pinned.
+        """
+        self._focus[owner] = (chunk_x, chunk_y)
+        self._pin_focus()
+        if self.prefetcher is not None:
+            self.prefetcher.update(chunk_x, chunk_y, self.chunks)
+
+    def clear_focus(self, owner=None):
+        """Unpins the chunks around a player who has left."""
+        if self._focus.pop(owner, None) is not None:
+            self._pin_focus()
+
+    def focus_chunks(self):
+        """Returns the chunks every current focus is in."""
+        return list(self._focus.values())
+
+    def _pin_focus(self):
+        self.chunks.pin(
+            (chunk_x + dx, chunk_y + dy)
+            for chunk_x, chunk_y in set(self._focus.values())
+            for dy in range(-self.pin_radius, self.pin_radius + 1)
+            for dx in range(-self.pin_radius, self.pin_radius + 1)
+        )
+
+    def close(self):
+        """Stops any background work owned by the map."""
+        if self.prefetcher is not None:
+            self.prefetcher.shutdown()
+        if self.store is not None:
+            self.store.close()
 
     def get_chunk(self, chunk_x, chunk_y):
         """
         Retrieves a map chunk for the given chunk coordinates.
 
-        If the chunk has not been generated yet, it calls the generation
-        function, stores the result, and then returns it.
+        If the chunk is not in memory yet, it is taken from the prefetcher
+        (waiting on the job if it is still running) or, failing that, paged
+        in from disk or generated here. The result is cached and returned.
+        """
+        chunk = self.chunks.get((chunk_x, chunk_y))
+        if chunk is None:
+            if self.prefetcher is not None:
+                chunk = self.prefetcher.take(chunk_x, chunk_y)
+            if chunk is None:
+                chunk = self._load_or_generate_chunk(chunk_x, chunk_y)
+            self._apply_delta(chunk_x, chunk_y, chunk)
+            self.chunks[(chunk_x, chunk_y)] = chunk
+            self.entities.populate(chunk_x, chunk_y, chunk)
+            if (chunk_x, chunk_y) not in self.explored:
+                self.explored.add((chunk_x, chunk_y))
+                self._dirty_explored.add((chunk_x, chunk_y))
+            self._peeked.pop((chunk_x, chunk_y), None)
+            self.versions[(chunk_x, chunk_y)] = self.versions.get((chunk_x, chunk_y), 0) + 1
+
+        return chunk
+
+    def peek_chunk(self, chunk_x, chunk_y):
+        """
+        Returns a chunk's tiles without making it resident or marking it as
+        explored, for looking ahead (e.g. pathfinding) without disturbing the
+        cache or the world map. Resident chunks are returned as they are, so
+        changes made to them are seen.
+        """
+        if (chunk_x, chunk_y) in self.chunks:
+            return self.chunks[(chunk_x, chunk_y)]
+        chunk = self._load_or_generate_chunk(chunk_x, chunk_y)
+        self._apply_delta(chunk_x, chunk_y, chunk)
+        self.entities.populate(chunk_x, chunk_y, chunk)
+        if (chunk_x, chunk_y) not in self.explored:
+            self._peeked[(chunk_x, chunk_y)] = True
+            self._peeked.move_to_end((chunk_x, chunk_y))
+            if len(self._peeked) > self.peeked_entity_chunks:
+                self.entities.forget(*self._peeked.popitem(last=False)[0])
+        return chunk
+
+    def resident_chunk(self, chunk_x, chunk_y):
+        """Returns a chunk if it is in memory, or None. Never loads anything."""
+        if (chunk_x, chunk_y) in self.chunks:
+            return self.chunks[(chunk_x, chunk_y)]
+        return None
+
+    def chunk_version(self, chunk_x, chunk_y):
+        """Returns a number that changes whenever the chunk's tiles may have."""
+        return self.versions.get((chunk_x, chunk_y), 0)
+
+    def set_tile(self, chunk_x, chunk_y, x, y, tile):
+        """
+        Changes a single tile. All changes to loaded terrain should go
+        through here so that caches built from the tiles are refreshed.
+        """
+        chunk = self.get_chunk(chunk_x, chunk_y)
+        self._record_changes((chunk_x, chunk_y), chunk, [y * CHUNK_WIDTH + x], [int(tile)])
+        chunk[y, x] = tile
+        self.versions[(chunk_x, chunk_y)] = self.versions.get((chunk_x, chunk_y), 0) + 1
+
+    def update_tiles(self, chunk_x, chunk_y, indices, tiles):
+        """
+        Changes a batch of tiles of a resident chunk at once, e.g. a step of
+        the world simulation, recording them as deltas like set_tile does.
+        The chunk keeps its place in the cache.
+
+        Args:
+            chunk_x (int): The chunk's x-coordinate.
+            chunk_y (int): The chunk's y-coordinate.
+            indices (np.ndarray): Flat tile indices, y * CHUNK_WIDTH + x.
+            tiles (np.ndarray): The new tile codes, one per index.
+        """
+        key = (chunk_x, chunk_y)
+        chunk = self.chunks.peek(key)
+        self._record_changes(key, chunk, indices.tolist(), tiles.tolist())
+        chunk.flat[indices] = tiles
+        self.versions[key] = self.versions.get(key, 0) + 1
+
+    def _record_changes(self, key, chunk, indices, tiles):
+        """
+        Adds changes to a resident chunk's delta, before they are made to
+        the chunk. Tiles set back to their generated value leave the delta.
+        """
+        delta = self.deltas.setdefault(key, {})
+        generated = self._generated.setdefault(key, {})
+        for index, tile in zip(indices, tiles):
+            if index not in delta:
+                # The chunk still shows the generated tile here.
+                if chunk.flat[index] != tile:
+                    generated[index] = int(chunk.flat[index])
+                    delta[index] = tile
+            elif generated.get(index) == tile:
+                del delta[index], generated[index]
+            else:
+                delta[index] = tile
+        if not delta:
+            del self.deltas[key], self._generated[key]
+        self._dirty_deltas.add(key)
+
+    def _apply_delta(self, chunk_x, chunk_y, chunk):
+        """Applies a chunk's delta to its freshly generated or loaded tiles."""
+        delta = self.deltas.get((chunk_x, chunk_y))
+        if delta:
+            generated = self._generated.setdefault((chunk_x, chunk_y), {})
+            for index in delta:
+                if index not in generated:
+                    generated[index] = int(chunk.flat[index])
+            chunk.flat[list(delta)] = list(delta.values())
+
+    def load_deltas(self, deltas):
+        """
+        Restores tile changes, e.g. from a save game. Chunks already in memory
+        are updated straight away, the others when they are loaded.
+
+        Args:
+            deltas (dict): {(chunk_x, chunk_y): {y * CHUNK_WIDTH + x: tile}}.
+        """
+        for key, delta in deltas.items():
+            if key in self.chunks:
+                self._record_changes(key, self.chunks[key], list(delta), list(delta.values()))
+                self.chunks[key].flat[list(delta)] = list(delta.values())
+                self.versions[key] = self.versions.get(key, 0) + 1
+            else:
+                self.deltas.setdefault(key, {}).update(delta)
+
+    def take_dirty_deltas(self):
+        """
+        Returns copies of the deltas of the chunks changed since the last
+        call, as {(chunk_x, chunk_y): {index: tile}}, for an incremental save.
         """
-        if (chunk_x, chunk_y) not in self.chunks:
-            self.chunks[(chunk_x, chunk_y)] = self._generate_chunk(chunk_x, chunk_y)
+        dirty = {key: dict(self.deltas.get(key, {})) for key in self._dirty_deltas}
+        self._dirty_deltas.clear()
+        return dirty
 
-        return self.chunks[(chunk_x, chunk_y)]
+    def take_dirty_explored(self):
+        """
+        Returns the chunks explored, or with more of their tiles seen, since
+        the last call, for an incremental save.
+        """
+        dirty, self._dirty_explored = self._dirty_explored, set()
+        return dirty
+
+    def mark_seen(self, left, top, mask):
+        """
+        Adds the tiles of a mask to the ones the player has seen.
+
+        Args:
+            left (int): Global x-coordinate of the mask's first column.
+            top (int): Global y-coordinate of the mask's first row.
+            mask (np.ndarray): 2D bool array, True where a tile was seen.
+        """
+        height, width = mask.shape
+        for chunk_y in range(top // CHUNK_HEIGHT, (top + height - 1) // CHUNK_HEIGHT + 1):
+            for chunk_x in range(left // CHUNK_WIDTH, (left + width - 1) // CHUNK_WIDTH + 1):
+                chunk_left, chunk_top = chunk_x * CHUNK_WIDTH, chunk_y * CHUNK_HEIGHT
+                x0, x1 = max(left, chunk_left), min(left + width, chunk_left + CHUNK_WIDTH)
+                y0, y1 = max(top, chunk_top), min(top + height, chunk_top + CHUNK_HEIGHT)
+                part = mask[y0 - top:y1 - top, x0 - left:x1 - left]
+                if not part.any():
+                    continue
+                bits = self.seen.get((chunk_x, chunk_y))
+                seen = (np.zeros((CHUNK_HEIGHT, CHUNK_WIDTH), dtype=bool) if bits is None else
+                        np.unpackbits(np.frombuffer(bits, dtype=np.uint8))
+                        .view(bool).reshape(CHUNK_HEIGHT, CHUNK_WIDTH))
+                seen[y0 - chunk_top:y1 - chunk_top, x0 - chunk_left:x1 - chunk_left] |= part
+                bits = np.packbits(seen).tobytes()
+                if bits != self.seen.get((chunk_x, chunk_y)):
+                    self.seen[(chunk_x, chunk_y)] = bits
+                    self._dirty_explored.add((chunk_x, chunk_y))
+
+    def seen_area(self, left, top, width, height):
+        """
+        Returns which tiles of an area the player has seen, as a 2D bool
+        array of `height` rows by `width` columns.
+        """
+        area = np.zeros((height, width), dtype=bool)
+        for chunk_y in range(top // CHUNK_HEIGHT, (top + height - 1) // CHUNK_HEIGHT + 1):
+            for chunk_x in range(left // CHUNK_WIDTH, (left + width - 1) // CHUNK_WIDTH + 1):
+                bits = self.seen.get((chunk_x, chunk_y))
+                if bits is None:
+                    continue
+                seen = np.unpackbits(np.frombuffer(bits, dtype=np.uint8)).view(bool) \
+                    .reshape(CHUNK_HEIGHT, CHUNK_WIDTH)
+                chunk_left, chunk_top = chunk_x * CHUNK_WIDTH, chunk_y * CHUNK_HEIGHT
+                x0, x1 = max(left, chunk_left), min(left + width, chunk_left + CHUNK_WIDTH)
+                y0, y1 = max(top, chunk_top), min(top + height, chunk_top + CHUNK_HEIGHT)
+                area[y0 - top:y1 - top, x0 - left:x1 - left] = \
+                    seen[y0 - chunk_top:y1 - chunk_top, x0 - chunk_left:x1 - chunk_left]
+        return area
+
+    def get_overview(self, chunk_x, chunk_y, columns=1, rows=1):
+        """
+        Returns a low-resolution view of the terrain of a block of chunks,
+        one tile code per OVERVIEW_CELL_WIDTH x OVERVIEW_CELL_HEIGHT tiles.
+
+        Overviews are read straight from the noise field, so they cost a
+        small fraction of generating the chunks and never load them. They
+        show the terrain as generated; changes made with set_tile only
+        appear once the chunk is viewed at full detail.
+
+        Args:
+            chunk_x (int): The x-coordinate of the top-left chunk.
+            chunk_y (int): The y-coordinate of the top-left chunk.
+            columns (int): Number of chunks across.
+            rows (int): Number of chunks down.
+
+        Returns:
+            np.ndarray: Tile codes of shape (rows * OVERVIEW_HEIGHT, columns * OVERVIEW_WIDTH).
+        """
+        keys = [(chunk_x + c, chunk_y + r) for r in range(rows) for c in range(columns)]
+        missing = [key for key in keys if key not in self.overviews]
+        if missing:
+            # Generate the smallest rectangle covering every missing overview
+            # in one noise evaluation.
+            min_x = min(key[0] for key in missing)
+            min_y = min(key[1] for key in missing)
+            block = self.terrain.overview_block(min_x, min_y,
+                                                max(key[0] for key in missing) - min_x + 1,
+                                                max(key[1] for key in missing) - min_y + 1)
+            for key, overview in block.items():
+                if key not in self.overviews:
+                    self.overviews[key] = overview
+
+        result = np.empty((rows * OVERVIEW_HEIGHT, columns * OVERVIEW_WIDTH), dtype=TILE_DTYPE)
+        for (x, y) in keys:
+            top = (y - chunk_y) * OVERVIEW_HEIGHT
+            left = (x - chunk_x) * OVERVIEW_WIDTH
+            result[top:top + OVERVIEW_HEIGHT, left:left + OVERVIEW_WIDTH] = self.overviews[(x, y)]
+        return result
+
+    def _load_or_generate_chunk(self, chunk_x, chunk_y):
+        """
+        Reads a chunk from the on-disk store, or generates it and queues it
+        to be written there. Safe to call from the prefetch workers.
+        """
+        if self.store is not None:
+            chunk = self.store.load(chunk_x, chunk_y)
+            if chunk is not None:
+                return chunk
+
+        chunk = self._generate_chunk(chunk_x, chunk_y)
+        if self.store is not None:
+            self.store.save(chunk_x, chunk_y, chunk)
+        return chunk
 
     def _generate_chunk(self, chunk_x, chunk_y):
         """
         Generates a new map chunk using Perlin noise for natural terrain.
+        Chunks are uint8 arrays of Tile codes, indexed as chunk[y, x].
+
+        The noise is sampled at global coordinates to ensure seamless chunk
+        transitions, then thresholded into water, grassland (with bushes)
+        and rock, and finally bordered with walls, each by a stage of the
+        terrain pipeline (see self.terrain.stage_stats() for their times).
         """
-        chunk_data = [[EMPTY for _ in range(CHUNK_WIDTH)] for _ in range(CHUNK_HEIGHT)]
-
-        # Scale determines the "zoom" level of the noise. Smaller values = larger features.
-        scale = 0.05
-
-        for y in range(CHUNK_HEIGHT):
-            for x in range(CHUNK_WIDTH):
-                # Calculate global coordinates to ensure seamless chunk transitions.
-                global_x = (chunk_x * CHUNK_WIDTH) + x
-                global_y = (chunk_y * CHUNK_HEIGHT) + y
-
-                # Generate noise value. The library returns values from -0.5 to 0.5.
-                # We normalize it to a 0.0 to 1.0 range for easier use with thresholds.
-                noise_val = self.noise([global_x * scale, global_y * scale])
-                noise_val = (noise_val + 0.5) # Shift to 0-1 range
-
-                # Apply thresholds to determine the base terrain type.
-                if noise_val < 0.35:
-                    chunk_data[y][x] = WATER
-                elif noise_val < 0.65:
-                    # This is our "grassland" area, add features on top.
-                    feature_val = self.feature_noise([global_x * scale * 2, global_y * scale * 2])
-                    feature_val = (feature_val + 0.5)
-                    if feature_val > 0.8:
-                        chunk_data[y][x] = BUSH
-                    else:
-                        chunk_data[y][x] = EMPTY
-                elif noise_val < 0.8:
-                    chunk_data[y][x] = ROCK
-                else:
-                    # Higher elevations are rockier
-                    chunk_data[y][x] = ROCK
-
-        # Draw a border around the chunk to contain the player.
-        for x in range(CHUNK_WIDTH):
-            chunk_data[0][x] = WALL
-            chunk_data[CHUNK_HEIGHT - 1][x] = WALL
-        for y in range(CHUNK_HEIGHT):
-            chunk_data[y][0] = WALL
-            chunk_data[y][CHUNK_WIDTH - 1] = WALL
-
-        return chunk_data
+        return self.terrain.generate(chunk_x, chunk_y)
 
 
 # This block allows for testing the new map generation independently.
@@ -104,6 +433,93 @@ if __name__ == '__main__':
 
     # Print the generated chunk to the console for visual inspection.
     for row in start_chunk:
-        print("".join(row))
+        print(glyph_row(row))
+
+    print(f"\nChunk (0, 0) is now cached: {(0, 0) in world_map.chunks}")
+
+    # Prefetched neighbours must match chunks generated on demand.
+    print("\nTesting background prefetching...")
+    prefetch_map = Map(seed=123, prefetch_radius=1)
+    prefetch_map.get_chunk(0, 0)
+    prefetch_map.set_focus(0, 0)
+    for key in prefetch_map.prefetcher.ring(0, 0):
+        assert np.array_equal(prefetch_map.get_chunk(*key), world_map.get_chunk(*key))
+    prefetch_map.set_focus(5, 5)  # Far jump: nothing left to cancel.
+    prefetch_map.get_chunk(9, 9)
+    stats = prefetch_map.prefetcher.stats()
+    prefetch_map.close()
+    print(f"Prefetch stats: {stats}")
+    # (0, 0) and (9, 9) were never scheduled, the ring always was.
+    assert stats["hits"] + stats["waits"] == 8 and stats["misses"] == 2
+
+    # Chunks written by one session are paged back in by the next.
+    print("\nTesting the on-disk chunk store...")
+    import tempfile
+    with tempfile.TemporaryDirectory() as store_dir:
+        first_session = Map(seed=123, store_dir=store_dir)
+        first_session.get_chunk(2, 3)
+        first_session.close()
+        second_session = Map(seed=123, store_dir=store_dir)
+        assert np.array_equal(second_session.get_chunk(2, 3), world_map.get_chunk(2, 3))
+        assert second_session.store.loads == 1
+        second_session.close()
+    print("Chunk (2, 3) was loaded from disk in the second session.")
+
+    # The cache keeps to its budget, never evicts the pinned ring, and still
+    # remembers every explored chunk.
+    print("\nTesting the bounded chunk cache...")
+    cached_map = Map(seed=123, cache_chunks=12)
+    cached_map.set_focus(0, 0)
+    for chunk_x in range(-1, 20):
+        cached_map.get_chunk(chunk_x, 0)
+    assert len(cached_map.chunks) == 12
+    assert (-1, 0) in cached_map.chunks and (0, 0) in cached_map.chunks
+    assert len(cached_map.explored) == 21
+    assert np.array_equal(cached_map.get_chunk(5, 0), world_map.get_chunk(5, 0))
+    print(f"Cache stats: {cached_map.chunks.stats()}")
+
+    # Changes survive eviction, and tiles changed back leave the deltas.
+    from tiles import Tile
+    generated = world_map.get_chunk(5, 0).reshape(-1)
+    indices = np.array([CHUNK_WIDTH + 1, CHUNK_WIDTH + 2, CHUNK_WIDTH + 3])
+    changed = np.where(generated[indices] == Tile.WATER, Tile.ROCK, Tile.WATER).astype(TILE_DTYPE)
+    cached_map.update_tiles(5, 0, indices, changed)
+    for chunk_x in range(6, 20):
+        cached_map.get_chunk(chunk_x, 0)
+    assert (5, 0) not in cached_map.chunks
+    cached_map.get_chunk(5, 0)
+    assert np.array_equal(cached_map.get_chunk(5, 0).flat[indices], changed)
+    cached_map.update_tiles(5, 0, indices[:2], generated[indices[:2]])
+    assert list(cached_map.deltas[(5, 0)]) == [CHUNK_WIDTH + 3]
+    cached_map.set_tile(5, 0, 3, 1, generated[CHUNK_WIDTH + 3])
+    assert (5, 0) not in cached_map.deltas
+    assert np.array_equal(cached_map.get_chunk(5, 0), world_map.get_chunk(5, 0))
+    print("Tiles changed back to their generated value leave the deltas.")
+
+    # Entities of chunks only peeked at are forgotten beyond a limit, and
+    # come back the same when the chunk is peeked at again.
+    peek_map = Map(seed=123, borders=False, peeked_entity_chunks=4)
+    peek_map.peek_chunk(0, 0)
+    solid = peek_map.entities.solid_cells(0, 0)
+    for chunk_x in range(1, 12):
+        peek_map.peek_chunk(chunk_x, 0)
+    peeked = [chunk_x for chunk_x in range(12) if peek_map.entities.is_populated(chunk_x, 0)]
+    assert peeked == list(range(8, 12))
+    peek_map.get_chunk(0, 0)
+    assert peek_map.entities.solid_cells(0, 0) == solid
+    print(f"Entities kept for {len(peeked)} of 12 peeked chunks.")
 
-    print(f"\nChunk (0, 0) is now cached: {(0, 0) in world_map.chunks}")
\ No newline at end of file
+    # Overviews are generated from the noise alone and agree with the chunks.
+    print("\nTesting low-resolution overviews...")
+    from terrain import OVERVIEW_CELL_WIDTH, OVERVIEW_CELL_HEIGHT
+    overview_map = Map(seed=123, borders=False)
+    area = overview_map.get_overview(-2, -1, 4, 3)
+    assert area.shape == (3 * OVERVIEW_HEIGHT, 4 * OVERVIEW_WIDTH)
+    assert len(overview_map.chunks) == 0 and len(overview_map.overviews) == 12
+    full = overview_map.get_chunk(1, 1)
+    assert np.array_equal(area[2 * OVERVIEW_HEIGHT:, 3 * OVERVIEW_WIDTH:],
+                          full[OVERVIEW_CELL_HEIGHT // 2::OVERVIEW_CELL_HEIGHT,
+                               OVERVIEW_CELL_WIDTH // 2::OVERVIEW_CELL_WIDTH])
+    assert np.array_equal(overview_map.get_overview(0, 0), area[OVERVIEW_HEIGHT:2 * OVERVIEW_HEIGHT,
+                                                                2 * OVERVIEW_WIDTH:3 * OVERVIEW_WIDTH])
+    print("Overviews match the full chunks.")
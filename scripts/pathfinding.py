@@ -0,0 +1,557 @@
+import heapq
+from collections import OrderedDict, deque
+
+import numpy as np
+
+from terrain import CHUNK_WIDTH, CHUNK_HEIGHT
+from tiles import WALKABLE
+
+# A row bitset with every tile walkable.
+FULL_ROW = (1 << CHUNK_WIDTH) - 1
+
+# Abstract nodes A* may expand before giving up. The world is endless, so
+# without a limit an unreachable goal would be searched for forever.
+MAX_EXPANSIONS = 50000
+
+# How many chunks out auto-explore looks for an unexplored chunk.
+EXPLORE_RADIUS = 8
+
+# Most chunks whose walkability and portal links are cached. A route 300
+# chunks long reads about 1500 of them; beyond this the least recently used
+# are dropped and rebuilt if needed again.
+PATH_CACHE_CHUNKS = 2048
+
+
+def walkable_rows(chunk):
+    """
+    Packs a chunk's walkability into one integer bitset per row, where bit
+    x of rows[y] is set if tile (x, y) can be walked on.
+    """
+    packed = np.packbits(WALKABLE[chunk], axis=1, bitorder="little")
+    return tuple(int.from_bytes(row.tobytes(), "little") for row in packed)
+
+
+def _runs(mask, length):
+    """Yields (start, end) of each run of set bits in the low `length` bits."""
+    x = 0
+    while x < length:
+        if mask >> x & 1:
+            start = x
+            while x < length and mask >> x & 1:
+                x += 1
+            yield start, x
+        else:
+            x += 1
+
+
+def _flood(rows, source, targets=()):
+    """
+    Breadth-first search over row bitsets, one whole frontier per step.
+
+    Args:
+        rows (tuple): The chunk's walkable_rows().
+        source (tuple): Local (x, y) to start from.
+        targets (iterable): Local (x, y) tiles to stop at once all are found.
+
+    Returns:
+        list: The frontier of each distance as a list of row bitsets;
+              layers[d][y] has bit x set if (x, y) is d steps from source.
+    """
+    remaining = set(targets)
+    remaining.discard(source)
+    frontier = [0] * CHUNK_HEIGHT
+    frontier[source[1]] = 1 << source[0]
+    visited = list(frontier)
+    layers = [frontier]
+    while True:
+        grown = [0] * CHUNK_HEIGHT
+        found = 0
+        for y in range(CHUNK_HEIGHT):
+            spread = frontier[y] << 1 | frontier[y] >> 1
+            if y > 0:
+                spread |= frontier[y - 1]
+            if y < CHUNK_HEIGHT - 1:
+                spread |= frontier[y + 1]
+            new = spread & rows[y] & ~visited[y]
+            if new:
+                grown[y] = new
+                visited[y] |= new
+                found = 1
+        if not found:
+            return layers
+        layers.append(grown)
+        frontier = grown
+        if remaining:
+            remaining = {(x, y) for x, y in remaining if not grown[y] >> x & 1}
+            if not remaining:
+                return layers
+        elif targets:
+            return layers
+
+
+def run_search(search):
+    """
+    Runs a search started with PathFinder.search or explore_search to the
+    end, and returns its result.
+    """
+    while True:
+        try:
+            next(search)
+        except StopIteration as stop:
+            return stop.value
+
+
+def _distance(layers, target):
+    """The distance of a local tile in a _flood() result, or None."""
+    x, y = target
+    for distance, layer in enumerate(layers):
+        if layer[y] >> x & 1:
+            return distance
+    return None
+
+
+class PathFinder:
+    """
+    Hierarchical A* over the world's chunks.
+
+    Each chunk's walkability is kept as row bitsets. The tiles on either
+    side of every open stretch of a chunk edge form a portal, and the portal
+    tiles of a chunk are linked by their walking distance inside it. Long
+    routes are searched over this small graph of portals and only refined
+    to single steps as they are walked.
+
+    Everything is cached per chunk and keyed by chunk versions, so changing
+    a tile only rebuilds the parts of the graph that touch its chunk, the
+    next time they are needed. The caches are least-recently-used, like
+    ChunkCache, so planning routes far and wide doesn't grow them forever.
+    """
+
+    def __init__(self, world_map, cache_chunks=PATH_CACHE_CHUNKS):
+        """
+        Args:
+            world_map (Map): The world to find paths in. Chunks are read
+                             with peek_chunk, so looking ahead neither
+                             explores them nor pushes them out of memory.
+            cache_chunks (int): Most chunks kept in each cache.
+        """
+        self.world_map = world_map
+        self.cache_chunks = cache_chunks
+        self._rows = OrderedDict()   # chunk -> (version, rows, fully walkable)
+        self._edges = OrderedDict()  # (chunk, side) -> (versions, portal offsets)
+        self._links = OrderedDict()  # chunk -> (signature, {node: [(node, cost)]})
+        self.expansions = 0  # Nodes expanded by the last search.
+
+    # --- Per-chunk caches ---
+
+    @staticmethod
+    def _cached(cache, key):
+        """Returns a cache entry and marks it as recently used, or None."""
+        entry = cache.get(key)
+        if entry is not None:
+            cache.move_to_end(key)
+        return entry
+
+    def _store(self, cache, key, entry):
+        """Adds a cache entry, dropping the least recently used beyond the limit."""
+        cache[key] = entry
+        cache.move_to_end(key)
+        # Edges are cached by side, two per chunk.
+        limit = 2 * self.cache_chunks if cache is self._edges else self.cache_chunks
+        while len(cache) > limit:
+            cache.popitem(last=False)
+
+    def _walkable(self, key):
+        """Returns (rows, fully walkable) for a chunk."""
+        version = self.world_map.chunk_version(*key)
+        entry = self._cached(self._rows, key)
+        if entry is None or entry[0] != version:
+            rows = list(walkable_rows(self.world_map.peek_chunk(*key)))
+            # Structures are as much in the way as walls are.
+            for x, y in self.world_map.entities.solid_cells(*key):
+                rows[y % CHUNK_HEIGHT] &= ~(1 << x % CHUNK_WIDTH)
+            entry = (version, rows, all(row == FULL_ROW for row in rows))
+            self._store(self._rows, key, entry)
+        return entry[1], entry[2]
+
+    def _edge(self, key, side):
+        """
+        Offsets of the portals on a chunk's east ("E") or south ("S") edge,
+        one in the middle of every stretch open on both sides.
+        """
+        chunk_x, chunk_y = key
+        other = (chunk_x + 1, chunk_y) if side == "E" else (chunk_x, chunk_y + 1)
+        versions = (self.world_map.chunk_version(*key), self.world_map.chunk_version(*other))
+        entry = self._cached(self._edges, (key, side))
+        if entry is not None and entry[0] == versions:
+            return entry[1]
+
+        rows, _ = self._walkable(key)
+        other_rows, _ = self._walkable(other)
+        if side == "E":
+            mask = 0
+            for y in range(CHUNK_HEIGHT):
+                if rows[y] >> (CHUNK_WIDTH - 1) & 1 and other_rows[y] & 1:
+                    mask |= 1 << y
+            length = CHUNK_HEIGHT
+        else:
+            mask = rows[CHUNK_HEIGHT - 1] & other_rows[0]
+            length = CHUNK_WIDTH
+        offsets = tuple((start + end - 1) // 2 for start, end in _runs(mask, length))
+        self._store(self._edges, (key, side), (versions, offsets))
+        return offsets
+
+    def _portals(self, key):
+        """Returns (tile inside the chunk, tile across the edge) for every portal."""
+        chunk_x, chunk_y = key
+        left, top = chunk_x * CHUNK_WIDTH, chunk_y * CHUNK_HEIGHT
+        right, bottom = left + CHUNK_WIDTH - 1, top + CHUNK_HEIGHT - 1
+        portals = []
+        for y in self._edge(key, "E"):
+            portals.append(((right, top + y), (right + 1, top + y)))
+        for y in self._edge((chunk_x - 1, chunk_y), "E"):
+            portals.append(((left, top + y), (left - 1, top + y)))
+        for x in self._edge(key, "S"):
+            portals.append(((left + x, bottom), (left + x, bottom + 1)))
+        for x in self._edge((chunk_x, chunk_y - 1), "S"):
+            portals.append(((left + x, top), (left + x, top - 1)))
+        return portals
+
+    def _chunk_links(self, key):
+        """
+        The abstract graph around one chunk: each portal tile inside it is
+        linked to the tile across its edge and to every other portal tile
+        it can reach inside the chunk.
+        """
+        # The links depend on the chunk's tiles and on its edges, and so on
+        # the tiles of its four neighbours.
+        chunk_x, chunk_y = key
+        version = self.world_map.chunk_version
+        signature = (version(chunk_x, chunk_y), version(chunk_x + 1, chunk_y), version(chunk_x - 1, chunk_y),
+                     version(chunk_x, chunk_y + 1), version(chunk_x, chunk_y - 1))
+        entry = self._cached(self._links, key)
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+
+        portals = self._portals(key)
+        graph = {}
+        for inside, across in portals:
+            graph.setdefault(inside, []).append((across, 1))
+        nodes = list(graph)
+        for i, node in enumerate(nodes):
+            for other, distance in self._distances(node, nodes[i + 1:]).items():
+                graph[node].append((other, distance))
+                graph[other].append((node, distance))
+        self._store(self._links, key, (signature, graph))
+        return graph
+
+    # --- Searches inside one chunk ---
+
+    @staticmethod
+    def chunk_of(tile):
+        """The chunk containing a global tile."""
+        return tile[0] // CHUNK_WIDTH, tile[1] // CHUNK_HEIGHT
+
+    def _local(self, tile):
+        return tile[0] % CHUNK_WIDTH, tile[1] % CHUNK_HEIGHT
+
+    def _distances(self, source, targets):
+        """
+        Walking distances inside one chunk from a global tile to other tiles
+        of the same chunk. Unreachable targets are left out.
+        """
+        if not targets:
+            return {}
+        rows, is_open = self._walkable(self.chunk_of(source))
+        if is_open:
+            # Nothing in the way: the distance is the Manhattan distance.
+            return {t: abs(t[0] - source[0]) + abs(t[1] - source[1]) for t in targets}
+        local = {self._local(t): t for t in targets}
+        layers = _flood(rows, self._local(source), local)
+        distances = {}
+        for point, tile in local.items():
+            distance = _distance(layers, point)
+            if distance is not None:
+                distances[tile] = distance
+        return distances
+
+    def segment(self, start, end):
+        """
+        The tiles of a shortest walk from `start` to `end`, excluding start.
+        Both tiles must be in the same chunk, or be neighbours across an edge.
+        """
+        if abs(end[0] - start[0]) + abs(end[1] - start[1]) <= 1:
+            return [end] if end != start else []
+        rows, is_open = self._walkable(self.chunk_of(start))
+        if is_open:
+            # Straight across, then straight down or up.
+            step_x = 1 if end[0] > start[0] else -1
+            step_y = 1 if end[1] > start[1] else -1
+            tiles = [(x, start[1]) for x in range(start[0] + step_x, end[0] + step_x, step_x)]
+            tiles += [(end[0], y) for y in range(start[1] + step_y, end[1] + step_y, step_y)]
+            return tiles
+
+        # Walk back from the end through the frontiers of a flood.
+        origin_x, origin_y = start[0] - start[0] % CHUNK_WIDTH, start[1] - start[1] % CHUNK_HEIGHT
+        layers = _flood(rows, self._local(start), [self._local(end)])
+        x, y = self._local(end)
+        distance = _distance(layers, (x, y))
+        if distance is None:
+            return None
+        tiles = [(x, y)]
+        for layer in reversed(layers[:distance]):
+            for nx, ny in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+                if 0 <= ny < CHUNK_HEIGHT and 0 <= nx < CHUNK_WIDTH and layer[ny] >> nx & 1:
+                    x, y = nx, ny
+                    break
+            tiles.append((x, y))
+        tiles.reverse()
+        return [(origin_x + x, origin_y + y) for x, y in tiles[1:]]
+
+    # --- Searches across chunks ---
+
+    def is_walkable(self, tile):
+        rows, _ = self._walkable(self.chunk_of(tile))
+        x, y = self._local(tile)
+        return bool(rows[y] >> x & 1)
+
+    def find_path(self, start, goal, max_expansions=MAX_EXPANSIONS):
+        """
+        Finds a route between two global tile coordinates.
+
+        Args:
+            start (tuple): Global (x, y) to start from.
+            goal (tuple): Global (x, y) to reach.
+            max_expansions (int): Give up after expanding this many nodes.
+
+        Returns:
+            Route: The route, or None if the goal could not be reached.
+        """
+        return run_search(self.search(start, goal, max_expansions))
+
+    def search(self, start, goal, max_expansions=MAX_EXPANSIONS):
+        """
+        find_path as a generator, for planning a little at a time: it yields
+        after every node it expands (each of which reads at most a few
+        chunks) and returns the route, or None, when it is done. Run it to
+        the end with run_search, or step it with next().
+
+        The world may change between steps; routes are checked against it
+        as they are walked anyway.
+        """
+        self.expansions = 0
+        if start == goal:
+            return Route(self, [start])
+        if not self.is_walkable(goal):
+            return None
+
+        # The start and goal join the abstract graph through the portal
+        # tiles of their own chunks.
+        start_chunk, goal_chunk = self.chunk_of(start), self.chunk_of(goal)
+        start_targets = list(self._chunk_links(start_chunk))
+        if start_chunk == goal_chunk:
+            start_targets.append(goal)
+        start_links = list(self._distances(start, start_targets).items())
+        yield
+        goal_links = self._distances(goal, list(self._chunk_links(goal_chunk)))
+        yield
+
+        def heuristic(tile):
+            return abs(tile[0] - goal[0]) + abs(tile[1] - goal[1])
+
+        # Nothing changes during a search, so each chunk's links are looked
+        # up (and checked against the chunk versions) once.
+        graphs = {}
+
+        # Ties on f are broken towards the goal, which keeps the search to a
+        # narrow corridor on open ground.
+        best = {start: 0}
+        parents = {start: None}
+        heap = [(heuristic(start), heuristic(start), start)]
+        expansions = 0
+        while heap:
+            _, _, node = heapq.heappop(heap)
+            if node == goal:
+                break
+            if expansions:
+                yield
+            expansions += 1
+            self.expansions = expansions
+            if expansions > max_expansions:
+                return None
+
+            cost = best[node]
+            if node == start:
+                links = start_links
+            else:
+                chunk = self.chunk_of(node)
+                graph = graphs.get(chunk)
+                if graph is None:
+                    graph = graphs[chunk] = self._chunk_links(chunk)
+                links = graph.get(node, ())
+                if chunk == goal_chunk and node in goal_links:
+                    links = list(links) + [(goal, goal_links[node])]
+            for neighbour, distance in links:
+                new_cost = cost + distance
+                if new_cost < best.get(neighbour, new_cost + 1):
+                    best[neighbour] = new_cost
+                    parents[neighbour] = node
+                    h = heuristic(neighbour)
+                    heapq.heappush(heap, (new_cost + h, h, neighbour))
+        else:
+            return None
+
+        waypoints = [goal]
+        while parents[waypoints[-1]] is not None:
+            waypoints.append(parents[waypoints[-1]])
+        waypoints.reverse()
+        return Route(self, waypoints, best[goal])
+
+    def explore_target(self, start, explored, radius=EXPLORE_RADIUS):
+        """
+        Finds a route to the nearest chunk that has not been explored yet.
+
+        Args:
+            start (tuple): Global (x, y) of the player.
+            explored (ExploredIndex): The chunks explored so far.
+            radius (int): How many chunks out to look.
+
+        Returns:
+            tuple: ((chunk_x, chunk_y), Route), or (None, None) if there is
+                   no reachable unexplored chunk within the radius.
+        """
+        return run_search(self.explore_search(start, explored, radius))
+
+    def explore_search(self, start, explored, radius=EXPLORE_RADIUS):
+        """explore_target as a generator, stepped like search()."""
+        chunk_x, chunk_y = self.chunk_of(start)
+        for ring in range(1, radius + 1):
+            candidates = [
+                (chunk_x + dx, chunk_y + dy)
+                for dy in range(-ring, ring + 1)
+                for dx in range(-ring, ring + 1)
+                if max(abs(dx), abs(dy)) == ring and (chunk_x + dx, chunk_y + dy) not in explored
+            ]
+            candidates.sort(key=lambda key: ((key[0] - chunk_x) * CHUNK_WIDTH) ** 2
+                                            + ((key[1] - chunk_y) * CHUNK_HEIGHT) ** 2)
+            for key in candidates:
+                goal = self.nearest_walkable(key)
+                yield
+                if goal is None:
+                    continue
+                route = yield from self.search(start, goal, max_expansions=MAX_EXPANSIONS // 10)
+                if route is not None:
+                    return key, route
+        return None, None
+
+    def nearest_walkable(self, key):
+        """The walkable tile nearest to a chunk's centre, or None."""
+        rows, is_open = self._walkable(key)
+        centre = (CHUNK_WIDTH // 2, CHUNK_HEIGHT // 2)
+        if not is_open:
+            walkable = np.array([[row >> x & 1 for x in range(CHUNK_WIDTH)] for row in rows], dtype=bool)
+            if not walkable.any():
+                return None
+            ys, xs = np.nonzero(walkable)
+            nearest = np.argmin(np.abs(xs - centre[0]) + np.abs(ys - centre[1]))
+            centre = (int(xs[nearest]), int(ys[nearest]))
+        return key[0] * CHUNK_WIDTH + centre[0], key[1] * CHUNK_HEIGHT + centre[1]
+
+
+class Route:
+    """
+    A route found by PathFinder, refined into single steps as it is walked
+    so that long routes cost nothing up front beyond the abstract search.
+    """
+
+    def __init__(self, finder, waypoints, length=0):
+        """
+        Args:
+            finder (PathFinder): Used to refine the route between waypoints.
+            waypoints (list): Global tiles from the start to the goal.
+            length (int): The route's length in steps.
+        """
+        self._finder = finder
+        self.waypoints = deque(waypoints[1:])
+        self.position = waypoints[0]
+        self.goal = waypoints[-1]
+        self.length = length
+        self._steps = deque()
+
+    def next_step(self):
+        """
+        Returns the (dx, dy) of the next step, or None once the goal is
+        reached or the way ahead has been blocked since the route was found.
+        """
+        while not self._steps:
+            if not self.waypoints:
+                return None
+            tiles = self._finder.segment(self.position, self.waypoints.popleft())
+            if tiles is None:
+                self.waypoints.clear()
+                return None
+            self._steps.extend(tiles)
+        tile = self._steps.popleft()
+        step = (tile[0] - self.position[0], tile[1] - self.position[1])
+        self.position = tile
+        return step
+
+
+# This block tests the pathfinder and measures long routes.
+if __name__ == '__main__':
+    import time
+    from map import Map
+    from player import Player
+    from tiles import Tile
+
+    print("--- Testing Hierarchical Pathfinding ---")
+    world_map = Map(seed=123, borders=False)
+    finder = PathFinder(world_map)
+
+    # A wall across the whole of chunk (1, 0) with a single gap at y = 20.
+    for y in range(CHUNK_HEIGHT):
+        if y != 20:
+            world_map.set_tile(1, 0, 40, y, Tile.WALL)
+    start = (CHUNK_WIDTH + 30, 5)
+    goal = (CHUNK_WIDTH + 50, 5)
+    route = finder.find_path(start, goal)
+    assert route is not None and route.length == 20 + 2 * 15, route.length
+
+    # Walking the route with Player.move reaches the goal.
+    player = Player(start_x=30, start_y=5, start_chunk_x=1)
+    steps = 0
+    while True:
+        step = route.next_step()
+        if step is None:
+            break
+        player.move(step[0], step[1], world_map)
+        steps += 1
+    assert (player.chunk_x * CHUNK_WIDTH + player.x, player.chunk_y * CHUNK_HEIGHT + player.y) == goal
+    assert steps == route.length
+    print(f"Walked around a wall in {steps} steps.")
+
+    # Closing the gap only invalidates that chunk; the route now leaves it.
+    world_map.set_tile(1, 0, 40, 20, Tile.WALL)
+    detour = finder.find_path(start, goal)
+    assert detour is not None and detour.length > route.length
+    print(f"With the gap closed the detour is {detour.length} steps.")
+
+    # Long routes over cached chunks take milliseconds.
+    print("\n--- Benchmark ---")
+    for chunks in (100, 300):
+        goal = (chunks * CHUNK_WIDTH + 40, 12)
+        start_time = time.perf_counter()
+        route = finder.find_path((40, 12), goal)
+        cold = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        route = finder.find_path((40, 12), goal)
+        warm = time.perf_counter() - start_time
+        print(f"  {chunks} chunks east: {cold * 1000:7.1f} ms cold (reading chunks), "
+              f"{warm * 1000:5.1f} ms cached, {route.length} steps, {finder.expansions} expansions")
+
+    # The caches stay within their bounds; a finder with small ones rebuilds
+    # what it dropped and finds the same route.
+    small = PathFinder(world_map, cache_chunks=64)
+    assert small.find_path((40, 12), goal).length == route.length
+    assert len(small._rows) <= 64 and len(small._links) <= 64 and len(small._edges) <= 128
+    world_map.close()
+    print("\nPathfinding tests passed!")
@@ -1,6 +1,7 @@
 # We need to import the map constants to understand chunk dimensions and wall tiles.
 from map import CHUNK_WIDTH, CHUNK_HEIGHT
-from ascii_art import PLAYER, WALL
+from ascii_art import PLAYER
+from tiles import Tile, WALKABLE
 
 class Player:
     """
@@ -36,45 +37,74 @@ class Player:
         new_x = self.x + dx
         new_y = self.y + dy
 
+        if not world_map.borders:
+            self._move_seamless(new_x, new_y, world_map)
+            return
+
         # Check for chunk transitions first.
         # This ensures the player wraps to a new chunk before checking for
         # collisions in the current one.
+        old_chunk = (self.chunk_x, self.chunk_y)
         if new_x < 0:
             self.chunk_x -= 1
             self.x = CHUNK_WIDTH - 2  # Appear on the right side of the new chunk
-            return
         elif new_x >= CHUNK_WIDTH:
             self.chunk_x += 1
             self.x = 1  # Appear on the left side of the new chunk
-            return
-
-        if new_y < 0:
+        elif new_y < 0:
             self.chunk_y -= 1
             self.y = CHUNK_HEIGHT - 2  # Appear on the bottom side
-            return
         elif new_y >= CHUNK_HEIGHT:
             self.chunk_y += 1
             self.y = 1  # Appear on the top side
+
+        if (self.chunk_x, self.chunk_y) != old_chunk:
+            # We changed chunks; start building the chunks around the new one.
+            world_map.set_focus(self.chunk_x, self.chunk_y, owner=self)
             return
 
         # If not transitioning, check for collisions within the current chunk.
         # Get the current chunk data from the world map.
         current_chunk_data = world_map.get_chunk(self.chunk_x, self.chunk_y)
 
-        # Check if the destination tile is a wall.
-        if current_chunk_data[new_y][new_x] != WALL:
+        # Check if the destination tile can be walked on.
+        global_x = self.chunk_x * CHUNK_WIDTH + new_x
+        global_y = self.chunk_y * CHUNK_HEIGHT + new_y
+        if WALKABLE[current_chunk_data[new_y, new_x]] and not world_map.entities.blocks(global_x, global_y):
             # If it's not a wall, update the player's position.
             self.x = new_x
             self.y = new_y
 
+    def _move_seamless(self, new_x, new_y, world_map):
+        """
+        Moves through a borderless world, where stepping off a chunk's edge
+        lands on the neighbouring tile of the next chunk.
+        """
+        chunk_x = self.chunk_x + new_x // CHUNK_WIDTH
+        chunk_y = self.chunk_y + new_y // CHUNK_HEIGHT
+        new_x %= CHUNK_WIDTH
+        new_y %= CHUNK_HEIGHT
+
+        if not WALKABLE[world_map.get_chunk(chunk_x, chunk_y)[new_y, new_x]]:
+            return
+        if world_map.entities.blocks(chunk_x * CHUNK_WIDTH + new_x, chunk_y * CHUNK_HEIGHT + new_y):
+            return
+
+        self.x, self.y = new_x, new_y
+        if (chunk_x, chunk_y) != (self.chunk_x, self.chunk_y):
+            self.chunk_x, self.chunk_y = chunk_x, chunk_y
+            # We changed chunks; start building the chunks around the new one.
+            world_map.set_focus(chunk_x, chunk_y, owner=self)
+
 # This block allows for testing the player movement logic independently.
 if __name__ == '__main__':
     from map import Map
 
     print("--- Testing Player Movement ---")
 
-    # Setup a mock world and a player.
-    test_map = Map()
+    # Setup a mock world and a player. The seed is fixed so that no
+    # structure happens to stand in the test's way.
+    test_map = Map(seed=123)
     player = Player(start_x=5, start_y=5)
 
     print(f"Initial Position: Chunk({player.chunk_x}, {player.chunk_y}), Coords({player.x}, {player.y})")
@@ -86,7 +116,7 @@ if __name__ == '__main__':
 
     # --- Test 2: Collision with a wall ---
     # The player is at (6, 5). We will place a wall at (7, 5) to block the next move.
-    test_map.get_chunk(0, 0)[5][7] = WALL
+    test_map.set_tile(0, 0, 7, 5, Tile.WALL)
     print("Placed a wall at (7, 5).")
 
     player.move(1, 0, test_map) # Try to move right from (6, 5) into the wall at (7, 5)
@@ -100,4 +130,22 @@ if __name__ == '__main__':
     print(f"Moved right across border. New Position: Chunk({player.chunk_x}, {player.chunk_y}), Coords({player.x}, {player.y})")
     assert player.chunk_x == 1 and player.x == 1
 
+    # --- Test 4: Seamless movement in a borderless world ---
+    open_map = Map(seed=123, borders=False)
+    player = Player(start_x=CHUNK_WIDTH - 1, start_y=0)
+    player.move(1, 0, open_map)
+    assert (player.chunk_x, player.x) == (1, 0)
+    player.move(0, -1, open_map)
+    print(f"Walked across two borderless edges. New Position: Chunk({player.chunk_x}, {player.chunk_y}), Coords({player.x}, {player.y})")
+    assert (player.chunk_y, player.y) == (-1, CHUNK_HEIGHT - 1)
+
+    # --- Test 5: Structures block the player like walls do ---
+    from entities import Entity
+    from ascii_art import BUILDINGS
+    player = Player(start_x=10, start_y=10, start_chunk_x=1, start_chunk_y=-1)
+    open_map.entities.spatial.add(Entity("shop", CHUNK_WIDTH + 11, -CHUNK_HEIGHT + 9, BUILDINGS["shop"]))
+    player.move(1, 0, open_map)
+    print(f"Tried to walk into a shop. New Position: Coords({player.x}, {player.y})")
+    assert player.x == 10
+
     print("\nPlayer movement tests passed!")
\ No newline at end of file
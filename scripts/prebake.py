@@ -0,0 +1,155 @@
+"""
+Pre-bakes a rectangle of chunks into the on-disk chunk store.
+
+Chunks are generated in blocks on a process pool and written to the same
+store the game pages chunks in from, so a pre-baked world starts without
+generating anything. Set "world_seed" in data/settings.json to the baked
+seed to play it. Every run prints a content hash of the baked chunks;
+--verify also bakes the region serially and checks the hashes match:
+
+    python scripts/prebake.py --seed 123 --width 64 --height 64 --workers 8
+    python scripts/prebake.py --seed 123 --width 16 --height 16 --verify
+"""
+import argparse
+import hashlib
+import multiprocessing
+import os
+import struct
+import sys
+import time
+
+from chunk_store import ChunkStore, encode_chunk
+from terrain import generate_chunks
+
+# Where the game keeps its chunk stores (see game.WORLD_STORE_DIR).
+DEFAULT_STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "worlds")
+
+# Chunks per side of one unit of work. Larger blocks share more of the
+# noise evaluation; 4x4 is past the point of diminishing returns.
+BLOCK_SIZE = 4
+
+
+def block_tasks(seed, chunk_x, chunk_y, width, height, borders):
+    """
+    Splits a rectangle of chunks into block-sized work items, in row-major
+    order so the results always come back in the same order.
+    """
+    for block_y in range(chunk_y, chunk_y + height, BLOCK_SIZE):
+        for block_x in range(chunk_x, chunk_x + width, BLOCK_SIZE):
+            yield (seed, block_x, block_y,
+                   min(BLOCK_SIZE, chunk_x + width - block_x),
+                   min(BLOCK_SIZE, chunk_y + height - block_y),
+                   borders)
+
+
+def bake_block(task):
+    """
+    Generates one work item. Runs in the worker processes.
+
+    Returns:
+        list: ((chunk_x, chunk_y), record) pairs in row-major order.
+    """
+    seed, block_x, block_y, columns, rows, borders = task
+    chunks = generate_chunks(seed, block_x, block_y, columns, rows, borders=borders)
+    return [(key, encode_chunk(chunks[key])) for key in sorted(chunks, key=lambda k: (k[1], k[0]))]
+
+
+def bake(seed, chunk_x, chunk_y, width, height, workers=None, borders=False, store=None):
+    """
+    Generates a rectangle of chunks and hashes them, optionally saving them
+    to a ChunkStore as they arrive.
+
+    Args:
+        seed (int): The world seed.
+        chunk_x (int): The x-coordinate of the top-left chunk.
+        chunk_y (int): The y-coordinate of the top-left chunk.
+        width (int): Number of chunks across.
+        height (int): Number of chunks down.
+        workers (int, optional): Worker processes. 0 generates in this
+                                 process; None uses one per CPU.
+        borders (bool): Generate chunks with border walls.
+        store (ChunkStore, optional): Where to save the chunks.
+
+    Returns:
+        tuple: (sha256 hex digest of the chunks, number of chunks).
+    """
+    digest = hashlib.sha256()
+    count = 0
+    tasks = block_tasks(seed, chunk_x, chunk_y, width, height, borders)
+
+    def consume(results):
+        nonlocal count
+        for block in results:
+            for (x, y), record in block:
+                # The coordinates are part of the hash, so the same tiles in
+                # the wrong place don't match.
+                digest.update(struct.pack("<qq", x, y))
+                digest.update(record)
+                if store is not None:
+                    store.save_record(x, y, record)
+                count += 1
+
+    if workers == 0:
+        consume(map(bake_block, tasks))
+    else:
+        with multiprocessing.Pool(processes=workers) as pool:
+            # imap keeps the task order, so the hash does not depend on
+            # which worker finishes first.
+            consume(pool.imap(bake_block, tasks, chunksize=4))
+    return digest.hexdigest(), count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seed", type=int, required=True, help="world seed to bake")
+    parser.add_argument("--x", type=int, default=None,
+                        help="left chunk (default: centred on the start chunk)")
+    parser.add_argument("--y", type=int, default=None,
+                        help="top chunk (default: centred on the start chunk)")
+    parser.add_argument("--width", type=int, default=32, help="chunks across")
+    parser.add_argument("--height", type=int, default=32, help="chunks down")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes (default: one per CPU, 0 for none)")
+    parser.add_argument("--borders", action="store_true",
+                        help="bake a bordered world instead of the game's borderless one")
+    parser.add_argument("--store-dir", default=DEFAULT_STORE_DIR, help="chunk store directory")
+    parser.add_argument("--no-store", action="store_true", help="only generate and hash the chunks")
+    parser.add_argument("--verify", action="store_true",
+                        help="also bake serially and check the content hashes match")
+    args = parser.parse_args(argv)
+
+    chunk_x = -(args.width // 2) if args.x is None else args.x
+    chunk_y = -(args.height // 2) if args.y is None else args.y
+    region = (args.seed, chunk_x, chunk_y, args.width, args.height)
+
+    store = None
+    if not args.no_store:
+        store = ChunkStore(args.store_dir, args.seed, borders=args.borders)
+
+    workers = args.workers if args.workers is not None else os.cpu_count()
+    print(f"Baking {args.width}x{args.height} chunks from ({chunk_x}, {chunk_y}) "
+          f"for seed {args.seed} with {workers} worker(s)...", flush=True)
+    start = time.perf_counter()
+    digest, count = bake(*region, workers=workers, borders=args.borders, store=store)
+    if store is not None:
+        store.close()
+    elapsed = time.perf_counter() - start
+    print(f"  {count} chunks in {elapsed:.2f}s ({count / elapsed:.0f} chunks/s)")
+    print(f"  sha256 {digest}")
+    if store is not None:
+        print(f"  Written to {os.path.abspath(store.path)}")
+
+    if args.verify:
+        start = time.perf_counter()
+        serial_digest, _ = bake(*region, workers=0, borders=args.borders)
+        elapsed = time.perf_counter() - start
+        print(f"  Serial:  {count / elapsed:.0f} chunks/s, sha256 {serial_digest}")
+        if serial_digest != digest:
+            print("Parallel and serial output differ!")
+            return 1
+        print("Parallel and serial output are identical.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, CancelledError
+
+
+class ChunkPrefetcher:
+    """
+    Generates the ring of chunks around the player on a background thread
+    pool, so crossing into a neighbouring chunk finds it already built.
+    """
+
+    def __init__(self, generate, radius=1, workers=2):
+        """
+        Args:
+            generate (callable): Function of (chunk_x, chunk_y) returning a chunk.
+            radius (int): How many chunks around the centre to keep generated.
+            workers (int): Number of background worker threads.
+        """
+        self._generate = generate
+        self.radius = radius
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix="chunk-prefetch")
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._center = None
+
+        # Counters for tuning the radius.
+        self.hits = 0        # Chunk was already finished when asked for.
+        self.waits = 0       # Chunk was still in flight; we waited for it.
+        self.misses = 0      # Chunk was never scheduled.
+        self.cancelled = 0   # Stale jobs cancelled before they started.
+
+    def ring(self, chunk_x, chunk_y):
+        """Returns the chunk coordinates within `radius` of a centre chunk."""
+        return [
+            (chunk_x + dx, chunk_y + dy)
+            for dy in range(-self.radius, self.radius + 1)
+            for dx in range(-self.radius, self.radius + 1)
+            if (dx, dy) != (0, 0)
+        ]
+
+    def update(self, chunk_x, chunk_y, loaded):
+        """
+        Re-centres the ring. Jobs that fell outside it are cancelled, and new
+        jobs are queued with the chunks in the direction of travel first.
+
+        Args:
+            chunk_x (int): The centre chunk's x-coordinate.
+            chunk_y (int): The centre chunk's y-coordinate.
+            loaded (container): Chunk coordinates that need no generation.
+        """
+        wanted = self.ring(chunk_x, chunk_y)
+        if self._center is not None:
+            dir_x = chunk_x - self._center[0]
+            dir_y = chunk_y - self._center[1]
+            wanted.sort(key=lambda key: -((key[0] - chunk_x) * dir_x + (key[1] - chunk_y) * dir_y))
+        self._center = (chunk_x, chunk_y)
+
+        # Finished chunks just outside the ring are kept, as the player is
+        # likely to turn back; anything further away is dropped.
+        keep_radius = self.radius + 1
+        with self._lock:
+            for key in list(self._futures):
+                if max(abs(key[0] - chunk_x), abs(key[1] - chunk_y)) <= self.radius:
+                    continue
+                future = self._futures[key]
+                if future.done() and max(abs(key[0] - chunk_x), abs(key[1] - chunk_y)) <= keep_radius:
+                    continue
+                if future.cancel():
+                    self.cancelled += 1
+                del self._futures[key]
+
+            for key in wanted:
+                if key not in loaded and key not in self._futures:
+                    self._futures[key] = self._executor.submit(self._generate, *key)
+
+    def take(self, chunk_x, chunk_y):
+        """
+        Hands over a prefetched chunk, waiting for it if it is in flight.
+
+        Returns:
+            The chunk, or None if it was never scheduled (a miss).
+        """
+        with self._lock:
+            future = self._futures.pop((chunk_x, chunk_y), None)
+
+        if future is not None:
+            if future.done():
+                self.hits += 1
+            else:
+                self.waits += 1
+            try:
+                return future.result()
+            except CancelledError:
+                pass
+
+        self.misses += 1
+        return None
+
+    def in_flight(self):
+        """Returns the number of jobs queued or running."""
+        with self._lock:
+            return sum(1 for future in self._futures.values() if not future.done())
+
+    def stats(self):
+        """Returns the counters as a dictionary."""
+        return {
+            "radius": self.radius,
+            "hits": self.hits,
+            "waits": self.waits,
+            "misses": self.misses,
+            "cancelled": self.cancelled,
+            "in_flight": self.in_flight(),
+        }
+
+    def shutdown(self):
+        """Cancels outstanding jobs and stops the worker threads."""
+        with self._lock:
+            for future in self._futures.values():
+                future.cancel()
+            self._futures.clear()
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,146 @@
+import base64
+import json
+import os
+import time
+import zlib
+
+from savegame import snapshot, to_json, encode_delta, decode_deltas, record_delta
+
+# A recording is a JSON Lines file, replayed exactly by replay.py. The first
+# line describes the session, including the game it started from (a save
+# game snapshot); every other line is one event, [seconds since start, kind,
+# *args]:
+#
+#     key    text, code, name   A key applied to the game.
+#     seed   seed               The world seed a restart switched to.
+#     step   -                  One step of travel or auto-explore.
+#     tick   -                  One simulation tick of the entities.
+#     size   width, height      The terminal was resized.
+#     sim    step, changes      A step of the world simulation was applied;
+#                               changes are the tiles it changed, as a
+#                               base64, zlib-compressed delta log (see
+#                               savegame.encode_delta).
+#     frame  x, y               A frame was drawn; (x, y) is the player's
+#                               global tile, used to check a replay.
+FORMAT_VERSION = 1
+
+
+class SessionRecorder:
+    """
+    Appends a session's events to a recording. A recorder without a path
+    is disabled and every call is a no-op.
+    """
+
+    def __init__(self, path=None):
+        """
+        Args:
+            path (str, optional): The recording file to write.
+        """
+        self.path = path
+        self._file = None
+        self._start = 0.0
+        self._world = None
+
+    @property
+    def enabled(self):
+        return self._file is not None
+
+    def start(self, state, width, height):
+        """Opens the recording and writes the session header."""
+        if self.path is None:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._file = open(self.path, "w", encoding="utf-8")
+        self._start = time.perf_counter()
+        self._world = state.world_map
+        header = {
+            "version": FORMAT_VERSION,
+            "seed": self._world.seed,
+            "width": width,
+            "height": height,
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "saved": to_json(snapshot(state, full=True)),
+        }
+        self._file.write(json.dumps(header) + "\n")
+
+    def _write(self, *event):
+        line = [round(time.perf_counter() - self._start, 6), *event]
+        self._file.write(json.dumps(line) + "\n")
+
+    def key(self, state, key):
+        """Records a key after it was applied to `state`."""
+        if self._file is None:
+            return
+        self._write("key", str(key), key.code, key.name)
+        if state.world_map is not self._world:
+            # The key restarted the game in a new world.
+            self._world = state.world_map
+            self._write("seed", self._world.seed)
+
+    def step(self):
+        if self._file is not None:
+            self._write("step")
+
+    def tick(self):
+        if self._file is not None:
+            self._write("tick")
+
+    def size(self, width, height):
+        if self._file is not None:
+            self._write("size", width, height)
+
+    def sim(self, step, applied):
+        """
+        Records a step of the world simulation.
+
+        Args:
+            step (int): The number of steps applied so far.
+            applied (list): (key, indices, tiles) of the tiles it changed.
+        """
+        if self._file is not None:
+            self._write("sim", step, encode_changes(applied))
+
+    def frame(self, state):
+        if self._file is not None:
+            self._write("frame", *state.player_tile())
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def load_recording(path):
+    """
+    Reads a recording.
+
+    Returns:
+        tuple: (header dict, list of events).
+    """
+    with open(path, "r", encoding="utf-8") as fh:
+        header = json.loads(fh.readline())
+        if header.get("version") != FORMAT_VERSION:
+            raise ValueError(f"{path}: unsupported recording version {header.get('version')}")
+        events = [json.loads(line) for line in fh if line.strip()]
+    return header, events
+
+
+def encode_changes(applied):
+    """Packs a simulation step's (key, indices, tiles) changes into a string."""
+    log = b"".join(encode_delta(key, dict(zip(indices.tolist(), tiles.tolist())))
+                   for key, indices, tiles in applied)
+    return base64.b64encode(zlib.compress(log)).decode("ascii")
+
+
+def decode_changes(text):
+    """Unpacks encode_changes' string into {(chunk_x, chunk_y): {index: tile}}."""
+    log = zlib.decompress(base64.b64decode(text))
+    return {key: record_delta(record) for key, record in decode_deltas(log).items()}
+
+
+def keystroke(text, code, name):
+    """Rebuilds the blessed Keystroke a key event was recorded from."""
+    from blessed.keyboard import Keystroke
+    if name is None:
+        return Keystroke(text)
+    return Keystroke(text, code=code, name=name)
@@ -1,156 +1,493 @@
-import blessed
+import numpy as np
+
+from terrain import (CHUNK_WIDTH, CHUNK_HEIGHT, OVERVIEW_WIDTH, OVERVIEW_HEIGHT,
+                     OVERVIEW_CELL_WIDTH, OVERVIEW_CELL_HEIGHT)
+from tiles import glyph_row
+from framebuffer import FrameBuffer, STYLE_NORMAL, STYLE_BOLD, STYLE_STATUS, STYLE_DIM
+from encoder import OutputEncoder
+from fov import FieldOfView
+
+# Changed spans fewer than this many unchanged cells apart are merged, so
+# gaps of up to 3 cells are always re-sent: no relative cursor move
+# ("ESC [ n C") is shorter than 4 bytes.
+SEND_GAP = 4
+
+# Zoom levels of the world map: (cell width, cell height, chunks per cell
+# side). The block sizes above 1 must be ones tracked by ExploredIndex.
+MAP_ZOOM_LEVELS = [
+    (4, 2, 1),
+    (1, 1, 1),
+    (1, 1, 4),
+    (1, 1, 16),
+]
 
 class Renderer:
     """
     Handles all rendering tasks for the game, drawing the map, player,
     and UI elements to the terminal.
+
+    Every view is composed into a back buffer and compared with the frame
+    already on screen, so only the cells that changed are sent, encoded in
+    as few bytes as possible by an OutputEncoder. The screen is only
+    cleared and fully repainted when the terminal is resized or the view
+    changes.
+
+    With a sight radius the game view has fog of war: tiles the player has
+    never seen are blank, remembered ones out of sight are dimmed, and
+    entities only show within sight.
     """
 
-    def __init__(self, term: blessed.Terminal):
+    def __init__(self, term: "blessed.Terminal", camera=False, byte_budget=None, sight_radius=None):
         """
         Initializes the renderer with a blessed.Terminal instance.
 
         Args:
             term (blessed.Terminal): The blessed terminal object.
+            camera (bool): Follow the player with a scrolling camera that
+                           fills the terminal, instead of showing one chunk.
+            byte_budget (int, optional): Bytes per second the terminal's link
+                           can take, e.g. over a slow SSH or serial line.
+                           Frames beyond it are dropped in favour of later
+                           ones. None sends every frame.
+            sight_radius (int, optional): How far the player can see, in
+                           tiles. None (or 0) shows the whole view.
         """
         self.term = term
+        self.camera = camera
+        # Glyph strings for every row of recently drawn chunks, keyed by
+        # chunk coordinates, as (chunk version, rows).
+        self._row_cache = {}
+        self.front = None  # The frame currently on screen.
+        self.view = None   # The view that frame belongs to.
+        self._map_cache = None  # (cache key, composed map frame, status line)
+        self.hud = None  # Optional callable returning a performance HUD line.
+        self.encoder = OutputEncoder(term, byte_budget)
+        self.pending = None  # (frame, view) held back by the byte budget.
+        self.sight_radius = sight_radius
+        self.fov = None  # FieldOfView of the map being drawn.
+
+    def invalidate(self):
+        """Forces the next frame to be a full repaint."""
+        self.front = None
+
+    def _new_frame(self):
+        return FrameBuffer(self.term.width, self.term.height)
+
+    def _put_status(self, frame, ui_text):
+        """
+        Draws a UI line at the bottom of the screen, with the performance
+        HUD line above it when one is enabled.
+        """
+        lines = [ui_text]
+        if self.hud is not None:
+            lines.insert(0, self.hud())
+        for i, text in enumerate(reversed(lines)):
+            # Ensure text doesn't wrap
+            if len(text) >= frame.width:
+                text = text[:frame.width - 1]
+            frame.put(0, frame.height - 1 - i, text, STYLE_STATUS)
+
+    def _present(self, frame, view):
+        """
+        Sends a composed frame to the terminal, writing only the cells that
+        differ from the frame on screen.
+
+        Args:
+            frame (FrameBuffer): The newly composed frame.
+            view (str): Name of the view the frame shows.
+        """
+        if not self.encoder.ready():
+            # The link is still busy with earlier frames. Keep only the
+            # newest frame, and send it once the link has caught up (see
+            # flush_pending), diffed against what is really on screen.
+            if self.pending is not None:
+                self.encoder.dropped += 1
+            self.pending = (frame, view)
+            return
+        self.pending = None
+
+        front = self.front
+        clear = front is None or view != self.view or (front.width, front.height) != (frame.width, frame.height)
+        # Gaps shorter than the shortest cursor move are always re-sent; for
+        # longer ones the encoder weighs the cells against the moves.
+        spans = frame.all_spans(SEND_GAP) if clear else frame.changed_spans(front, SEND_GAP)
+        output = self.encoder.encode(frame, spans, clear)
+
+        self.front = frame
+        self.view = view
+        if output:
+            self.encoder.send(output)
+
+    def flush_pending(self):
+        """
+        Sends the frame held back by the byte budget, if the link has caught
+        up.
+
+        Returns:
+            bool: True if a frame was sent.
+        """
+        if self.pending is None or not self.encoder.ready():
+            return False
+        self._present(*self.pending)
+        return True
 
     def draw(self, player, world_map):
         """
         Draws the entire game state to the screen.
 
-        This method should be called on every frame of the game loop. It clears
-        the screen, draws the current map chunk, the player, and any UI.
+        This method should be called on every frame of the game loop. It
+        composes the current map chunk, the player, and any UI, and sends
+        whatever changed since the last frame.
 
         Args:
             player (Player): The player object.
             world_map (Map): The world map object.
         """
-        # It's often faster to build a single large string and print it once
-        # rather than making many small print calls.
-        output = self.term.home + self.term.clear
-
-        # Get the current map chunk that the player is in.
-        chunk_data = world_map.get_chunk(player.chunk_x, player.chunk_y)
-
-        # Draw the map chunk.
-        for y, row in enumerate(chunk_data):
-            output += self.term.move_xy(0, y) + "".join(row)
-
-        # Draw the player on top of the map.
-        output += self.term.move_xy(player.x, player.y) + self.term.bold(player.symbol)
+        frame = self._new_frame()
+
+        if self.camera:
+            self._draw_camera(frame, player, world_map)
+        else:
+            # Get the current map chunk that the player is in.
+            chunk_data = world_map.get_chunk(player.chunk_x, player.chunk_y)
+
+            # Draw the map chunk. Each row is a zero-copy view of the chunk's
+            # tile array, translated to glyphs in one call.
+            for y, row in enumerate(chunk_data):
+                frame.put(0, y, glyph_row(row))
+            left, top = player.chunk_x * CHUNK_WIDTH, player.chunk_y * CHUNK_HEIGHT
+            visible = self._apply_fog(frame, world_map, left + player.x, top + player.y,
+                                      left, top, min(frame.width, CHUNK_WIDTH),
+                                      min(frame.height - 1, CHUNK_HEIGHT))
+            self._put_entities(frame, world_map, [(player.chunk_x, player.chunk_y)], left, top, visible)
+
+            # Draw the player on top of the map.
+            frame.put(player.x, player.y, player.symbol, STYLE_BOLD)
 
         # Draw a simple UI with debug information.
         # We'll draw it at the bottom of the screen.
-        height, width = self.term.height, self.term.width
         ui_text = f"Coords: ({player.x}, {player.y}) | Chunk: ({player.chunk_x}, {player.chunk_y}) | Press 'q' to quit"
-        # Ensure text doesn't wrap
-        if len(ui_text) >= width:
-            ui_text = ui_text[:width -1]
+        self._put_status(frame, ui_text)
+
+        self._present(frame, "game")
+
+    def _chunk_rows(self, world_map, chunk_x, chunk_y, used):
+        """
+        Returns the glyph strings of a chunk's rows, reusing the ones built
+        for earlier frames unless the chunk has changed since.
+        """
+        key = (chunk_x, chunk_y)
+        entry = used.get(key)
+        if entry is None:
+            chunk = world_map.get_chunk(chunk_x, chunk_y)
+            version = world_map.chunk_version(chunk_x, chunk_y)
+            entry = self._row_cache.get(key)
+            if entry is None or entry[0] != version:
+                entry = (version, [glyph_row(row) for row in chunk])
+            used[key] = entry
+        return entry[1]
+
+    def _draw_camera(self, frame, player, world_map):
+        """
+        Composes the screen from every chunk the view overlaps, centred on
+        the player. Rows are sliced out of cached glyph strings, so
+        scrolling by a tile only re-joins strings.
+        """
+        view_height = frame.height - 1  # Leave room for the status line.
+        player_gx = player.chunk_x * CHUNK_WIDTH + player.x
+        player_gy = player.chunk_y * CHUNK_HEIGHT + player.y
+        left = player_gx - frame.width // 2
+        top = player_gy - view_height // 2
+        right = left + frame.width
+
+        used = {}
+        for screen_y in range(view_height):
+            chunk_y, row = divmod(top + screen_y, CHUNK_HEIGHT)
+            parts = []
+            global_x = left
+            while global_x < right:
+                chunk_x, column = divmod(global_x, CHUNK_WIDTH)
+                width = min(CHUNK_WIDTH - column, right - global_x)
+                parts.append(self._chunk_rows(world_map, chunk_x, chunk_y, used)[row][column:column + width])
+                global_x += width
+            frame.put(0, screen_y, "".join(parts))
+        # Only chunks still in view stay cached.
+        self._row_cache = used
+        visible = self._apply_fog(frame, world_map, player_gx, player_gy, left, top, frame.width, view_height)
+        self._put_entities(frame, world_map, used, left, top, visible)
 
-        output += self.term.move_xy(0, height - 1) + self.term.on_black(ui_text)
+        # Draw the player on top of the map.
+        frame.put(player_gx - left, player_gy - top, player.symbol, STYLE_BOLD)
 
-        # Print the composed frame to the screen.
-        print(output, end='', flush=True)
+    def _apply_fog(self, frame, world_map, player_gx, player_gy, left, top, width, height):
+        """
+        Applies the fog of war to the map area of a frame, whose top-left
+        cell shows the global tile (left, top): tiles never seen are
+        blanked and those out of sight are dimmed.
 
-    def draw_map_screen(self, player, world_map):
+        Returns:
+            np.ndarray: `height` x `width` bools, True where a tile is in
+                        sight, or None when there is no fog.
         """
-        Draws a high-level map showing visited chunks.
+        if not self.sight_radius:
+            return None
+        if self.fov is None or self.fov.world_map is not world_map:
+            self.fov = FieldOfView(world_map, self.sight_radius)
+        window = self.fov.compute(player_gx, player_gy)
+
+        # The part of the field of view that lands in the area.
+        radius = self.fov.radius
+        window_left, window_top = player_gx - radius, player_gy - radius
+        visible = np.zeros((height, width), dtype=bool)
+        x0, x1 = max(left, window_left), min(left + width, window_left + window.shape[1])
+        y0, y1 = max(top, window_top), min(top + height, window_top + window.shape[0])
+        if x0 < x1 and y0 < y1:
+            visible[y0 - top:y1 - top, x0 - left:x1 - left] = \
+                window[y0 - window_top:y1 - window_top, x0 - window_left:x1 - window_left]
+        seen = world_map.seen_area(left, top, width, height)
+
+        # The area is still nothing but terrain glyphs, so it is edited as
+        # one array of bytes.
+        glyphs = np.frombuffer("".join(row[:width] for row in frame.rows[:height]).encode("ascii"),
+                               dtype=np.uint8).reshape(height, width).copy()
+        glyphs[~seen] = ord(" ")
+        styles = np.where(seen & ~visible & (glyphs != ord(" ")), STYLE_DIM, STYLE_NORMAL).astype(np.uint8)
+        for y in range(height):
+            frame.rows[y] = glyphs[y].tobytes().decode("ascii") + frame.rows[y][width:]
+            frame.styles[y][:width] = styles[y].tobytes()
+        return visible
+
+    def _put_entities(self, frame, world_map, chunks, left, top, visible=None):
         """
-        output = self.term.home + self.term.clear
+        Draws the entities of the given chunks over the terrain, with the
+        global cell (left, top) at the top-left of the screen. With a
+        `visible` mask only the ones in sight are drawn.
+        """
+        view_height = frame.height - 1
+        for chunk_x, chunk_y in chunks:
+            for (x, y), (_, glyph) in world_map.entities.spatial.in_chunk(chunk_x, chunk_y).items():
+                if not 0 <= y - top < view_height:
+                    continue
+                if visible is not None and not (0 <= x - left < visible.shape[1] and
+                                                0 <= y - top < visible.shape[0] and visible[y - top, x - left]):
+                    continue
+                frame.put(x - left, y - top, glyph)
+
+    def draw_map_screen(self, player, world_map, pan=(0, 0), zoom=0, terrain=False):
+        """
+        Draws a high-level map showing visited chunks, or the terrain itself
+        at low resolution.
+
+        Only the part of the explored world that fits on the terminal is
+        drawn, so the cost depends on the screen size rather than on how
+        much has been explored. The composed map is reused until new chunks
+        are explored or the view changes; the status line and HUD are drawn
+        over it afresh every time.
 
-        visited_chunks = list(world_map.chunks.keys())
-        if not visited_chunks:
+        Args:
+            player (Player): The player object.
+            world_map (Map): The world map object.
+            pan (tuple): Offset of the view centre, in chunks.
+            zoom (int): Index into MAP_ZOOM_LEVELS.
+            terrain (bool): Show the terrain overview instead of the explored
+                            chunks. Zoom does not apply to it.
+        """
+        # Explored chunks are tracked separately from the chunk cache, so
+        # chunks evicted from memory still show up here.
+        explored = world_map.explored
+        if terrain:
+            cache_key = ("terrain", player.chunk_x, player.chunk_y, player.x, player.y, pan,
+                         self.term.width, self.term.height)
+        else:
+            cache_key = (explored.version, player.chunk_x, player.chunk_y, pan, zoom,
+                         self.term.width, self.term.height)
+        if self._map_cache is not None and self._map_cache[0] == cache_key:
+            self._present_map(*self._map_cache[1:])
+            return
+
+        frame = self._new_frame()
+        if terrain:
+            status = self._draw_terrain_map(frame, player, world_map, pan)
+            self._map_cache = (cache_key, frame, status)
+            self._present_map(frame, status)
+            return
+
+        if not explored:
             text = "You haven't explored yet. Press 'm' to return."
-            x = (self.term.width - len(text)) // 2
-            y = self.term.height // 2
-            output += self.term.move_xy(x, y) + text
-            print(output, end='', flush=True)
+            x = (frame.width - len(text)) // 2
+            y = frame.height // 2
+            frame.put(x, y, text)
+            self._present(frame, "map")
             return
 
-        # Determine the boundaries of the map to draw
-        min_x = min(cx for cx, cy in visited_chunks)
-        max_x = max(cx for cx, cy in visited_chunks)
-        min_y = min(cy for cx, cy in visited_chunks)
-        max_y = max(cy for cx, cy in visited_chunks)
-
-        # Center the map display on the screen
-        map_render_width = (max_x - min_x + 1) * 4
-        map_render_height = (max_y - min_y + 1) * 2
-        offset_x = (self.term.width - map_render_width) // 2
-        offset_y = (self.term.height - map_render_height) // 2
-
-        # Draw each visited chunk
-        for r_y, chunk_y in enumerate(range(min_y, max_y + 1)):
-            for r_x, chunk_x in enumerate(range(min_x, max_x + 1)):
-                if (chunk_x, chunk_y) in visited_chunks:
-                    screen_x = offset_x + r_x * 4
-                    screen_y = offset_y + r_y * 2
-
-                    symbol = '[ ]'
-                    if (chunk_x, chunk_y) == (0, 0): # Start chunk
-                        symbol = '[S]'
-                    if (chunk_x, chunk_y) == (player.chunk_x, player.chunk_y): # Current chunk
-                        symbol = self.term.bold('[X]')
-
-                    output += self.term.move_xy(screen_x, screen_y) + symbol
+        cell_width, cell_height, block = MAP_ZOOM_LEVELS[zoom]
+        view_height = frame.height - 1  # Leave room for the status line.
+        player_x, player_y = player.chunk_x // block, player.chunk_y // block
+
+        # Anchor one block to a screen position. If everything explored fits
+        # on screen it is centred as a whole; otherwise the view follows the
+        # player. Panning moves the anchor.
+        min_x, max_x = explored.min_x // block, explored.max_x // block
+        min_y, max_y = explored.min_y // block, explored.max_y // block
+        map_render_width = (max_x - min_x + 1) * cell_width
+        map_render_height = (max_y - min_y + 1) * cell_height
+        if map_render_width <= frame.width and map_render_height <= view_height:
+            anchor_x, screen_anchor_x = min_x, (frame.width - map_render_width) // 2
+            anchor_y, screen_anchor_y = min_y, (view_height - map_render_height) // 2
+        else:
+            anchor_x, screen_anchor_x = player_x, (frame.width - cell_width) // 2
+            anchor_y, screen_anchor_y = player_y, (view_height - cell_height) // 2
+        anchor_x += pan[0] // block
+        anchor_y += pan[1] // block
+
+        # The range of blocks that lands on screen.
+        first_x = anchor_x - screen_anchor_x // cell_width - 1
+        last_x = anchor_x + (frame.width - screen_anchor_x) // cell_width + 1
+        first_y = anchor_y - screen_anchor_y // cell_height - 1
+        last_y = anchor_y + (view_height - screen_anchor_y) // cell_height + 1
+
+        # Each screen row is built as a list of characters and written once;
+        # the current chunk is drawn over it afterwards in bold.
+        current = None
+        for block_y in range(first_y, last_y + 1):
+            screen_y = screen_anchor_y + (block_y - anchor_y) * cell_height
+            if screen_y < -1 or screen_y >= view_height:
+                continue
+            line = [' '] * (frame.width + cell_width)
+            links = [' '] * (frame.width + cell_width)
+            for block_x in range(first_x, last_x + 1):
+                screen_x = screen_anchor_x + (block_x - anchor_x) * cell_width
+                if screen_x < 0 or screen_x >= frame.width:
+                    continue
+                if not explored.contains_block(block_x, block_y, block):
+                    continue
+
+                if cell_width > 1:
+                    line[screen_x:screen_x + 3] = '[ ]'
+                    if (block_x, block_y) == (0, 0): # Start chunk
+                        line[screen_x + 1] = 'S'
 
                     # Draw connections to adjacent visited chunks
-                    if (chunk_x + 1, chunk_y) in visited_chunks:
-                        output += self.term.move_xy(screen_x + 3, screen_y) + "-"
-                    if (chunk_x, chunk_y + 1) in visited_chunks:
-                        output += self.term.move_xy(screen_x + 1, screen_y + 1) + '|'
+                    if explored.contains_block(block_x + 1, block_y, block):
+                        line[screen_x + 3] = '-'
+                    if explored.contains_block(block_x, block_y + 1, block):
+                        links[screen_x + 1] = '|'
+                else:
+                    line[screen_x] = 'S' if (block_x, block_y) == (0, 0) else '#'
+
+                if (block_x, block_y) == (player_x, player_y): # Current chunk
+                    current = (screen_x, screen_y)
+
+            frame.put(0, screen_y, "".join(line))
+            if cell_height > 1:
+                frame.put(0, screen_y + 1, "".join(links))
+
+        if current is not None:
+            symbol = '[X]' if cell_width > 1 else 'X'
+            frame.put(current[0], current[1], symbol, STYLE_BOLD)
+
+        # Mark the chunk the map is panned to, which Enter travels to.
+        if pan != (0, 0):
+            target_x = screen_anchor_x + ((player.chunk_x + pan[0]) // block - anchor_x) * cell_width
+            target_y = screen_anchor_y + ((player.chunk_y + pan[1]) // block - anchor_y) * cell_height
+            if 0 <= target_x < frame.width and 0 <= target_y < view_height:
+                frame.put(target_x, target_y, '[+]' if cell_width > 1 else '+', STYLE_BOLD)
+
+        scale = f"1:{block}" if block > 1 else "1:1"
+        status = (f"MAP VIEW {scale} | 'S' = Start, 'X' = Current | "
+                  "Arrows pan, +/- zoom, t terrain, Enter travel to + | 'm' returns.")
+        self._map_cache = (cache_key, frame, status)
+        self._present_map(frame, status)
+
+    def _present_map(self, body, status):
+        """
+        Presents a composed map with the status line, and the HUD when it
+        is enabled, drawn over a copy of it, so the HUD stays live while
+        the map is reused.
+        """
+        frame = body.copy()
+        self._put_status(frame, status)
+        self._present(frame, "map")
 
-        # Draw UI
-        height, width = self.term.height, self.term.width
-        ui_text = "MAP VIEW | 'S' = Start, 'X' = Current | Press 'm' to return to game."
-        if len(ui_text) >= width:
-            ui_text = ui_text[:width -1]
-        output += self.term.move_xy(0, height - 1) + self.term.on_black(ui_text)
+    def _draw_terrain_map(self, frame, player, world_map, pan):
+        """
+        Composes the terrain around the player (moved by `pan` chunks) from
+        chunk overviews, one cell per OVERVIEW_CELL_WIDTH x OVERVIEW_CELL_HEIGHT
+        tiles, so a screen shows hundreds of chunks without generating them.
 
-        print(output, end='', flush=True)
+        Returns:
+            str: The status line for the view.
+        """
+        view_height = frame.height - 1  # Leave room for the status line.
+        player_x = (player.chunk_x * CHUNK_WIDTH + player.x) // OVERVIEW_CELL_WIDTH
+        player_y = (player.chunk_y * CHUNK_HEIGHT + player.y) // OVERVIEW_CELL_HEIGHT
+        left = player_x + pan[0] * OVERVIEW_WIDTH - frame.width // 2
+        top = player_y + pan[1] * OVERVIEW_HEIGHT - view_height // 2
+
+        # Fetch every overview on screen as one array.
+        first_x, first_y = left // OVERVIEW_WIDTH, top // OVERVIEW_HEIGHT
+        last_x = (left + frame.width - 1) // OVERVIEW_WIDTH
+        last_y = (top + view_height - 1) // OVERVIEW_HEIGHT
+        area = world_map.get_overview(first_x, first_y, last_x - first_x + 1, last_y - first_y + 1)
+        offset_x = left - first_x * OVERVIEW_WIDTH
+        offset_y = top - first_y * OVERVIEW_HEIGHT
+        for screen_y in range(view_height):
+            frame.put(0, screen_y, glyph_row(area[offset_y + screen_y, offset_x:offset_x + frame.width]))
+
+        if 0 <= player_x - left < frame.width and 0 <= player_y - top < view_height:
+            frame.put(player_x - left, player_y - top, 'X', STYLE_BOLD)
+
+        # Mark the middle of the chunk the map is panned to.
+        if pan != (0, 0):
+            target_x = ((player.chunk_x + pan[0]) * CHUNK_WIDTH + CHUNK_WIDTH // 2) // OVERVIEW_CELL_WIDTH
+            target_y = ((player.chunk_y + pan[1]) * CHUNK_HEIGHT + CHUNK_HEIGHT // 2) // OVERVIEW_CELL_HEIGHT
+            if 0 <= target_x - left < frame.width and 0 <= target_y - top < view_height:
+                frame.put(target_x - left, target_y - top, '+', STYLE_BOLD)
+
+        return (f"MAP VIEW terrain 1:{OVERVIEW_CELL_WIDTH}x{OVERVIEW_CELL_HEIGHT} | "
+                "'X' = You | Arrows pan, t chunks, Enter travel to + | 'm' returns.")
 
 
     def draw_keys_screen(self):
         """
         Draws a screen displaying the game's keybindings.
         """
-        output = self.term.home + self.term.clear
+        frame = self._new_frame()
 
         # Define the content to be displayed
         title = "--- KEYBINDINGS ---"
         keys = [
             " k : Toggle this Keys Screen",
             " m : Toggle World Map",
+            "     (Arrows pan, +/- zoom, c recentres, t terrain,",
+            "      Enter travels to the marked chunk)",
+            " x : Auto-explore (any key stops)",
             " r : Restart the Game",
+            " p : Toggle Performance HUD",
             " q : Quit the Game",
             "",
             " Arrow Keys : Move Player"
         ]
 
         # Center the content block on the screen
-        start_y = (self.term.height - len(keys) - 2) // 2
+        start_y = (frame.height - len(keys) - 2) // 2
 
         # Draw the title
-        title_x = (self.term.width - len(title)) // 2
-        output += self.term.move_xy(title_x, start_y) + self.term.bold(title)
+        title_x = (frame.width - len(title)) // 2
+        frame.put(title_x, start_y, title, STYLE_BOLD)
 
         # Draw each keybinding line
         for i, line in enumerate(keys):
-            line_x = (self.term.width - len(line)) // 2
-            output += self.term.move_xy(line_x, start_y + 2 + i) + line
+            line_x = (frame.width - len(line)) // 2
+            frame.put(line_x, start_y + 2 + i, line)
 
         # Draw a UI hint at the bottom
-        height, width = self.term.height, self.term.width
-        ui_text = "Press 'k' to return to the game."
-        if len(ui_text) >= width:
-            ui_text = ui_text[:width - 1]
-        output += self.term.move_xy(0, height - 1) + self.term.on_black(ui_text)
+        self._put_status(frame, "Press 'k' to return to the game.")
 
-        print(output, end='', flush=True)
+        self._present(frame, "keys")
 
 
 # This file is a module and is not intended to be run directly.
 # Its functionality will be tested by integrating it into the main game loop.
 if __name__ == '__main__':
-    print("This is the renderer module. It should be imported, not run directly.")
\ No newline at end of file
+    print("This is the renderer module. It should be imported, not run directly.")
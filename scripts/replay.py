@@ -0,0 +1,174 @@
+"""
+Replays recorded sessions through the game's own input handling.
+
+    python scripts/replay.py data/recordings/session-20261018-120000.jsonl
+    python scripts/replay.py data/recordings --timings steps.jsonl
+    python scripts/replay.py session.jsonl --realtime
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from benchmark import FakeTerminal
+from game import GameState, apply_key, render
+from renderer import Renderer
+from fov import SIGHT_RADIUS
+from recording import load_recording, keystroke, decode_changes
+from savegame import from_json
+
+# Slowest steps listed in the report.
+SLOWEST_STEPS = 5
+
+
+def replay(path, terminal=None, realtime=False, speed=1.0):
+    """
+    Plays a recording back, made with `game.py --record PATH` or with
+    "record_sessions" set in data/settings.json. It runs headless at full
+    speed by default and times every step, so a reported stutter can be
+    replayed and profiled exactly; the benchmark suite replays
+    data/recordings as a regression workload.
+
+    Args:
+        path (str): The recording.
+        terminal (optional): Where to draw. Defaults to a headless stand-in
+                             of the recorded size.
+        realtime (bool): Wait between events as long as the player did.
+        speed (float): How much faster than recorded a realtime replay runs.
+
+    Returns:
+        dict: "timings", a list of (event index, recorded time, kind,
+              seconds it took), and "diverged", the index of the first frame
+              where the player wasn't where the recording says, or None.
+    """
+    header, events = load_recording(path)
+    if terminal is None:
+        terminal = FakeTerminal(header["width"], header["height"])
+    saved = from_json(header["saved"]) if "saved" in header else None
+    state = GameState(seed=header["seed"], saved=saved)
+    state.next_seeds.extend(args[0] for _, kind, *args in events if kind == "seed")
+    renderer = Renderer(terminal, camera=True, sight_radius=SIGHT_RADIUS)
+
+    timings = []
+    diverged = None
+    start = time.perf_counter()
+    try:
+        for index, (at, kind, *args) in enumerate(events):
+            if realtime:
+                wait = start + at / speed - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+
+            began = time.perf_counter()
+            if kind == "key":
+                apply_key(state, keystroke(*args))
+            elif kind == "step":
+                if state.route is not None:
+                    state.advance_route()
+            elif kind == "tick":
+                state.tick_entities()
+            elif kind == "sim":
+                # Chunks that aren't resident in the replay get the changes
+                # when they are loaded.
+                state.world_map.load_deltas(decode_changes(args[1]))
+            elif kind == "frame":
+                render(state, renderer)
+                if diverged is None and list(state.player_tile()) != args:
+                    diverged = index
+            elif kind == "size":
+                if isinstance(terminal, FakeTerminal):
+                    terminal.width, terminal.height = args
+                continue
+            else:
+                continue
+            timings.append((index, at, kind, time.perf_counter() - began))
+    finally:
+        state.world_map.close()
+    return {"timings": timings, "diverged": diverged}
+
+
+def summarize(timings):
+    """Per-kind count, mean, p99 and max of the step times, in milliseconds."""
+    by_kind = {}
+    for _, _, kind, seconds in timings:
+        by_kind.setdefault(kind, []).append(seconds)
+    summary = {}
+    for kind, samples in sorted(by_kind.items()):
+        values = np.array(samples) * 1000.0
+        summary[kind] = {
+            "count": len(samples),
+            "total_ms": float(values.sum()),
+            "mean_ms": float(values.mean()),
+            "p99_ms": float(np.percentile(values, 99)),
+            "max_ms": float(values.max()),
+        }
+    return summary
+
+
+def recordings_in(paths):
+    """Expands directories into the recordings they hold."""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            found.extend(os.path.join(path, name) for name in sorted(os.listdir(path))
+                         if name.endswith(".jsonl"))
+        else:
+            found.append(path)
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("paths", nargs="+", help="recordings, or directories of them")
+    parser.add_argument("--realtime", action="store_true",
+                        help="replay at recorded speed on this terminal")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="speed-up of a realtime replay")
+    parser.add_argument("--timings", help="write the time of every step to this JSON Lines file")
+    parser.add_argument("--output", help="write the per-recording summaries to this JSON file")
+    args = parser.parse_args(argv)
+
+    terminal = None
+    if args.realtime:
+        import blessed
+        terminal = blessed.Terminal()
+
+    results = {}
+    timings_file = open(args.timings, "w", encoding="utf-8") if args.timings else None
+    try:
+        for path in recordings_in(args.paths):
+            if terminal is not None:
+                with terminal.fullscreen(), terminal.hidden_cursor():
+                    result = replay(path, terminal, realtime=True, speed=args.speed)
+            else:
+                result = replay(path)
+            timings = result["timings"]
+            results[path] = {"diverged_at": result["diverged"], "steps": summarize(timings)}
+            if timings_file is not None:
+                for index, at, kind, seconds in timings:
+                    timings_file.write(json.dumps({"recording": path, "index": index, "t": at,
+                                                   "event": kind, "ms": seconds * 1000.0}) + "\n")
+
+            print(f"{path}: {len(timings)} steps")
+            for kind, stats in results[path]["steps"].items():
+                print(f"  {kind:6s} {stats['count']:6d} x  mean {stats['mean_ms']:7.3f} ms  "
+                      f"p99 {stats['p99_ms']:7.3f} ms  max {stats['max_ms']:7.3f} ms")
+            for index, at, kind, seconds in sorted(timings, key=lambda step: -step[3])[:SLOWEST_STEPS]:
+                print(f"  slow: event {index} ({kind}) at {at:.3f}s took {seconds * 1000.0:.3f} ms")
+            if result["diverged"] is not None:
+                print(f"  DIVERGED at event {result['diverged']}: the replay no longer matches the recording")
+    finally:
+        if timings_file is not None:
+            timings_file.close()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2)
+    return 1 if any(result["diverged_at"] is not None for result in results.values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
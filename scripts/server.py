@@ -0,0 +1,580 @@
+"""
+Multi-player telnet server: many sessions in one shared world.
+
+Every connection gets its own player, views and renderer, but they all
+play in the same Map, so each chunk is generated and held in memory once
+however many players are looking at it.
+
+    python scripts/server.py --port 4000        (then: telnet localhost 4000)
+    python scripts/server.py --load-test --clients 50 --duration 10
+"""
+import argparse
+import asyncio
+import random
+import socket
+import sys
+import time
+from collections import deque
+
+import numpy as np
+from blessed.keyboard import Keystroke, get_curses_keycodes
+
+from map import Map
+from pathfinding import PathFinder
+from renderer import Renderer
+from fov import SIGHT_RADIUS
+from game import (GameState, apply_key, render, load_settings, WORLD_STORE_DIR, MAX_FPS,
+                  TRAVEL_STEP_INTERVAL, SIM_TICK_INTERVAL)
+
+# Chunks kept in memory for all players together.
+SERVER_CACHE_CHUNKS = 4096
+
+# A client with more than this many bytes of frames still unsent gets no
+# new frames until it catches up. The next frame is diffed against the
+# last one it was sent, so nothing is lost by skipping.
+MAX_BACKLOG = 64 * 1024
+
+# Kernel send buffer of each connection, in bytes. Left to itself the
+# kernel grows it to megabytes, and a slow client's frames would queue up
+# there, out of reach of MAX_BACKLOG.
+SEND_BUFFER = 32 * 1024
+
+# A client that takes longer than this (in seconds) to take its backlog
+# is disconnected.
+SLOW_CLIENT_TIMEOUT = 10.0
+
+# Seconds a session may spend planning a route (travel, auto-explore) before
+# letting the other sessions run. Long routes are planned over many turns
+# of the event loop, so one player's trip never stalls everyone else.
+PLAN_SLICE = 0.005
+
+# Receive buffer of the load test's clients that never read, in bytes.
+SLOW_CLIENT_RCVBUF = 4096
+
+# Seconds a load test client lets auto-explore or travel run before its
+# next key stops it.
+TRIP_PAUSE = 2.0
+
+# How many chunks away the load test's clients travel to from the map.
+TRAVEL_CHUNKS = 30
+
+# Telnet commands and options (RFC 854, 857, 858, 1073).
+IAC, DONT, DO, WONT, WILL, SB, SE = 255, 254, 253, 252, 251, 250, 240
+ECHO, SGA, NAWS = 1, 3, 31
+
+# Server echoes nothing and sends characters as they are typed, and the
+# client reports its window size.
+TELNET_SETUP = bytes([IAC, WILL, ECHO, IAC, WILL, SGA, IAC, DO, NAWS])
+
+_KEYCODES = get_curses_keycodes()
+_ARROWS = {"A": "KEY_UP", "B": "KEY_DOWN", "C": "KEY_RIGHT", "D": "KEY_LEFT"}
+
+
+def _key(name, sequence):
+    return Keystroke(sequence, code=_KEYCODES[name], name=name)
+
+
+class TelnetDecoder:
+    """
+    Turns the bytes a telnet client sends into blessed Keystrokes, and
+    picks out window size reports along the way.
+    """
+
+    def __init__(self):
+        self._state = "data"
+        self._sub = bytearray()
+        self._escape = ""
+        self._after_cr = False
+        self.size = None  # (width, height) from the latest NAWS report.
+
+    def feed(self, data):
+        """Returns the keys in a chunk of received bytes."""
+        keys = []
+        for byte in data:
+            state = self._state
+            if state == "data":
+                if byte == IAC:
+                    self._state = "iac"
+                else:
+                    self._char(chr(byte), keys)
+            elif state == "iac":
+                if byte in (DO, DONT, WILL, WONT):
+                    self._state = "option"
+                elif byte == SB:
+                    self._sub.clear()
+                    self._state = "sub"
+                else:
+                    self._state = "data"
+            elif state == "option":
+                self._state = "data"
+            elif state == "sub":
+                if byte == IAC:
+                    self._state = "sub-iac"
+                else:
+                    self._sub.append(byte)
+            elif state == "sub-iac":
+                if byte == SE:
+                    self._subnegotiation(bytes(self._sub))
+                    self._state = "data"
+                else:
+                    self._sub.append(byte)
+                    self._state = "sub"
+        return keys
+
+    def _subnegotiation(self, sub):
+        if len(sub) >= 5 and sub[0] == NAWS:
+            width, height = sub[1] << 8 | sub[2], sub[3] << 8 | sub[4]
+            if width and height:
+                self.size = (width, height)
+
+    def _char(self, char, keys):
+        if self._escape:
+            self._escape += char
+            if len(self._escape) == 2 and char not in "[O":
+                # A lone Escape, which the game has no use for.
+                self._escape = ""
+                self._char(char, keys)
+            elif len(self._escape) == 3:
+                name = _ARROWS.get(char)
+                if name is not None:
+                    keys.append(_key(name, self._escape))
+                self._escape = ""
+            return
+
+        after_cr, self._after_cr = self._after_cr, False
+        if char == "\x1b":
+            self._escape = char
+        elif char == "\r":
+            self._after_cr = True
+            keys.append(_key("KEY_ENTER", "\r"))
+        elif char in "\n\x00":
+            if not after_cr:
+                keys.append(_key("KEY_ENTER", "\n"))
+        elif char.isprintable():
+            keys.append(Keystroke(char))
+
+
+class _Style(str):
+    """A terminal attribute that can be used as a prefix or called on text."""
+
+    def __call__(self, text):
+        return self + text + "\x1b[m"
+
+
+class _TransportBuffer:
+    """The binary side of a _ConnectionStream, which the renderer writes frames to."""
+
+    def __init__(self, writer):
+        self._writer = writer
+        self.bytes_sent = 0
+
+    def write(self, data):
+        self.bytes_sent += len(data)
+        self._writer.write(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+class _ConnectionStream:
+    """A text stream writing into one client's transport."""
+
+    encoding = "utf-8"
+
+    def __init__(self, writer):
+        self.buffer = _TransportBuffer(writer)
+
+    @property
+    def bytes_sent(self):
+        return self.buffer.bytes_sent
+
+    def write(self, text):
+        self.buffer.write(text.encode(self.encoding))
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+class SessionTerminal:
+    """
+    The subset of blessed.Terminal the Renderer uses, emitting standard
+    xterm sequences to one connection.
+    """
+
+    def __init__(self, writer, width=80, height=24):
+        self.width = width
+        self.height = height
+        self.stream = _ConnectionStream(writer)
+        self.home = "\x1b[H"
+        self.clear = "\x1b[2J"
+        self.normal = "\x1b[m"
+        self.bold = _Style("\x1b[1m")
+        self.on_black = _Style("\x1b[40m")
+        self.bright_black = _Style("\x1b[90m")
+
+    def move_xy(self, x, y):
+        return f"\x1b[{y + 1};{x + 1}H"
+
+    def move_right(self, count):
+        return f"\x1b[{count}C"
+
+    def move_left(self, count):
+        return f"\x1b[{count}D"
+
+    def move_down(self, count):
+        return f"\x1b[{count}B"
+
+    def move_up(self, count):
+        return f"\x1b[{count}A"
+
+
+class Session:
+    """One connected player."""
+
+    def __init__(self, server, reader, writer):
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.state = GameState(server.world_map, server.pathfinder)
+        self.state.plan_budget = PLAN_SLICE
+        self.terminal = SessionTerminal(writer)
+        # Each player sees from where they are; what has been seen is shared.
+        self.renderer = Renderer(self.terminal, camera=True, sight_radius=SIGHT_RADIUS)
+        self.decoder = TelnetDecoder()
+        self.keys = deque()
+        self.wake = asyncio.Event()
+        self.dirty = True
+        self.input_time = None  # When the first key not yet drawn arrived.
+        self.frames = 0
+        self.skipped_frames = 0
+        self.dropped = False  # Disconnected for not taking its backlog.
+
+    def mark_dirty(self):
+        """Asks for a redraw, e.g. because something nearby moved."""
+        self.dirty = True
+        self.wake.set()
+
+    async def _read(self):
+        while True:
+            data = await self.reader.read(4096)
+            if not data:
+                return
+            keys = self.decoder.feed(data)
+            if self.decoder.size is not None:
+                size, self.decoder.size = self.decoder.size, None
+                self.terminal.width, self.terminal.height = size
+                self.dirty = True
+            if keys:
+                if self.input_time is None:
+                    self.input_time = time.perf_counter()
+                self.keys.extend(keys)
+            self.wake.set()
+
+    def _apply_keys(self):
+        while self.keys:
+            self.dirty |= apply_key(self.state, self.keys.popleft())
+
+    async def run(self):
+        """Serves the session until the player quits or disconnects."""
+        self.writer.write(TELNET_SETUP)
+        self.writer.transport.set_write_buffer_limits(high=MAX_BACKLOG)
+        sock = self.writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER)
+        reader = asyncio.create_task(self._read())
+        frame_interval = 1.0 / self.server.max_fps
+        last_frame = next_step = 0.0
+        try:
+            while self.state.running and not reader.done():
+                if self.state.planning is not None:
+                    # Let the other sessions have a turn between slices.
+                    await asyncio.sleep(0)
+                else:
+                    # Sleep until there is input, a redraw request, or the
+                    # next frame or travel step is due.
+                    now = time.perf_counter()
+                    deadlines = []
+                    if self.dirty:
+                        deadlines.append(last_frame + frame_interval)
+                    if self.state.route is not None:
+                        deadlines.append(next_step)
+                    timeout = max(0.0, min(deadlines) - now) if deadlines else None
+                    try:
+                        await asyncio.wait_for(self.wake.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+                self.wake.clear()
+
+                self._apply_keys()
+                if self.state.planning is not None:
+                    self.state.continue_planning(PLAN_SLICE)
+                now = time.perf_counter()
+                if self.state.route is not None and now >= next_step:
+                    self.dirty |= self.state.advance_route()
+                    next_step = now + TRAVEL_STEP_INTERVAL
+                if not self.dirty or now - last_frame < frame_interval:
+                    continue
+
+                if self.writer.transport.get_write_buffer_size() > MAX_BACKLOG:
+                    # A slow client: skip frames until it has caught up.
+                    self.skipped_frames += 1
+                    try:
+                        await asyncio.wait_for(self.writer.drain(), SLOW_CLIENT_TIMEOUT)
+                    except asyncio.TimeoutError:
+                        self.dropped = True
+                        raise
+                    continue
+
+                render(self.state, self.renderer)
+                last_frame = time.perf_counter()
+                self.dirty = False
+                self.frames += 1
+                if self.input_time is not None:
+                    self.server.latencies.append(last_frame - self.input_time)
+                    self.input_time = None
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            reader.cancel()
+            self.server.world_map.clear_focus(self.state.player)
+            self.writer.close()
+
+
+class GameServer:
+    """Accepts telnet connections and runs them all in one world."""
+
+    def __init__(self, world_map, max_fps=MAX_FPS):
+        """
+        Args:
+            world_map (Map): The world every session plays in.
+            max_fps (int): Frame-rate cap of each session.
+        """
+        self.world_map = world_map
+        self.pathfinder = PathFinder(world_map)
+        self.max_fps = max_fps
+        self.sessions = set()
+        self.latencies = deque(maxlen=100000)  # Input-to-frame, in seconds.
+        self.frames = 0
+        self.skipped_frames = 0
+        self.dropped_clients = 0
+        self._server = None
+        self._ticker = None
+
+    async def start(self, host="127.0.0.1", port=4000):
+        """Starts listening. Returns the port, which is useful with port 0."""
+        self._server = await asyncio.start_server(self._serve, host, port)
+        self._ticker = asyncio.create_task(self._tick_loop())
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._ticker.cancel()
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _serve(self, reader, writer):
+        session = Session(self, reader, writer)
+        self.sessions.add(session)
+        try:
+            await session.run()
+        finally:
+            self.sessions.discard(session)
+            self.frames += session.frames
+            self.skipped_frames += session.skipped_frames
+            self.dropped_clients += session.dropped
+
+    async def _tick_loop(self):
+        """
+        Simulates the entities around every player, once for all of them,
+        and redraws the sessions that can see something that moved.
+        """
+        entities = self.world_map.entities
+        while True:
+            await asyncio.sleep(SIM_TICK_INTERVAL)
+            players = [session.state for session in self.sessions]
+            if not players or not entities.tick_around(
+                    [(state.player.chunk_x, state.player.chunk_y) for state in players],
+                    [state.player_tile() for state in players]):
+                continue
+            for session in self.sessions:
+                player = session.state.player
+                if any(abs(chunk_x - player.chunk_x) <= 1 and abs(chunk_y - player.chunk_y) <= 1
+                       for chunk_x, chunk_y in entities.moved_chunks):
+                    session.mark_dirty()
+
+    def stats(self):
+        """Counters and latency percentiles in milliseconds."""
+        latencies = np.array(self.latencies) * 1000.0 if self.latencies else np.zeros(1)
+        return {
+            "sessions": len(self.sessions),
+            "frames": self.frames + sum(session.frames for session in self.sessions),
+            "skipped_frames": self.skipped_frames + sum(s.skipped_frames for s in self.sessions),
+            "dropped_clients": self.dropped_clients,
+            "resident_chunks": len(self.world_map.chunks),
+            "input_to_frame_p50_ms": float(np.percentile(latencies, 50)),
+            "input_to_frame_p99_ms": float(np.percentile(latencies, 99)),
+        }
+
+
+def create_world(seed=None):
+    """
+    The shared world. A world of a fixed seed is stored where the game keeps
+    its chunk stores; a random one is not, as it is never served again.
+    """
+    if seed is None:
+        seed = load_settings().get("world_seed")
+    store_dir = WORLD_STORE_DIR if seed is not None else None
+    return Map(seed=seed, store_dir=store_dir, cache_chunks=SERVER_CACHE_CHUNKS, borders=False)
+
+
+async def serve(host, port, seed):
+    world_map = create_world(seed)
+    server = GameServer(world_map)
+    port = await server.start(host, port)
+    print(f"Serving seed {world_map.seed} on {host}:{port}. Press Ctrl+C to stop.")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+        world_map.close()
+
+
+async def scripted_client(port, duration, keys_per_second, seed, read=True,
+                          explore_chance=0.0, travel_chance=0.0):
+    """
+    A client that reports an 80x24 window and random-walks with the arrow
+    keys. Now and then it presses 'x' to auto-explore, or travels
+    TRAVEL_CHUNKS chunks from the map (m, arrows, Enter), and lets the trip
+    run for TRIP_PAUSE seconds. A client that doesn't read stands in for a slow connection: its
+    socket gets a small receive buffer, so the server's backlog for it
+    fills within seconds rather than after megabytes of kernel buffers.
+
+    Returns:
+        int: Bytes received.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    if not read:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SLOW_CLIENT_RCVBUF)
+    sock.setblocking(False)
+    await asyncio.get_running_loop().sock_connect(sock, ("127.0.0.1", port))
+    reader, writer = await asyncio.open_connection(sock=sock)
+    writer.write(bytes([IAC, SB, NAWS, 0, 80, 0, 24, IAC, SE]))
+    received = 0
+
+    async def consume():
+        nonlocal received
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                return
+            received += len(data)
+
+    consumer = asyncio.create_task(consume()) if read else None
+    rng = random.Random(seed)
+    end = time.perf_counter() + duration
+    try:
+        while time.perf_counter() < end:
+            roll = rng.random()
+            if roll < explore_chance + travel_chance:
+                if roll < explore_chance:
+                    writer.write(b"x")
+                else:
+                    arrow = b"\x1b[" + rng.choice(b"ABCD").to_bytes(1, "big")
+                    writer.write(b"m" + arrow * TRAVEL_CHUNKS + b"\r")
+                await asyncio.sleep(TRIP_PAUSE)
+            else:
+                writer.write(b"\x1b[" + rng.choice(b"ABCD").to_bytes(1, "big"))
+            await asyncio.sleep(rng.expovariate(keys_per_second))
+        # The first key stops any trip, the second quits.
+        writer.write(b"qq")
+        await writer.drain()
+    except ConnectionError:
+        pass
+    if consumer is not None:
+        try:
+            await asyncio.wait_for(consumer, 2.0)
+        except asyncio.TimeoutError:
+            consumer.cancel()
+    writer.close()
+    return received
+
+
+async def load_test(clients, duration, keys_per_second, slow_clients, seed,
+                    explore_chance=0.0, travel_chance=0.0):
+    """
+    Runs the server and scripted clients in this process and reports the
+    input-to-frame latency and how many such sessions one core can serve.
+    Clients auto-explore or travel with the given chances per key, so
+    route planning is part of the load.
+    """
+    world_map = Map(seed=seed, cache_chunks=SERVER_CACHE_CHUNKS, borders=False)
+    server = GameServer(world_map)
+    port = await server.start(port=0)
+
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    received = await asyncio.gather(*(
+        scripted_client(port, duration, keys_per_second, seed=i, read=i >= slow_clients,
+                        explore_chance=explore_chance, travel_chance=travel_chance)
+        for i in range(clients)
+    ))
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+    await asyncio.sleep(0.1)  # Let the sessions finish.
+    stats = server.stats()
+    await server.stop()
+    world_map.close()
+
+    load = cpu / wall
+    stats.update({
+        "clients": clients,
+        "slow_clients": slow_clients,
+        "keys_per_second_per_client": keys_per_second,
+        "explore_chance": explore_chance,
+        "travel_chance": travel_chance,
+        "bytes_received": sum(received),
+        "cpu_utilisation": load,
+        # Sessions at this input rate one fully busy core could serve.
+        "sessions_per_core": clients / load if load else float("inf"),
+    })
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=4000, help="port to listen on")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="world seed (default: world_seed from settings)")
+    parser.add_argument("--load-test", action="store_true",
+                        help="run scripted localhost clients against an in-process server")
+    parser.add_argument("--clients", type=int, default=50, help="load test: number of clients")
+    parser.add_argument("--duration", type=float, default=10.0, help="load test: seconds to run")
+    parser.add_argument("--rate", type=float, default=8.0, help="load test: keys per second per client")
+    parser.add_argument("--slow", type=int, default=0, help="load test: clients that never read")
+    parser.add_argument("--explore", type=float, default=0.02,
+                        help="load test: chance that a key is 'x' (auto-explore)")
+    parser.add_argument("--travel", type=float, default=0.01,
+                        help="load test: chance that a key starts a trip from the map")
+    args = parser.parse_args(argv)
+
+    if args.load_test:
+        seed = 123 if args.seed is None else args.seed
+        stats = asyncio.run(load_test(args.clients, args.duration, args.rate, args.slow, seed,
+                                      args.explore, args.travel))
+        for name, value in stats.items():
+            print(f"  {name:28s} {value:.2f}" if isinstance(value, float) else f"  {name:28s} {value}")
+        if args.slow and not (stats["skipped_frames"] or stats["dropped_clients"]):
+            print("Slow clients were neither skipped nor dropped: backpressure was not exercised.")
+            return 1
+        return 0
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.seed))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,357 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from terrain import CHUNK_WIDTH, CHUNK_HEIGHT
+from tiles import Tile
+
+# Seconds between simulation steps.
+STEP_INTERVAL = 1.0
+
+# How often the game checks for a finished step while one is computed.
+POLL_INTERVAL = 0.05
+
+# Steps averaged over for the throughput figures.
+WINDOW = 30
+
+# Border value for neighbours that aren't loaded. It matches no rule, so
+# the edge of the loaded area neither gains nor loses anything.
+UNLOADED = 255
+
+# The border cells of a chunk, from a neighbour `offset` chunks away: for
+# each offset, (destination slice in the padded chunk, source slice in the
+# neighbour), along one axis.
+_ROWS = {-1: (slice(0, 1), slice(CHUNK_HEIGHT - 1, CHUNK_HEIGHT)),
+         0: (slice(1, CHUNK_HEIGHT + 1), slice(0, CHUNK_HEIGHT)),
+         1: (slice(CHUNK_HEIGHT + 1, CHUNK_HEIGHT + 2), slice(0, 1))}
+_COLUMNS = {-1: (slice(0, 1), slice(CHUNK_WIDTH - 1, CHUNK_WIDTH)),
+            0: (slice(1, CHUNK_WIDTH + 1), slice(0, CHUNK_WIDTH)),
+            1: (slice(CHUNK_WIDTH + 1, CHUNK_WIDTH + 2), slice(0, 1))}
+
+
+class CellRule:
+    """
+    Turns `source` tiles into `target` tiles, with a chance per step, where
+    between `min_count` and `max_count` of the eight neighbours are
+    `neighbour` tiles.
+    """
+
+    def __init__(self, name, source, target, neighbour, min_count=1, max_count=8, chance=1.0):
+        """
+        Args:
+            name (str): Names the rule in stats.
+            source (Tile): Tiles the rule changes.
+            target (Tile): What they become.
+            neighbour (Tile): The tile counted around each cell.
+            min_count (int): Fewest such neighbours for the rule to apply.
+            max_count (int): Most such neighbours for the rule to apply.
+            chance (float): Probability per step that an eligible tile
+                            changes.
+        """
+        if Tile.WALL in (source, target):
+            raise ValueError(f"rule {name!r} would change walls")
+        self.name = name
+        self.source = source
+        self.target = target
+        self.neighbour = neighbour
+        self.min_count = min_count
+        self.max_count = max_count
+        # Compared with a 32-bit hash of each eligible cell.
+        self.threshold = int(chance * 2 ** 32)
+
+
+def default_rules():
+    """
+    The rules of the game's world: water fills in around lakes and dries up
+    at their edges, bushes spread and thin out, and rock beside water
+    erodes. None of them create or remove walls, so routes and the
+    pathfinder's caches of portals stay valid.
+    """
+    return [
+        CellRule("water_spread", Tile.EMPTY, Tile.WATER, Tile.WATER, min_count=5, chance=0.2),
+        CellRule("water_dry", Tile.WATER, Tile.EMPTY, Tile.WATER, min_count=0, max_count=2, chance=0.1),
+        CellRule("bush_growth", Tile.EMPTY, Tile.BUSH, Tile.BUSH, min_count=2, max_count=3, chance=0.02),
+        CellRule("bush_decay", Tile.BUSH, Tile.EMPTY, Tile.BUSH, min_count=5, chance=0.05),
+        CellRule("rock_erosion", Tile.ROCK, Tile.EMPTY, Tile.WATER, min_count=3, chance=0.01),
+    ]
+
+
+def _hash(seed, step, salt, xs, ys):
+    """
+    A 32-bit hash of global tile coordinates, the same whichever chunks a
+    step happens to stack together, so results don't depend on what else is
+    loaded.
+    """
+    h = (xs.astype(np.uint32) * np.uint32(0x9E3779B1)) ^ (ys.astype(np.uint32) * np.uint32(0x85EBCA77))
+    h ^= np.uint32((seed * 0xC2B2AE3D + step * 0x27D4EB2F + salt * 0x165667B1) & 0xFFFFFFFF)
+    h ^= h >> np.uint32(16)
+    h *= np.uint32(0x7FEB352D)
+    h ^= h >> np.uint32(15)
+    h *= np.uint32(0x846CA68B)
+    h ^= h >> np.uint32(16)
+    return h
+
+
+def step_chunks(keys, stack, rules, seed=0, step=0):
+    """
+    Advances a set of chunks by one step. The chunks are stacked into one
+    array, each padded with a one-tile border taken from its neighbours, so
+    water flows across chunk seams and a step is a handful of NumPy
+    neighbourhood counts however many chunks are loaded.
+
+    Args:
+        keys (list): (chunk_x, chunk_y) of each chunk in `stack`. Chunks
+                     next to each other exchange tiles across their seam.
+        stack (np.ndarray): (chunks, CHUNK_HEIGHT, CHUNK_WIDTH) tile codes.
+        rules (list): CellRules, applied to the state before the step. Where
+                      several change the same tile, the first one wins.
+        seed (int): Seed of the step's randomness.
+        step (int): Number of the step.
+
+    Returns:
+        np.ndarray: The tiles after the step, in a new array.
+    """
+    count = len(keys)
+    padded = np.full((count, CHUNK_HEIGHT + 2, CHUNK_WIDTH + 2), UNLOADED, dtype=stack.dtype)
+    index = {key: i for i, key in enumerate(keys)}
+    for dy, (row_to, row_from) in _ROWS.items():
+        for dx, (column_to, column_from) in _COLUMNS.items():
+            if dx == dy == 0:
+                padded[:, row_to, column_to] = stack
+                continue
+            neighbours = np.array([index.get((chunk_x + dx, chunk_y + dy), -1) for chunk_x, chunk_y in keys])
+            present = np.flatnonzero(neighbours >= 0)
+            if present.size:
+                padded[present, row_to, column_to] = stack[neighbours[present], row_from, column_from]
+
+    # Neighbour counts of every tile a rule looks for: a 3x3 box sum, as a
+    # sum of rows and then of columns, less the centre.
+    counts = {}
+    for rule in rules:
+        if rule.neighbour not in counts:
+            match = (padded == rule.neighbour).view(np.uint8)
+            rows = match[:, :-2] + match[:, 1:-1] + match[:, 2:]
+            counts[rule.neighbour] = (rows[:, :, :-2] + rows[:, :, 1:-1] + rows[:, :, 2:]
+                                      - match[:, 1:-1, 1:-1])
+
+    result = stack.copy()
+    changed = np.zeros(stack.shape, dtype=bool)
+    origins = np.array(keys, dtype=np.int64).reshape(-1, 2) * (CHUNK_WIDTH, CHUNK_HEIGHT)
+    for salt, rule in enumerate(rules):
+        around = counts[rule.neighbour]
+        eligible = (stack == rule.source) & (around >= rule.min_count) & (around <= rule.max_count) & ~changed
+        cells = np.flatnonzero(eligible)
+        if not cells.size:
+            continue
+        # Only the eligible cells roll the dice.
+        chunk, rest = np.divmod(cells, CHUNK_HEIGHT * CHUNK_WIDTH)
+        ys, xs = np.divmod(rest, CHUNK_WIDTH)
+        rolls = _hash(seed, step, salt, origins[chunk, 0] + xs, origins[chunk, 1] + ys)
+        cells = cells[rolls < rule.threshold]
+        result.flat[cells] = rule.target
+        changed.flat[cells] = True
+    return result
+
+
+class WorldSimulation:
+    """
+    Runs the cellular automaton over the resident chunks of a Map on a
+    background thread, one step every `interval` seconds.
+
+    The game thread hands the worker the chunks and later applies a
+    finished step to all of them at once (update), between two frames, so
+    no frame ever shows half a step. How far the worker gets depends on
+    timing, so a recording keeps the changes of every step (applied) and a
+    replay applies those rather than stepping.
+    """
+
+    def __init__(self, seed=0, rules=None, interval=STEP_INTERVAL):
+        """
+        Args:
+            seed (int): Seed of the simulation's randomness.
+            rules (list, optional): CellRules. Defaults to default_rules().
+            interval (float): Seconds between steps.
+        """
+        self.seed = seed
+        self.rules = default_rules() if rules is None else rules
+        self.interval = interval
+        self.steps = 0  # Steps applied to the map.
+        self.changed_tiles = 0
+        self.applied = []  # (key, indices, tiles) of the last step applied.
+        self._next_step = time.perf_counter() + interval
+        self._busy = False
+        self._job = None
+        self._result = None
+        self._stopping = False
+        self._wake = threading.Condition()
+        self._recent = deque(maxlen=WINDOW)  # (cells, seconds) per step.
+        self._worker = threading.Thread(target=self._work_loop, name="world-simulation", daemon=True)
+        self._worker.start()
+
+    def _work_loop(self):
+        while True:
+            with self._wake:
+                while self._job is None and not self._stopping:
+                    self._wake.wait()
+                if self._stopping:
+                    return
+                job, self._job = self._job, None
+            world_map, step, keys, versions, chunks = job
+            began = time.perf_counter()
+            stack = np.stack(chunks)
+            after = step_chunks(keys, stack, self.rules, self.seed, step)
+            # The changes, split by chunk, so the game thread only writes
+            # them.
+            cells = np.flatnonzero(after != stack)
+            chunks, indices = np.divmod(cells, CHUNK_HEIGHT * CHUNK_WIDTH)
+            bounds = np.flatnonzero(np.diff(chunks)) + 1
+            changes = [(int(group[0]), index, after.flat[cell])
+                       for group, index, cell in zip(np.split(chunks, bounds), np.split(indices, bounds),
+                                                     np.split(cells, bounds)) if group.size]
+            seconds = time.perf_counter() - began
+            with self._wake:
+                self._result = (world_map, keys, versions, changes)
+                self._recent.append((stack.size, seconds))
+
+    def update(self, world_map):
+        """
+        Called from the game loop. Applies a finished step to the map, and
+        hands the worker the next one when it is due.
+
+        Args:
+            world_map (Map): The map to simulate. A step started on a map
+                             that has since been replaced is discarded.
+
+        Returns:
+            bool: True if any tiles changed.
+        """
+        with self._wake:
+            result, self._result = self._result, None
+        changed = 0
+        if result is not None:
+            self._busy = False
+            step_map, keys, versions, changes = result
+            if step_map is world_map:
+                self.applied = []
+                for i, indices, tiles in changes:
+                    # Chunks edited or reloaded meanwhile keep their tiles,
+                    # and catch up on the next step.
+                    if world_map.chunk_version(*keys[i]) == versions[i] and world_map.chunks.peek(keys[i]) is not None:
+                        world_map.update_tiles(*keys[i], indices, tiles)
+                        self.applied.append((keys[i], indices, tiles))
+                        changed += len(indices)
+                self.steps += 1
+                self.changed_tiles += changed
+
+        now = time.perf_counter()
+        if not self._busy and now >= self._next_step:
+            # A fixed timestep, except that steps missed while the game was
+            # busy are skipped rather than run back to back.
+            self._next_step = max(self._next_step + self.interval, now)
+            resident = list(world_map.chunks.items())
+            if resident:
+                # The worker copies the tiles; a chunk changed meanwhile is
+                # caught by its version.
+                keys = [key for key, _ in resident]
+                chunks = [chunk for _, chunk in resident]
+                versions = [world_map.chunk_version(*key) for key in keys]
+                with self._wake:
+                    self._job = (world_map, self.steps, keys, versions, chunks)
+                    self._wake.notify()
+                self._busy = True
+        return changed > 0
+
+    def delay(self):
+        """Seconds the game loop may sleep before calling update again."""
+        if self._busy:
+            return POLL_INTERVAL
+        return max(0.0, self._next_step - time.perf_counter())
+
+    def stats(self):
+        """Steps applied, tiles changed, and the recent step time and throughput."""
+        with self._wake:
+            recent = list(self._recent)
+        cells = sum(count for count, _ in recent)
+        seconds = sum(taken for _, taken in recent)
+        return {
+            "steps": self.steps,
+            "changed_tiles": self.changed_tiles,
+            "step_ms": seconds / len(recent) * 1000.0 if recent else 0.0,
+            "cells_per_second": cells / seconds if seconds else 0.0,
+        }
+
+    def close(self):
+        """Stops the worker."""
+        with self._wake:
+            self._stopping = True
+            self._wake.notify()
+        self._worker.join()
+
+
+# This block tests the rules across chunk seams and measures throughput.
+if __name__ == '__main__':
+    from map import Map
+
+    print("--- Testing World Simulation ---")
+    world_map = Map(seed=123, borders=False)
+    for chunk_y in range(-1, 2):
+        for chunk_x in range(-1, 2):
+            world_map.get_chunk(chunk_x, chunk_y)
+
+    # The order chunks are stacked in makes no difference.
+    keys = sorted(world_map.chunks.keys())
+    stack = np.stack([world_map.chunks.peek(key) for key in keys])
+    together = step_chunks(keys, stack, default_rules(), seed=1, step=5)
+    assert np.array_equal(step_chunks(keys[::-1], stack[::-1], default_rules(), seed=1, step=5)[::-1], together)
+    print(f"Tiles of 9 chunks that change in one step: {(together != stack).sum()}.")
+
+    # Water pours across a seam from a full chunk into an empty one.
+    seam = np.zeros((2, CHUNK_HEIGHT, CHUNK_WIDTH), dtype=np.uint8)
+    seam[0] = Tile.WATER
+    rule = [CellRule("flood", Tile.EMPTY, Tile.WATER, Tile.WATER, min_count=1)]
+    after = step_chunks([(0, 0), (1, 0)], seam, rule)
+    assert (after[1][:, 0] == Tile.WATER).all() and not after[1][:, 1:].any()
+    assert (step_chunks([(1, 0)], seam[1:], rule) == 0).all()
+    # Walls are left alone.
+    walled = np.full((1, CHUNK_HEIGHT, CHUNK_WIDTH), Tile.WALL, dtype=np.uint8)
+    assert np.array_equal(step_chunks([(0, 0)], walled, default_rules()), walled)
+    print("Water crosses chunk seams, and nothing crosses into chunks that aren't loaded.")
+
+    # Throughput of a step over many chunks at once.
+    for count in (9, 100, 400):
+        side = int(count ** 0.5)
+        keys = [(x, y) for y in range(side) for x in range(side)]
+        stack = np.stack([world_map.terrain.generate(0, 0)] * len(keys))
+        began = time.perf_counter()
+        for step in range(5):
+            step_chunks(keys, stack, default_rules(), step=step)
+        seconds = (time.perf_counter() - began) / 5
+        print(f"{len(keys)} chunks: {seconds * 1000:.1f} ms a step, "
+              f"{stack.size / seconds / 1e6:.1f} million cell updates a second.")
+
+    # The background worker applies whole steps to the map, and the changes
+    # it reports, recorded as a session does, replay them exactly.
+    from recording import encode_changes, decode_changes
+    simulation = WorldSimulation(seed=1, interval=0.01)
+    before = {key: chunk.copy() for key, chunk in world_map.chunks.items()}
+    replayed = Map(seed=123, borders=False)
+    for key in before:
+        replayed.get_chunk(*key)
+    deadline = time.perf_counter() + 5
+    while simulation.steps < 10 and time.perf_counter() < deadline:
+        if simulation.update(world_map):
+            replayed.load_deltas(decode_changes(encode_changes(simulation.applied)))
+        time.sleep(simulation.delay())
+    simulation.close()
+    assert simulation.steps >= 10
+    after = dict(world_map.chunks.items())
+    assert any(not np.array_equal(before[key], after[key]) for key in before)
+    assert all(np.array_equal(before[key] == Tile.WALL, after[key] == Tile.WALL) for key in before)
+    assert all(np.array_equal(replayed.get_chunk(*key), after[key]) for key in before)
+    assert replayed.deltas == world_map.deltas
+    changed = sum(len(delta) for delta in world_map.deltas.values())
+    print(f"{simulation.steps} steps on a background thread: {simulation.changed_tiles} tile changes, "
+          f"kept as {changed} deltas. {simulation.stats()['step_ms']:.2f} ms a step.")
+    print("\nWorld simulation tests passed!")
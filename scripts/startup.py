@@ -0,0 +1,59 @@
+import json
+import os
+import time
+
+# The launcher passes the time it started on in this variable, so the profile
+# is the same whether the game runs in the launcher's process or in one of
+# its own. Without a launcher, the clock starts when this module is imported.
+LAUNCH_TIME_VARIABLE = "JULES_LAUNCH_TIME"
+
+
+class StartupProfile:
+    """
+    How long each phase from launch to the first frame took: named phases,
+    each timed from the end of the previous one.
+    """
+
+    def __init__(self, origin=None):
+        """
+        Args:
+            origin (float, optional): Wall-clock time startup began.
+        """
+        if origin is None:
+            origin = float(os.environ.get(LAUNCH_TIME_VARIABLE, time.time()))
+        self.origin = origin
+        self.phases = []
+        self._last = origin
+
+    def mark(self, phase):
+        """Ends a phase."""
+        now = time.time()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def total(self):
+        """Seconds from launch to the last mark."""
+        return self._last - self.origin
+
+    def report(self):
+        """The phases as printable lines."""
+        lines = [f"  {phase:12s} {seconds * 1000.0:8.1f} ms" for phase, seconds in self.phases]
+        lines.append(f"  {'total':12s} {self.total() * 1000.0:8.1f} ms  (time to first frame)")
+        return "\n".join(lines)
+
+    def log(self, path):
+        """Appends the profile to a JSON Lines log."""
+        record = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "startup_ms": {phase: seconds * 1000.0 for phase, seconds in self.phases},
+            "time_to_first_frame_ms": self.total() * 1000.0,
+        }
+        try:
+            with open(path, "a", encoding="utf-8") as fh:
+                fh.write(json.dumps(record) + "\n")
+        except OSError:
+            pass
+
+
+# The profile of this process's startup.
+PROFILE = StartupProfile()
@@ -0,0 +1,181 @@
+import functools
+import json
+import os
+import sys
+import time
+from collections import deque
+
+# How many recent samples of each metric the HUD averages over.
+WINDOW = 60
+
+
+def process_rss():
+    """Returns the resident set size of this process in bytes, or None."""
+    if sys.platform.startswith("linux"):
+        try:
+            with open("/proc/self/statm", "r") as fh:
+                return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, IndexError):
+            return None
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class _Counters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = _Counters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.WorkingSetSize
+        return None
+    try:
+        import resource
+        # macOS reports the peak in bytes; close enough for a HUD.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except (ImportError, OSError):
+        return None
+
+
+class Telemetry:
+    """
+    Optional performance instrumentation for a running game.
+
+    While disabled nothing is hooked, so it costs nothing. Enabling it wraps
+    the interesting methods of the current Map, Player and Renderer with
+    timers; every frame then gets a HUD line and a JSONL log record.
+    """
+
+    def __init__(self, log_path=None):
+        """
+        Args:
+            log_path (str, optional): JSONL file to append frame records to.
+        """
+        self.log_path = log_path
+        self.enabled = False
+        self._log = None
+        self._hooks = []
+        self.targets = None  # The (map, player, renderer) currently hooked.
+        self._samples = {}
+        self._last_values = {}
+
+    def record(self, metric, seconds):
+        """Adds one timing sample. Safe to call from worker threads."""
+        samples = self._samples.get(metric)
+        if samples is None:
+            samples = self._samples.setdefault(metric, deque(maxlen=WINDOW))
+        samples.append(seconds)
+
+    def mean_ms(self, metric):
+        samples = self._samples.get(metric)
+        if not samples:
+            return None
+        return sum(samples) / len(samples) * 1000.0
+
+    def _wrap(self, obj, name, metric):
+        """Replaces obj.name with a timed version on the instance only."""
+        original = getattr(obj, name)
+
+        @functools.wraps(original)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.record(metric, time.perf_counter() - start)
+
+        setattr(obj, name, timed)
+        self._hooks.append((obj, name))
+
+    def attach(self, world_map, player, renderer):
+        """
+        Hooks the timers into a set of game objects. Called on enable and
+        again whenever the game is restarted with new objects.
+        """
+        self.detach()
+        self.targets = (world_map, player, renderer)
+        self._wrap(world_map, "get_chunk", "get_chunk")
+        self._wrap(world_map, "_generate_chunk", "generate")
+        self._wrap(world_map.entities, "tick", "tick")
+        self._wrap(player, "move", "move")
+        self._wrap(renderer, "draw", "frame")
+        self._wrap(renderer, "draw_map_screen", "frame")
+        self._wrap(renderer, "draw_keys_screen", "frame")
+        # Only the write itself: diffing and encoding the frame are part of
+        # building it.
+        self._wrap(renderer.encoder, "send", "flush")
+
+    def detach(self):
+        """Removes every hook, restoring the original methods."""
+        for obj, name in self._hooks:
+            # The timed wrapper is an instance attribute; deleting it
+            # uncovers the class method again.
+            delattr(obj, name)
+        self._hooks = []
+        self.targets = None
+
+    def enable(self, world_map, player, renderer):
+        """Starts timing the given game objects and opens the log."""
+        self.enabled = True
+        self.attach(world_map, player, renderer)
+        if self.log_path is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.log_path)), exist_ok=True)
+            self._log = open(self.log_path, "a", encoding="utf-8")
+
+    def disable(self):
+        """Removes the hooks and closes the log."""
+        self.enabled = False
+        self.detach()
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+    def snapshot(self, world_map):
+        """Collects the current counters into a dictionary."""
+        values = {"time": time.time()}
+        for metric in ("frame", "flush", "input_to_frame", "get_chunk", "generate", "move", "tick"):
+            values[f"{metric}_ms"] = self.mean_ms(metric)
+        if values["frame_ms"] is not None and values["flush_ms"] is not None:
+            values["build_ms"] = values["frame_ms"] - values["flush_ms"]
+        cache = world_map.chunks.stats()
+        values["cache_resident"] = cache["resident"]
+        values["cache_hit_rate"] = cache["hit_rate"]
+        values["cache_evictions"] = cache["evictions"]
+        if world_map.prefetcher is not None:
+            values["prefetch"] = world_map.prefetcher.stats()
+        values["entities"] = world_map.entities.count
+        values["terrain_stages_ms"] = {name: stats["mean_ms"]
+                                       for name, stats in world_map.terrain.stage_stats().items()}
+        values["rss_bytes"] = process_rss()
+        if self.targets is not None:
+            values["output"] = self.targets[2].encoder.stats()
+        return values
+
+    def end_frame(self, world_map):
+        """Logs one record for the frame just drawn."""
+        self._last_values = self.snapshot(world_map)
+        if self._log is not None:
+            self._log.write(json.dumps(self._last_values) + "\n")
+            self._log.flush()
+
+    def hud_text(self):
+        """One line summarising the latest frame, for the status bar."""
+        values = self._last_values
+
+        def ms(name):
+            value = values.get(f"{name}_ms")
+            return "-" if value is None else f"{value:.2f}"
+
+        rss = values.get("rss_bytes")
+        rss_text = "-" if rss is None else f"{rss / (1024 * 1024):.0f}MB"
+        hit_rate = values.get("cache_hit_rate", 0.0) * 100
+        output = values.get("output", {})
+        return (f"PERF build {ms('build')}ms flush {ms('flush')}ms in>frame {ms('input_to_frame')}ms "
+                f"gen {ms('generate')}ms tick {ms('tick')}ms | cache {values.get('cache_resident', 0)} "
+                f"{hit_rate:.0f}% | out {output.get('mean_frame_bytes', 0.0):.0f}B/frame "
+                f"{output.get('dropped', 0)} dropped | rss {rss_text}")
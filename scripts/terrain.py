@@ -0,0 +1,906 @@
+import abc
+import random
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# Import the visual assets from the central art repository.
+from ascii_art import ROCK, BUSH, WALL, EMPTY, WATER
+from tiles import Tile, TILE_DTYPE
+
+# Define constants for chunk dimensions
+CHUNK_WIDTH = 80
+CHUNK_HEIGHT = 24
+
+# Scale determines the "zoom" level of the noise. Smaller values = larger features.
+SCALE = 0.05
+
+# Tiles summarised by one cell of a chunk overview, and the resulting
+# overview size of a chunk in cells.
+OVERVIEW_CELL_WIDTH = 8
+OVERVIEW_CELL_HEIGHT = 4
+OVERVIEW_WIDTH = CHUNK_WIDTH // OVERVIEW_CELL_WIDTH
+OVERVIEW_HEIGHT = CHUNK_HEIGHT // OVERVIEW_CELL_HEIGHT
+
+# Lattice sampling modes, kept to measure against exact sampling (see
+# quality_report): the noise a mode interpolates, the spacing in tiles of
+# the lattice it is evaluated on, and how the tiles in between are filled
+# in. The spacing must divide both chunk dimensions, so lattices line up
+# across chunk borders.
+QUALITY_LEVELS = {
+    "high": ("elevation", 2, "cubic"),
+    "medium": ("elevation", 2, "linear"),
+    "low": ("elevation", 4, "cubic"),
+    "features": ("features", 2, "cubic"),
+}
+
+# Chunks whose lattice values a LatticeNoise keeps.
+LATTICE_CACHE_CHUNKS = 1024
+
+# Per-chunk fields of cacheable pipeline stages a TerrainGenerator keeps.
+FIELD_CACHE_ENTRIES = 1024
+
+# Gradient vectors a GradientNoise remembers before starting afresh.
+GRADIENT_CACHE_ENTRIES = 1 << 16
+
+
+def _fade(values):
+    """Vectorised version of the perlin_noise smoothing curve."""
+    return 6 * np.power(values, 5) - 15 * np.power(values, 4) + 10 * np.power(values, 3)
+
+
+class GradientNoise:
+    """
+    A NumPy gradient-noise field that reproduces `perlin_noise.PerlinNoise`
+    exactly for 2D input, but evaluates a whole grid of coordinates at once.
+
+    The grid must be separable (one list of x coordinates, one list of y
+    coordinates), which is always the case for rectangular chunks.
+    """
+
+    def __init__(self, octaves, seed):
+        """
+        Args:
+            octaves (int): The lattice frequency, as passed to PerlinNoise.
+            seed (int): The noise seed, as passed to PerlinNoise.
+        """
+        self.octaves = octaves
+        self.seed = seed
+        # Gradient vectors keyed by the lattice hash. PerlinNoise's hash maps
+        # many lattice points onto the same value, but the values still grow
+        # with the area sampled, so the memo is bounded.
+        self._gradients = {}
+
+    def _gradient(self, lattice_hash):
+        vector = self._gradients.get(lattice_hash)
+        if vector is None:
+            # Same sequence as perlin_noise's sample_vector(), but with a
+            # private generator so worker threads don't share global state.
+            rng = random.Random(self.seed * lattice_hash)
+            vector = (rng.uniform(-1, 1), rng.uniform(-1, 1))
+            self._gradients[lattice_hash] = vector
+        return vector
+
+    def _gradient_grid(self, lattice_x, lattice_y):
+        """Returns (gx, gy) arrays for the grid of lattice points `lattice_y` x `lattice_x`."""
+        hashes = np.maximum(1, np.abs(lattice_x[None, :] + 10 * lattice_y[:, None] + 1))
+
+        # The hashes of a grid span a short range of integers, so a table over
+        # that range is much cheaper than finding the unique values.
+        low = int(hashes.min())
+        if len(self._gradients) > GRADIENT_CACHE_ENTRIES:
+            self._gradients.clear()
+        table = np.array([self._gradient(h) for h in range(low, int(hashes.max()) + 1)])
+        vectors = table[hashes - low]
+        return vectors[..., 0], vectors[..., 1]
+
+    def _axis(self, coords):
+        """Lattice cell, distances and fade weights along one axis."""
+        scaled = coords * self.octaves
+        low = np.floor(scaled).astype(np.int64)
+        dist_low = scaled - low
+        dist_high = scaled - (low + 1)
+        weight_low = _fade(1 - np.abs(dist_low))
+        weight_high = _fade(1 - np.abs(dist_high))
+        return low, dist_low, dist_high, weight_low, weight_high
+
+    @staticmethod
+    def _lattice_lines(low):
+        """
+        The lattice coordinates an axis touches, and the indices into them
+        of each sample's lower and upper lattice line.
+        """
+        lines = np.unique(np.concatenate((low, low + 1)))
+        return lines, np.searchsorted(lines, low), np.searchsorted(lines, low + 1)
+
+    def sample(self, xs, ys):
+        """
+        Evaluates the noise at every (x, y) pair of the grid `ys` x `xs`.
+
+        Args:
+            xs (np.ndarray): 1D array of x coordinates.
+            ys (np.ndarray): 1D array of y coordinates.
+
+        Returns:
+            np.ndarray: Array of shape (len(ys), len(xs)) in the -0.5..0.5 range.
+        """
+        low_x, dx0, dx1, wx0, wx1 = self._axis(xs)
+        low_y, dy0, dy1, wy0, wy1 = self._axis(ys)
+
+        # Only the lattice lines next to a sample are needed, which matters
+        # when the samples are sparse (e.g. for overviews).
+        lattice_x, col0, col1 = self._lattice_lines(low_x)
+        lattice_y, row0, row1 = self._lattice_lines(low_y)
+        grad_x, grad_y = self._gradient_grid(lattice_x, lattice_y)
+        col0, col1 = col0[None, :], col1[None, :]
+        row0, row1 = row0[:, None], row1[:, None]
+
+        # Broadcast the per-axis terms into the grid.
+        dx0, dx1, wx0, wx1 = dx0[None, :], dx1[None, :], wx0[None, :], wx1[None, :]
+        dy0, dy1, wy0, wy1 = dy0[:, None], dy1[:, None], wy0[:, None], wy1[:, None]
+
+        # Corner contributions, summed in the same order as PerlinNoise so
+        # the floating-point result is bit-for-bit identical.
+        total = (wx0 * wy0) * (grad_x[row0, col0] * dx0 + grad_y[row0, col0] * dy0)
+        total = total + (wx0 * wy1) * (grad_x[row1, col0] * dx0 + grad_y[row1, col0] * dy1)
+        total = total + (wx1 * wy0) * (grad_x[row0, col1] * dx1 + grad_y[row0, col1] * dy0)
+        total = total + (wx1 * wy1) * (grad_x[row1, col1] * dx1 + grad_y[row1, col1] * dy1)
+        return total
+
+
+def _interpolation_taps(coords, origin, step, method):
+    """
+    How to interpolate samples at integer tile coordinates from a row of
+    lattice points. Cubic interpolation uses the Catmull-Rom spline over
+    the points one before to two after the sample.
+
+    Args:
+        coords (np.ndarray): Tile coordinates of the samples.
+        origin (int): Tile coordinate of the first lattice point.
+        step (int): Lattice spacing in tiles.
+        method (str): "linear" or "cubic".
+
+    Returns:
+        list: (lattice point index, weight) array pairs, one per tap.
+    """
+    offsets = coords - origin
+    cells = offsets // step
+    t = (offsets % step) / step
+    if method == "linear":
+        return [(cells, 1 - t), (cells + 1, t)]
+    return [
+        (cells - 1, ((2 - t) * t - 1) * t / 2),
+        (cells, ((3 * t - 5) * t * t + 2) / 2),
+        (cells + 1, ((4 - 3 * t) * t + 1) * t / 2),
+        (cells + 2, (t - 1) * t * t / 2),
+    ]
+
+
+class LatticeNoise:
+    """
+    Approximates a GradientNoise field by evaluating it only on a coarse
+    lattice of global tile coordinates and interpolating in between.
+
+    Lattice points lie at global multiples of the step, so neighbouring
+    chunks share the points along their common border. Each chunk's points
+    are cached once a sample needs them all, and later samples reuse them.
+    Points that aren't cached are evaluated in one pass, since every pass
+    over the noise has a fixed cost that dwarfs a few hundred points.
+    """
+
+    def __init__(self, noise, scale, step, method, cache_chunks=LATTICE_CACHE_CHUNKS):
+        """
+        Args:
+            noise (GradientNoise): The exact field.
+            scale (float): Noise coordinates per tile.
+            step (int): Lattice spacing in tiles. Must divide CHUNK_WIDTH
+                        and CHUNK_HEIGHT.
+            method (str): "linear" or "cubic" interpolation.
+            cache_chunks (int): Most chunks of lattice points kept.
+        """
+        if CHUNK_WIDTH % step or CHUNK_HEIGHT % step:
+            raise ValueError(f"lattice step {step} must divide the chunk size")
+        self.noise = noise
+        self.scale = scale
+        self.step = step
+        self.method = method
+        self.cache_chunks = cache_chunks
+        self.chunk_columns = CHUNK_WIDTH // step
+        self.chunk_rows = CHUNK_HEIGHT // step
+        self._blocks = OrderedDict()
+        self._lock = threading.Lock()  # Chunks are generated on several threads.
+        self.evaluated = 0  # Lattice points computed, for measuring reuse.
+
+    def _evaluate(self, columns, rows):
+        """The noise at a rectangle of lattice points, given by inclusive lattice index ranges."""
+        xs = np.arange(columns[0], columns[1] + 1) * (self.step * self.scale)
+        ys = np.arange(rows[0], rows[1] + 1) * (self.step * self.scale)
+        values = self.noise.sample(xs, ys)
+        with self._lock:
+            self.evaluated += values.size
+        return values
+
+    @staticmethod
+    def _spans(first, last, size):
+        """Splits a lattice index range at chunk borders into (chunk, (first, last)) pieces."""
+        return [(chunk, (max(first, chunk * size), min(last, (chunk + 1) * size - 1)))
+                for chunk in range(first // size, last // size + 1)]
+
+    def sample(self, global_xs, global_ys):
+        """
+        Approximates the noise at every tile of the grid `global_ys` x
+        `global_xs`, both ascending arrays of global tile coordinates.
+
+        Returns:
+            np.ndarray: Array of shape (len(global_ys), len(global_xs)).
+        """
+        step = self.step
+        # The lattice points around the samples: cubic interpolation reaches
+        # one point back and two ahead.
+        first_column, last_column = int(global_xs[0]) // step - 1, int(global_xs[-1]) // step + 2
+        first_row, last_row = int(global_ys[0]) // step - 1, int(global_ys[-1]) // step + 2
+        column_spans = self._spans(first_column, last_column, self.chunk_columns)
+        row_spans = self._spans(first_row, last_row, self.chunk_rows)
+
+        pieces = {}
+        missing = []
+        with self._lock:
+            for chunk_y, rows in row_spans:
+                for chunk_x, columns in column_spans:
+                    block = self._blocks.get((chunk_x, chunk_y))
+                    if block is None:
+                        missing.append((chunk_x, chunk_y, columns, rows))
+                        continue
+                    self._blocks.move_to_end((chunk_x, chunk_y))
+                    top, left = chunk_y * self.chunk_rows, chunk_x * self.chunk_columns
+                    pieces[(chunk_x, chunk_y)] = block[rows[0] - top:rows[1] - top + 1,
+                                                       columns[0] - left:columns[1] - left + 1]
+
+        if missing:
+            left = min(columns[0] for _, _, columns, _ in missing)
+            top = min(rows[0] for _, _, _, rows in missing)
+            values = self._evaluate((left, max(columns[1] for _, _, columns, _ in missing)),
+                                    (top, max(rows[1] for _, _, _, rows in missing)))
+            with self._lock:
+                for chunk_x, chunk_y, columns, rows in missing:
+                    piece = values[rows[0] - top:rows[1] - top + 1, columns[0] - left:columns[1] - left + 1]
+                    pieces[(chunk_x, chunk_y)] = piece
+                    if piece.shape == (self.chunk_rows, self.chunk_columns):
+                        self._blocks[(chunk_x, chunk_y)] = piece.copy()
+                while len(self._blocks) > self.cache_chunks:
+                    self._blocks.popitem(last=False)
+
+        lattice = np.concatenate([
+            np.concatenate([pieces[(chunk_x, chunk_y)] for chunk_x, _ in column_spans], axis=1)
+            for chunk_y, _ in row_spans
+        ])
+
+        # Interpolation is separable: along x, then along y. The taps are
+        # summed in a fixed order, so a tile comes out the same whichever
+        # rectangle it was sampled in.
+        across = None
+        for columns, weights in _interpolation_taps(global_xs, first_column * step, step, self.method):
+            term = lattice[:, columns] * weights
+            across = term if across is None else across + term
+        total = None
+        for rows, weights in _interpolation_taps(global_ys, first_row * step, step, self.method):
+            term = across[rows, :] * weights[:, None]
+            total = term if total is None else total + term
+        return total
+
+
+class TerrainGrid:
+    """
+    The tiles a pipeline run covers: a grid of global tile coordinates,
+    and the chunks it is made of if it is a block of whole chunks.
+    """
+
+    def __init__(self, global_xs, global_ys, chunks=None):
+        """
+        Args:
+            global_xs (np.ndarray): 1D array of global x tile coordinates.
+            global_ys (np.ndarray): 1D array of global y tile coordinates.
+            chunks (tuple, optional): (chunk_x, chunk_y, columns, rows) of
+                                      the block the grid covers tile for tile.
+        """
+        self.global_xs = global_xs
+        self.global_ys = global_ys
+        self.chunks = chunks
+
+    def chunk_keys(self):
+        """The chunks of a block grid with the slices of the grid they cover."""
+        chunk_x, chunk_y, columns, rows = self.chunks
+        return [((chunk_x + c, chunk_y + r),
+                 (slice(r * CHUNK_HEIGHT, (r + 1) * CHUNK_HEIGHT), slice(c * CHUNK_WIDTH, (c + 1) * CHUNK_WIDTH)))
+                for r in range(rows) for c in range(columns)]
+
+
+class TerrainStage(abc.ABC):
+    """
+    One step of the terrain pipeline. A stage reads the fields of earlier
+    stages named in `requires` and returns a new array over the same grid,
+    which later stages know by the stage's `name`. Stages never change
+    their inputs, so any field can be cached and shared.
+    """
+
+    name = None
+    requires = ()
+    # Whether the field is worth keeping per chunk, so that changing a later
+    # stage doesn't compute it again.
+    cacheable = False
+
+    def __str__(self):
+        """How TerrainGenerator.pipeline() names the stage."""
+        return self.name
+
+    @abc.abstractmethod
+    def run(self, generator, grid, inputs):
+        """
+        Args:
+            generator (TerrainGenerator): Holds the seed's noise fields.
+            grid (TerrainGrid): The tiles to compute.
+            inputs (dict): The required fields, by name.
+
+        Returns:
+            np.ndarray: The field, shape (len(grid.global_ys), len(grid.global_xs)).
+        """
+
+
+class _NoiseStage(TerrainStage):
+    """A stage sampling one of the generator's noise fields at every tile."""
+
+    cacheable = True
+
+    def __init__(self, lattice=None):
+        """
+        Args:
+            lattice (tuple, optional): (step, method) to interpolate the noise
+                                       from a lattice (see LatticeNoise)
+                                       instead of sampling it exactly.
+        """
+        self.lattice = lattice
+        self._lattices = {}  # (octaves, seed) -> LatticeNoise of that field
+
+    def __str__(self):
+        if self.lattice is None:
+            return self.name
+        return f"{self.name} ({self.lattice[1]} lattice of {self.lattice[0]} tiles)"
+
+    def _sample(self, noise, scale, grid):
+        if self.lattice is None:
+            return noise.sample(grid.global_xs * scale, grid.global_ys * scale)
+        lattice = self._lattices.get((noise.octaves, noise.seed))
+        if lattice is None:
+            lattice = self._lattices.setdefault((noise.octaves, noise.seed),
+                                                LatticeNoise(noise, scale, *self.lattice))
+        return lattice.sample(grid.global_xs, grid.global_ys)
+
+
+class ElevationStage(_NoiseStage):
+    """The base noise, shifted to a 0.0 to 1.0 range for easier use with thresholds."""
+
+    name = "elevation"
+
+    def run(self, generator, grid, inputs):
+        return self._sample(generator.noise, SCALE, grid) + 0.5
+
+
+class BiomeStage(TerrainStage):
+    """Water in the lows, rocks on the highs and grassland in between."""
+
+    name = "biome"
+    requires = ("elevation",)
+
+    def run(self, generator, grid, inputs):
+        elevation = inputs["elevation"]
+        codes = np.full(elevation.shape, Tile.ROCK, dtype=TILE_DTYPE)
+        codes[elevation < 0.65] = Tile.EMPTY
+        codes[elevation < 0.35] = Tile.WATER
+        return codes
+
+
+class FeatureStage(_NoiseStage):
+    """Bushes scattered over the grassland by the finer feature noise."""
+
+    name = "features"
+    requires = ("biome",)
+
+    def run(self, generator, grid, inputs):
+        biome = inputs["biome"]
+        feature_val = self._sample(generator.feature_noise, SCALE * 2, grid) + 0.5
+        codes = biome.copy()
+        codes[(biome == Tile.EMPTY) & (feature_val > 0.8)] = Tile.BUSH
+        return codes
+
+
+class BorderStage(TerrainStage):
+    """
+    Walls around every chunk to contain the player, if the generator has
+    borders. Only grids of whole chunks have chunk edges to wall in.
+    """
+
+    name = "borders"
+
+    def __init__(self, source="features"):
+        """
+        Args:
+            source (str): The stage whose tiles get the walls.
+        """
+        self.requires = (source,)
+
+    def run(self, generator, grid, inputs):
+        codes = inputs[self.requires[0]]
+        if not generator.borders or grid.chunks is None:
+            return codes
+        local_xs = grid.global_xs % CHUNK_WIDTH
+        local_ys = grid.global_ys % CHUNK_HEIGHT
+        edges = ((local_ys == 0) | (local_ys == CHUNK_HEIGHT - 1))[:, None] \
+            | ((local_xs == 0) | (local_xs == CHUNK_WIDTH - 1))[None, :]
+        return np.where(edges, TILE_DTYPE(Tile.WALL), codes)
+
+
+def default_stages():
+    """The stages of the game's terrain, in order. The last one yields the tiles."""
+    return [ElevationStage(), BiomeStage(), FeatureStage(), BorderStage()]
+
+
+def lattice_stages(quality):
+    """The game's terrain with one noise field sampled at a level of QUALITY_LEVELS."""
+    field, step, method = QUALITY_LEVELS[quality]
+    elevation = ElevationStage(lattice=(step, method) if field == "elevation" else None)
+    features = FeatureStage(lattice=(step, method) if field == "features" else None)
+    return [elevation, BiomeStage(), features, BorderStage()]
+
+
+class TerrainGenerator:
+    """
+    Generates chunk terrain for a world seed using array operations.
+
+    Noise is sampled at global tile coordinates, so chunks line up seamlessly
+    and a block of chunks can be generated in one pass.
+    """
+
+    def __init__(self, seed, borders=True, stages=None):
+        """
+        Args:
+            seed (int): The world seed.
+            borders (bool): Surround every chunk with walls. Worlds viewed
+                            through the scrolling camera are borderless.
+            stages (list, optional): The TerrainStage pipeline. Defaults to
+                                     default_stages().
+        """
+        self.seed = seed
+        self.borders = borders
+        self.noise = GradientNoise(octaves=4, seed=seed)
+        self.feature_noise = GradientNoise(octaves=8, seed=seed + 1)
+
+        # Fields of cacheable stages, keyed by (stage name, chunk).
+        self._fields = OrderedDict()
+        self._lock = threading.Lock()  # Chunks are generated on several threads.
+        self._timings = {}
+        self.stages = []
+        self.set_stages(default_stages() if stages is None else stages)
+        # Terrain of any other pipeline can't be regenerated from the seed
+        # alone, e.g. to compare a save's changes against.
+        self.custom = stages is not None
+
+    def set_stages(self, stages):
+        """
+        Replaces the pipeline. Cached fields stay valid for the stages that
+        are kept, as long as everything they were computed from is kept too:
+        adding a stage after the elevation doesn't recompute the elevation.
+
+        Args:
+            stages (list): TerrainStage objects in order. Each may only
+                           require stages before it.
+        """
+        names = set()
+        for stage in stages:
+            missing = [name for name in stage.requires if name not in names]
+            if missing or stage.name in names:
+                raise ValueError(f"stage '{stage.name}' must come after {missing} and have a unique name")
+            names.add(stage.name)
+
+        previous = {stage.name: stage for stage in self.stages}
+        kept = set()
+        for stage in stages:
+            if previous.get(stage.name) is stage and all(name in kept for name in stage.requires):
+                kept.add(stage.name)
+        with self._lock:
+            self.stages = list(stages)
+            self.custom = True
+            for key in [key for key in self._fields if key[0] not in kept]:
+                del self._fields[key]
+
+    def pipeline(self):
+        """The stage names of a custom pipeline, or None for the game's terrain."""
+        return [str(stage) for stage in self.stages] if self.custom else None
+
+    def stage_stats(self):
+        """
+        Where generation time goes.
+
+        Returns:
+            dict: {stage name: {"runs", "cached", "total_ms", "mean_ms"}}
+                  in pipeline order. "cached" counts the runs saved by the
+                  field cache.
+        """
+        with self._lock:
+            stats = {}
+            for stage in self.stages:
+                runs, cached, seconds = self._timings.get(stage.name, (0, 0, 0.0))
+                stats[stage.name] = {
+                    "runs": runs,
+                    "cached": cached,
+                    "total_ms": seconds * 1000.0,
+                    "mean_ms": seconds * 1000.0 / runs if runs else 0.0,
+                }
+            return stats
+
+    def _count(self, name, runs=0, cached=0, seconds=0.0):
+        with self._lock:
+            old_runs, old_cached, old_seconds = self._timings.get(name, (0, 0, 0.0))
+            self._timings[name] = (old_runs + runs, old_cached + cached, old_seconds + seconds)
+
+    def _cached_field(self, stage, grid):
+        """A stage's field over a block grid, if every chunk of it is cached."""
+        with self._lock:
+            pieces = []
+            for key, _ in grid.chunk_keys():
+                piece = self._fields.get((stage.name, key))
+                if piece is None:
+                    return None
+                self._fields.move_to_end((stage.name, key))
+                pieces.append(piece)
+        columns, rows = grid.chunks[2:]
+        return np.concatenate([np.concatenate(pieces[r * columns:(r + 1) * columns], axis=1)
+                               for r in range(rows)])
+
+    def _cache_field(self, stage, grid, field):
+        with self._lock:
+            for key, (rows, columns) in grid.chunk_keys():
+                self._fields[(stage.name, key)] = field[rows, columns].copy()
+            while len(self._fields) > FIELD_CACHE_ENTRIES:
+                self._fields.popitem(last=False)
+
+    def run_pipeline(self, grid):
+        """
+        Runs the stages over a grid. Only the stages the last one depends
+        on run, and none whose field is cached for every chunk of the grid.
+
+        Returns:
+            np.ndarray: The last stage's field.
+        """
+        caching = grid.chunks is not None
+        fields = {}
+        needed = {self.stages[-1].name}
+        plan = []
+        for stage in reversed(self.stages):
+            if stage.name not in needed:
+                continue
+            field = self._cached_field(stage, grid) if caching and stage.cacheable else None
+            if field is not None:
+                fields[stage.name] = field
+                self._count(stage.name, cached=1)
+            else:
+                needed.update(stage.requires)
+                plan.append(stage)
+
+        for stage in reversed(plan):
+            start = time.perf_counter()
+            field = stage.run(self, grid, {name: fields[name] for name in stage.requires})
+            self._count(stage.name, runs=1, seconds=time.perf_counter() - start)
+            fields[stage.name] = field
+            if caching and stage.cacheable:
+                self._cache_field(stage, grid, field)
+        return fields[self.stages[-1].name]
+
+    def classify(self, global_xs, global_ys):
+        """
+        Builds an array of tile codes for a grid of global tile coordinates,
+        such as a sparse grid of sample points. Chunk border walls are left
+        out, and nothing is cached.
+
+        Args:
+            global_xs (np.ndarray): 1D array of global x tile coordinates.
+            global_ys (np.ndarray): 1D array of global y tile coordinates.
+
+        Returns:
+            np.ndarray: Array of Tile codes, shape (len(ys), len(xs)).
+        """
+        return self.run_pipeline(TerrainGrid(global_xs, global_ys))
+
+    def generate(self, chunk_x, chunk_y):
+        """Returns the tile array for a single chunk, border walls included."""
+        return self.generate_block(chunk_x, chunk_y, 1, 1)[(chunk_x, chunk_y)]
+
+    def generate_block(self, chunk_x, chunk_y, columns, rows):
+        """
+        Generates a rectangular block of chunks with one noise evaluation.
+
+        Args:
+            chunk_x (int): The x-coordinate of the top-left chunk.
+            chunk_y (int): The y-coordinate of the top-left chunk.
+            columns (int): Number of chunks across.
+            rows (int): Number of chunks down.
+
+        Returns:
+            dict: Tile arrays keyed by (chunk_x, chunk_y).
+        """
+        global_xs = np.arange(chunk_x * CHUNK_WIDTH, (chunk_x + columns) * CHUNK_WIDTH)
+        global_ys = np.arange(chunk_y * CHUNK_HEIGHT, (chunk_y + rows) * CHUNK_HEIGHT)
+        grid = TerrainGrid(global_xs, global_ys, chunks=(chunk_x, chunk_y, columns, rows))
+        block = self.run_pipeline(grid)
+        return {key: block[rows, columns].copy() for key, (rows, columns) in grid.chunk_keys()}
+
+    def overview_block(self, chunk_x, chunk_y, columns, rows):
+        """
+        Generates low-resolution overviews for a rectangular block of chunks.
+
+        Each overview cell stands for OVERVIEW_CELL_WIDTH x OVERVIEW_CELL_HEIGHT
+        tiles and holds the tile at the cell's centre, read straight from the
+        noise field. That is one sample per cell instead of one per tile, and
+        the cell always agrees with the full chunk at that tile. Border walls
+        are left out, as they say nothing about the terrain.
+
+        Args:
+            chunk_x (int): The x-coordinate of the top-left chunk.
+            chunk_y (int): The y-coordinate of the top-left chunk.
+            columns (int): Number of chunks across.
+            rows (int): Number of chunks down.
+
+        Returns:
+            dict: Arrays of Tile codes of shape (OVERVIEW_HEIGHT, OVERVIEW_WIDTH),
+                  keyed by (chunk_x, chunk_y).
+        """
+        global_xs = np.arange(chunk_x * CHUNK_WIDTH, (chunk_x + columns) * CHUNK_WIDTH,
+                              OVERVIEW_CELL_WIDTH) + OVERVIEW_CELL_WIDTH // 2
+        global_ys = np.arange(chunk_y * CHUNK_HEIGHT, (chunk_y + rows) * CHUNK_HEIGHT,
+                              OVERVIEW_CELL_HEIGHT) + OVERVIEW_CELL_HEIGHT // 2
+        block = self.classify(global_xs, global_ys)
+
+        overviews = {}
+        for r in range(rows):
+            for c in range(columns):
+                overviews[(chunk_x + c, chunk_y + r)] = block[
+                    r * OVERVIEW_HEIGHT:(r + 1) * OVERVIEW_HEIGHT,
+                    c * OVERVIEW_WIDTH:(c + 1) * OVERVIEW_WIDTH].copy()
+        return overviews
+
+
+def quality_report(seed, chunk_x=0, chunk_y=0, columns=8, rows=8):
+    """
+    Measures every lattice sampling mode of QUALITY_LEVELS against exact
+    sampling over a rectangle of chunks: how much the noise and the tiles
+    differ, and how fast chunks are generated one at a time (walking along
+    each row, so neighbours share lattice points) and in 4x4 blocks.
+
+    The game samples exactly: a chunk's time goes into looking up gradient
+    vectors for its lattice cells and into the 8-octave feature noise. An
+    elevation lattice saves neither, and the feature noise changes by most
+    of its range from one tile to the next, so a lattice of it is fast but
+    wrong. This report is how to check that again when the noise changes.
+
+    Returns:
+        dict: {quality: {"tile_mismatch", "noise_rms_error",
+              "noise_max_error", "chunks_per_second",
+              "block_chunks_per_second"}}, with "exact" first. Errors are
+              in noise units; the noise spans about -0.5 to 0.5.
+    """
+    exact = TerrainGenerator(seed, borders=False)
+    reference = exact.generate_block(chunk_x, chunk_y, columns, rows)
+    global_xs = np.arange(chunk_x * CHUNK_WIDTH, (chunk_x + columns) * CHUNK_WIDTH)
+    global_ys = np.arange(chunk_y * CHUNK_HEIGHT, (chunk_y + rows) * CHUNK_HEIGHT)
+    grid = TerrainGrid(global_xs, global_ys)
+
+    report = {}
+    for quality in ("exact",) + tuple(QUALITY_LEVELS):
+        stages = default_stages if quality == "exact" else lambda: lattice_stages(quality)
+        generator = TerrainGenerator(seed, borders=False, stages=stages())
+        generator.generate(chunk_x - 1000, chunk_y)  # Warm up NumPy.
+        start = time.perf_counter()
+        chunks = {(x, y): generator.generate(x, y)
+                  for y in range(chunk_y, chunk_y + rows) for x in range(chunk_x, chunk_x + columns)}
+        per_chunk = len(chunks) / (time.perf_counter() - start)
+
+        generator = TerrainGenerator(seed, borders=False, stages=stages())
+        start = time.perf_counter()
+        for block_y in range(chunk_y, chunk_y + rows, 4):
+            for block_x in range(chunk_x, chunk_x + columns, 4):
+                generator.generate_block(block_x, block_y, 4, 4)
+        per_block = columns * rows / (time.perf_counter() - start)
+
+        # The error of the field the mode interpolates.
+        field = "elevation" if quality == "exact" else QUALITY_LEVELS[quality][0]
+        stage = next(stage for stage in generator.stages if stage.name == field)
+        noise, scale = (exact.feature_noise, SCALE * 2) if field == "features" else (exact.noise, SCALE)
+        error = stage._sample(noise, scale, grid) - noise.sample(global_xs * scale, global_ys * scale)
+        mismatched = sum(int(np.count_nonzero(chunks[key] != reference[key])) for key in reference)
+        report[quality] = {
+            "tile_mismatch": mismatched / (len(reference) * CHUNK_WIDTH * CHUNK_HEIGHT),
+            "noise_rms_error": float(np.sqrt(np.mean(error ** 2))),
+            "noise_max_error": float(np.abs(error).max()),
+            "chunks_per_second": per_chunk,
+            "block_chunks_per_second": per_block,
+        }
+    return report
+
+
+# Generators built by generate_chunks(), one per (seed, borders) in each
+# process. They only cache noise values, never chunk output.
+_generators = {}
+
+
+def generate_chunks(seed, chunk_x, chunk_y, columns=1, rows=1, borders=True):
+    """
+    Generates a block of chunks as a pure function of the seed and chunk
+    coordinates. There is no global random state involved, so any process
+    calling this with the same arguments gets byte-identical arrays, which
+    is what lets world generation be split across a process pool.
+
+    Returns:
+        dict: Tile arrays keyed by (chunk_x, chunk_y), as generate_block().
+    """
+    key = (seed, borders)
+    generator = _generators.get(key)
+    if generator is None:
+        generator = _generators[key] = TerrainGenerator(seed, borders=borders)
+    return generator.generate_block(chunk_x, chunk_y, columns, rows)
+
+
+def reference_chunk(noise, feature_noise, chunk_x, chunk_y):
+    """
+    The original per-tile generator, kept as the correctness and speed
+    baseline for TerrainGenerator. Returns rows of ascii_art characters.
+
+    Args:
+        noise (PerlinNoise): The base elevation noise (4 octaves).
+        feature_noise (PerlinNoise): The feature noise (8 octaves).
+    """
+    chunk_data = [[EMPTY for _ in range(CHUNK_WIDTH)] for _ in range(CHUNK_HEIGHT)]
+
+    for y in range(CHUNK_HEIGHT):
+        for x in range(CHUNK_WIDTH):
+            global_x = (chunk_x * CHUNK_WIDTH) + x
+            global_y = (chunk_y * CHUNK_HEIGHT) + y
+
+            noise_val = noise([global_x * SCALE, global_y * SCALE]) + 0.5
+            if noise_val < 0.35:
+                chunk_data[y][x] = WATER
+            elif noise_val < 0.65:
+                feature_val = feature_noise([global_x * SCALE * 2, global_y * SCALE * 2]) + 0.5
+                chunk_data[y][x] = BUSH if feature_val > 0.8 else EMPTY
+            else:
+                chunk_data[y][x] = ROCK
+
+    for x in range(CHUNK_WIDTH):
+        chunk_data[0][x] = WALL
+        chunk_data[CHUNK_HEIGHT - 1][x] = WALL
+    for y in range(CHUNK_HEIGHT):
+        chunk_data[y][0] = WALL
+        chunk_data[y][CHUNK_WIDTH - 1] = WALL
+
+    return chunk_data
+
+
+# This block checks the vectorised generator against the original one and
+# benchmarks the two.
+if __name__ == '__main__':
+    from perlin_noise import PerlinNoise
+    from tiles import to_glyph_lists
+
+    print("--- Testing Vectorised Terrain Generation ---")
+    coords = [(0, 0), (1, 0), (-1, -1), (3, -2), (-5, 7)]
+    for seed in (123, 4242, 99999):
+        generator = TerrainGenerator(seed)
+        noise = PerlinNoise(octaves=4, seed=seed)
+        feature_noise = PerlinNoise(octaves=8, seed=seed + 1)
+        for chunk_x, chunk_y in coords:
+            expected = reference_chunk(noise, feature_noise, chunk_x, chunk_y)
+            actual = to_glyph_lists(generator.generate(chunk_x, chunk_y))
+            assert actual == expected, (seed, chunk_x, chunk_y)
+
+        # A block must match the chunks generated one by one.
+        block = generator.generate_block(-1, -1, 3, 2)
+        for (chunk_x, chunk_y), codes in block.items():
+            assert np.array_equal(codes, generator.generate(chunk_x, chunk_y))
+
+        # Overview cells are the full chunk's tiles at the cell centres.
+        for (chunk_x, chunk_y), overview in generator.overview_block(-2, 1, 3, 2).items():
+            full = TerrainGenerator(seed, borders=False).generate(chunk_x, chunk_y)
+            assert np.array_equal(overview, full[OVERVIEW_CELL_HEIGHT // 2::OVERVIEW_CELL_HEIGHT,
+                                                 OVERVIEW_CELL_WIDTH // 2::OVERVIEW_CELL_WIDTH])
+    print("Output matches the per-tile generator.")
+
+    print("\n--- Benchmark (chunks per second) ---")
+    seed = 123
+    noise = PerlinNoise(octaves=4, seed=seed)
+    feature_noise = PerlinNoise(octaves=8, seed=seed + 1)
+    start = time.perf_counter()
+    count = 5
+    for i in range(count):
+        reference_chunk(noise, feature_noise, 100 + i, 0)
+    reference_rate = count / (time.perf_counter() - start)
+    print(f"  Per-tile PerlinNoise:   {reference_rate:10.1f} chunks/s")
+
+    generator = TerrainGenerator(seed)
+    start = time.perf_counter()
+    count = 200
+    for i in range(count):
+        generator.generate(100 + i, 0)
+    vector_rate = count / (time.perf_counter() - start)
+    print(f"  Vectorised per chunk:   {vector_rate:10.1f} chunks/s")
+
+    generator = TerrainGenerator(seed)
+    start = time.perf_counter()
+    blocks = 20
+    for i in range(blocks):
+        generator.generate_block(100 + i * 4, 0, 4, 4)
+    block_rate = blocks * 16 / (time.perf_counter() - start)
+    print(f"  Vectorised 4x4 blocks:  {block_rate:10.1f} chunks/s")
+    generator = TerrainGenerator(seed)
+    start = time.perf_counter()
+    blocks = 20
+    for i in range(blocks):
+        generator.overview_block(100 + i * 16, 0, 16, 16)
+    overview_rate = blocks * 256 / (time.perf_counter() - start)
+    print(f"  Overviews, 16x16 blocks: {overview_rate:9.1f} chunks/s")
+
+    print(f"\nSpeed-up: {vector_rate / reference_rate:.0f}x per chunk, "
+          f"{block_rate / reference_rate:.0f}x in blocks")
+
+    print("\n--- Lattice sampling against exact sampling (8x8 chunks) ---")
+    # Interpolated terrain must still line up across chunk borders, and a
+    # block must match its chunks, whatever the order they are made in.
+    for quality in QUALITY_LEVELS:
+        block = TerrainGenerator(seed, borders=False, stages=lattice_stages(quality)).generate_block(-2, -2, 4, 3)
+        single = TerrainGenerator(seed, borders=False, stages=lattice_stages(quality))
+        for (chunk_x, chunk_y) in sorted(block, reverse=True):
+            assert np.array_equal(block[(chunk_x, chunk_y)], single.generate(chunk_x, chunk_y)), quality
+    print("  Interpolated chunks are seamless and independent of generation order.")
+    print(f"  {'quality':8s} {'tiles off':>9s} {'rms err':>8s} {'max err':>8s} "
+          f"{'chunks/s':>9s} {'blocks':>9s}")
+    for quality, stats in quality_report(seed, 100, 0).items():
+        print(f"  {quality:8s} {stats['tile_mismatch'] * 100:8.2f}% {stats['noise_rms_error']:8.4f} "
+              f"{stats['noise_max_error']:8.4f} {stats['chunks_per_second']:9.1f} "
+              f"{stats['block_chunks_per_second']:9.1f}")
+    assert str(lattice_stages("low")[0]) == "elevation (cubic lattice of 4 tiles)"
+
+    print("\n--- Generation pipeline ---")
+    generator = TerrainGenerator(seed, borders=False)
+    for i in range(64):
+        generator.generate(200 + i, 0)
+    for name, stats in generator.stage_stats().items():
+        print(f"  {name:10s} {stats['runs']:4d} runs  {stats['mean_ms']:7.3f} ms/run  {stats['total_ms']:8.1f} ms")
+
+    # A stage added after the features reuses the cached elevation and
+    # features: only it and the borders run for chunks seen before.
+    class _SummitStage(TerrainStage):
+        name = "summits"
+        requires = ("elevation", "features")
+
+        def run(self, generator, grid, inputs):
+            return np.where(inputs["elevation"] > 0.8, TILE_DTYPE(Tile.WALL), inputs["features"])
+
+    before = generator.stage_stats()
+    generator.set_stages(generator.stages[:3] + [_SummitStage(), BorderStage(source="summits")])
+    chunk = generator.generate(200, 0)
+    after = generator.stage_stats()
+    assert after["elevation"]["runs"] == before["elevation"]["runs"]
+    assert after["features"]["runs"] == before["features"]["runs"]
+    assert after["summits"]["runs"] == 1
+    expected = TerrainGenerator(seed, borders=False).generate(200, 0)
+    elevation = generator.noise.sample(np.arange(200 * CHUNK_WIDTH, 201 * CHUNK_WIDTH) * SCALE,
+                                       np.arange(CHUNK_HEIGHT) * SCALE) + 0.5
+    assert np.array_equal(chunk, np.where(elevation > 0.8, Tile.WALL, expected))
+    print("  An added stage reuses the cached elevation and features.")
+    assert TerrainGenerator(seed).pipeline() is None
+    assert generator.pipeline() == ["elevation", "biome", "features", "summits", "borders"]
+    try:
+        TerrainStage()
+    except TypeError:
+        pass
+    else:
+        raise AssertionError("a stage without run() must not be created")
@@ -0,0 +1,97 @@
+from enum import IntEnum
+
+import numpy as np
+
+# Import the visual assets from the central art repository.
+from ascii_art import ROCK, BUSH, WALL, EMPTY, WATER
+
+
+class Tile(IntEnum):
+    """
+    Compact tile codes. Chunks store one of these per cell in a uint8 array,
+    and the ascii_art glyphs are only looked up when a row is drawn.
+    """
+    EMPTY = 0
+    WATER = 1
+    BUSH = 2
+    ROCK = 3
+    WALL = 4
+
+
+# The glyph drawn for each tile code.
+GLYPHS = {
+    Tile.EMPTY: EMPTY,
+    Tile.WATER: WATER,
+    Tile.BUSH: BUSH,
+    Tile.ROCK: ROCK,
+    Tile.WALL: WALL,
+}
+
+# The colour of each tile code in exported images (see export.py).
+COLORS = {
+    Tile.EMPTY: (112, 160, 64),
+    Tile.WATER: (40, 96, 176),
+    Tile.BUSH: (40, 104, 32),
+    Tile.ROCK: (136, 136, 128),
+    Tile.WALL: (72, 48, 32),
+}
+
+# Reverse lookup, for turning text (e.g. old saves) back into tiles.
+TILE_OF_GLYPH = {glyph: tile for tile, glyph in GLYPHS.items()}
+
+# A bytes.translate() table from tile code to glyph byte. Unknown codes
+# show up as '?' rather than garbage.
+GLYPH_TABLE = bytearray(b"?" * 256)
+for _tile, _glyph in GLYPHS.items():
+    GLYPH_TABLE[_tile] = ord(_glyph)
+GLYPH_TABLE = bytes(GLYPH_TABLE)
+
+# The dtype used for chunk arrays.
+TILE_DTYPE = np.uint8
+
+# Whether the player can stand on each tile code, indexable by a whole
+# chunk array at once (WALKABLE[chunk]).
+WALKABLE = np.zeros(256, dtype=bool)
+for _tile in Tile:
+    WALKABLE[_tile] = _tile != Tile.WALL
+
+# Whether each tile code blocks line of sight (see fov.py).
+OPAQUE = np.zeros(256, dtype=bool)
+OPAQUE[[Tile.WALL, Tile.ROCK]] = True
+
+
+def glyph_row(row):
+    """
+    Turns one row of tile codes (a zero-copy view such as `chunk[y]`)
+    into the string that is drawn for it.
+    """
+    return row.tobytes().translate(GLYPH_TABLE).decode("ascii")
+
+
+def to_glyph_lists(chunk):
+    """Converts a chunk to the old rows-of-characters form."""
+    return [list(glyph_row(row)) for row in chunk]
+
+
+def from_glyph_lists(rows):
+    """Converts rows of ascii_art characters to a chunk array."""
+    return np.array([[TILE_OF_GLYPH[glyph] for glyph in row] for row in rows], dtype=TILE_DTYPE)
+
+
+# This block measures the memory saved by the compact representation.
+if __name__ == '__main__':
+    import sys
+    from terrain import TerrainGenerator
+
+    print("--- Testing Compact Tiles ---")
+    chunk = TerrainGenerator(123).generate(0, 0)
+    rows = to_glyph_lists(chunk)
+    assert np.array_equal(from_glyph_lists(rows), chunk)
+    assert all(glyph_row(row) == "".join(glyph_list) for row, glyph_list in zip(chunk, rows))
+    assert np.shares_memory(chunk[3], chunk)
+
+    list_size = sys.getsizeof(rows) + sum(sys.getsizeof(row) for row in rows)
+    array_size = sys.getsizeof(chunk)
+    print(f"Rows of characters: {list_size:6d} bytes per chunk")
+    print(f"uint8 tile array:   {array_size:6d} bytes per chunk")
+    print(f"Reduction: {list_size / array_size:.1f}x")
@@ -1,10 +1,16 @@
+import hashlib
+import json
 import os
 import sys
 import subprocess
 
 # --- Configuration ---
 VENV_DIR = ".venv"
-REQUIREMENTS = ["blessed", "perlin_noise"]
+REQUIREMENTS = ["blessed", "perlin_noise", "numpy"]
+
+# The result of the last validation, with a fingerprint of the venv it was
+# made for. It lives inside the venv, so it goes when the venv does.
+CACHE_FILE = os.path.join(VENV_DIR, "validation.json")
 
 # Determine the correct path for the venv Python executable
 if sys.platform == "win32":
@@ -12,42 +18,118 @@ if sys.platform == "win32":
 else:
     VENV_PYTHON = os.path.join(VENV_DIR, "bin", "python")
 
+# Finds the requirements' import specs without importing them, all in
+# one interpreter.
+_FIND_SPECS = ("import importlib.util, json, sys; "
+               "print(json.dumps([n for n in sys.argv[1:] if importlib.util.find_spec(n) is None]))")
+
+def venv_version():
+    """Returns the venv's Python version as (major, minor), or None."""
+    try:
+        with open(os.path.join(VENV_DIR, "pyvenv.cfg"), "r", encoding="utf-8") as fh:
+            for line in fh:
+                name, _, value = line.partition("=")
+                if name.strip() in ("version", "version_info"):
+                    return tuple(int(part) for part in value.strip().split(".")[:2])
+    except (OSError, ValueError):
+        pass
+    return None
+
+def venv_site_packages():
+    """Returns the venv's site-packages directory, or None."""
+    if sys.platform == "win32":
+        path = os.path.join(VENV_DIR, "Lib", "site-packages")
+    else:
+        version = venv_version()
+        if version is None:
+            return None
+        path = os.path.join(VENV_DIR, "lib", f"python{version[0]}.{version[1]}", "site-packages")
+    return path if os.path.isdir(path) else None
+
+def venv_fingerprint():
+    """
+    A hash of what is installed in the venv: every entry of site-packages
+    with its modification time. Installing or removing a package changes it.
+    """
+    digest = hashlib.sha1(json.dumps(REQUIREMENTS).encode("utf-8"))
+    for path in (os.path.join(VENV_DIR, "pyvenv.cfg"), VENV_PYTHON):
+        if os.path.exists(path):
+            digest.update(f"{path}:{os.stat(path).st_mtime_ns}".encode("utf-8"))
+    site_packages = venv_site_packages()
+    if site_packages is not None:
+        for entry in sorted(os.scandir(site_packages), key=lambda entry: entry.name):
+            digest.update(f"{entry.name}:{entry.stat().st_mtime_ns}".encode("utf-8"))
+    return digest.hexdigest()
+
+def find_missing():
+    """
+    Returns the requirements the venv can't import, found from their
+    import specs in a single venv interpreter.
+    """
+    result = subprocess.run([VENV_PYTHON, "-c", _FIND_SPECS, *REQUIREMENTS],
+                            check=True, capture_output=True, text=True)
+    return json.loads(result.stdout)
+
+def validate(use_cache=True):
+    """
+    Checks the venv and its packages.
+
+    Args:
+        use_cache (bool): Trust the last result if the venv hasn't changed.
+
+    Returns:
+        tuple: (list of problems, empty if all is well; True if the
+               result came from the cache).
+    """
+    if not os.path.exists(VENV_PYTHON):
+        return [f"Python executable not found at: {os.path.abspath(VENV_PYTHON)}"], False
+
+    fingerprint = venv_fingerprint()
+    if use_cache:
+        try:
+            with open(CACHE_FILE, "r", encoding="utf-8") as fh:
+                cached = json.load(fh)
+            if cached.get("fingerprint") == fingerprint:
+                return cached["problems"], True
+        except (OSError, ValueError, KeyError):
+            pass
+
+    try:
+        problems = [f"Package '{name}' not found" for name in find_missing()]
+    except (subprocess.CalledProcessError, FileNotFoundError, ValueError) as e:
+        problems = [f"Could not run the venv's Python: {e}"]
+    try:
+        with open(CACHE_FILE, "w", encoding="utf-8") as fh:
+            json.dump({"fingerprint": fingerprint, "problems": problems}, fh)
+    except OSError:
+        pass
+    return problems, False
+
 def run_validation():
     """
     Runs the validation process and prints a user-friendly report.
     """
     print("--- Running Validation ---")
-    all_ok = True
 
     # 1. Check if the virtual environment exists
     print(f"1. Checking for virtual environment at '{VENV_DIR}'... ", end="")
     if not os.path.exists(VENV_PYTHON):
         print("FAILED")
         print(f"  - Python executable not found at: {os.path.abspath(VENV_PYTHON)}")
-        all_ok = False
+        problems = ["no venv"]
     else:
         print("OK")
 
-    # 2. Check for required packages within the virtual environment
-    if all_ok:
-        print("2. Checking for required packages in .venv...")
-        for package in REQUIREMENTS:
-            print(f"  - Checking for '{package}'... ", end="")
-            try:
-                # We use the venv's python to try and import the package
-                subprocess.run(
-                    [VENV_PYTHON, "-c", f"import {package}"],
-                    check=True,
-                    capture_output=True,
-                    text=True
-                )
-                print("OK")
-            except (subprocess.CalledProcessError, FileNotFoundError):
-                print("FAILED")
-                all_ok = False
+        # 2. Check for required packages within the virtual environment. An
+        # explicit validation always checks again, and refreshes the cache.
+        print("2. Checking for required packages in .venv... ", end="")
+        problems, _ = validate(use_cache=False)
+        print("FAILED" if problems else "OK")
+        for problem in problems:
+            print(f"  - {problem}")
 
     print("-" * 28)
-    if all_ok:
+    if not problems:
         print("Validation successful! Environment is set up correctly.")
     else:
         print("\nValidation failed. Please run option 3, 'Install Requirements', from the main menu.")
@@ -55,4 +137,4 @@ def run_validation():
         sys.exit(1)
 
 if __name__ == "__main__":
-    run_validation()
\ No newline at end of file
+    run_validation()